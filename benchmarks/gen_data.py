@@ -0,0 +1,277 @@
+# Generates a synthetic course's worth of GradeScope and Canvas data, for benchmarking.
+# :: Usage: python benchmarks/gen_data.py <out_dir> [--students N] [--questions Q] [--items R] [--seed S]
+# :: Writes, under out_dir, everything grades.py, slip_days.py and final_grades.py read:
+# ::   config.json and rubrics/           (the course's rubrics, plus a 'bench' assignment)
+# ::   data/<assignment>/                 (GS "Export Evaluations" CSVs, one per question, plus the "Download Grades" _scores.csv)
+# ::   data/roster/roster.csv             (Canvas gradebook export)
+# ::   data/quizzes/, data/final/, ...    (quiz exports, final exam grades, extra slip days, surveys)
+# :: Run the scripts from inside out_dir.
+
+# Add location of INFO 4240 grading library to module search path
+import os
+import sys
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_PATH)
+
+import csv
+import json
+import random
+import argparse
+import datetime
+
+# Course assignments (rubric name -> data directory), as in final_grades.py's rubric_data_map
+COURSE_ASSIGNMENTS = {
+    'checkin': 'checkin',
+    'dw1': 'dw1',
+    'dw2': 'dw2',
+    'dw3': 'dw3',
+    'dw4': 'dw4',
+    'dw5': 'dw5',
+    'mp1': 'mp1',
+    'mp2': 'mp2',
+    'mp3_indiv': 'mp3/indiv',
+    'mp3_group': 'mp3/group',
+    'mp4': 'mp4'
+}
+# The rubric the 'bench' assignment uses, unless --items is given
+BENCH_RUBRIC = 'dw2'
+# Quiz dates (month, day), named like final_grades.py expects
+QUIZ_DATES = [(2, 9), (2, 16), (2, 23), (3, 2), (3, 9), (3, 25), (4, 6), (4, 13)]
+GRADERS = ["TA {}".format(c) for c in "ABCDEFGH"]
+COMMENTS = ["", "Nice work!", "Good design, but the reflection could go deeper.", "Great job", "You missed the reading's main point.", " "]
+GS_COLUMNS = ["Assignment Submission ID", "Question Submission ID", "Name", "SID", "Email", "Score", "Grader", "Adjustment", "Comments"]
+# How often students skip an assignment, a question, etc.
+P_NO_SUBMISSION = 0.04
+P_NOT_SUBMITTED = 0.08
+P_UNGRADED = 0.15
+P_LATE = 0.1
+
+class SyntheticStudent:
+    def __init__(self, i):
+        self.sid = 4000000 + i
+        self.netid = "bs{}".format(100 + i)
+        self.email = self.netid + "@cornell.edu"
+        self.first, self.last = "First{}".format(i), "Last{}".format(i)
+        self.name = self.first + " " + self.last
+
+# A rubric with num_items items, alternating between single items, single-select and select-all items.
+def synthetic_rubric(num_items):
+    rubric, shortnames, aggr_method = {"Something was submitted": 1}, {"Something was submitted": "Submitted"}, dict()
+    for i in range(1, num_items):
+        key = "Rubric item {}".format(i)
+        shortnames[key] = "Item {}".format(i)
+        if i % 3 == 0:
+            rubric[key] = 2
+        else:
+            rubric[key] = { "Level {}".format(j): j for j in range(4) }
+            aggr_method[key] = "max" if i % 3 == 1 else "sum"
+    return { "gsAssignmentID": "1000000", "maxScore": sum(v if isinstance(v, int) else (3 if aggr_method[k] == "max" else 6) for k, v in rubric.items()),
+             "expectedQuestionsAnswered": 1, "wasSubmittedItem": "Something was submitted",
+             "rubric": rubric, "shortnames": shortnames, "aggr_method": aggr_method }
+
+# Checks rubric items for one (submitted, graded) answer the way a grader would, returning (column values, score).
+def grade_answer(rubric, rnd):
+    values, score = [], 0
+    for key, val in rubric['rubric'].items():
+        if isinstance(val, int):
+            if key == rubric.get('wasSubmittedItem'):
+                checked = True
+            elif key == rubric.get('wasNotSubmittedItem'):
+                checked = False
+            else:
+                checked = rnd.random() < 0.8
+            values.append(checked)
+            score += val if checked else 0
+            continue
+        subvals = list(val.values())
+        if rubric['aggr_method'].get(key) == "sum":
+            checked = [rnd.random() < 0.5 for _ in subvals]
+            score += sum(v for v, c in zip(subvals, checked) if c)
+        else:
+            checked = [False] * len(subvals)
+            if rnd.random() > 0.02: # occasionally a grader forgets an item...
+                checked[rnd.randrange(len(subvals))] = True
+            if rnd.random() < 0.01: # ...or checks two
+                checked[rnd.randrange(len(subvals))] = True
+            score += max([v for v, c in zip(subvals, checked) if c], default=0)
+        values.extend(checked)
+    return values, score
+
+def rubric_columns(rubric):
+    cols = []
+    for key, val in rubric['rubric'].items():
+        cols.extend([key] if isinstance(val, int) else [key + ": " + subkey for subkey in val])
+    return cols
+
+# Marks the 'was (not) submitted' rubric item of an unsubmitted answer
+def unsubmitted_answer(rubric, cols):
+    values = [False] * len(cols)
+    item = rubric.get('wasNotSubmittedItem')
+    if item in cols:
+        values[cols.index(item)] = True
+    return values
+
+# Writes one question's GS eval CSV, with the 3 trailing rubric rows GS adds.
+def write_eval_sheet(path, rubric, submissions, question_num, rnd):
+    cols = rubric_columns(rubric)
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(GS_COLUMNS + cols)
+        for aid, student, answered in submissions:
+            qid = aid * 10 + question_num
+            if question_num not in answered or rnd.random() < P_NOT_SUBMITTED:
+                values, score, grader = unsubmitted_answer(rubric, cols), "", ""
+            elif rnd.random() < P_UNGRADED:
+                values, score, grader = [False] * len(cols), "", ""
+            else:
+                values, score = grade_answer(rubric, rnd)
+                grader = rnd.choice(GRADERS)
+            adjustment = rnd.choice(["", "", "", "", -1, 0.5]) if score != "" and score >= 1 else ""
+            if adjustment != "":
+                score += adjustment
+            sid = "" if rnd.random() < 0.005 else student.sid
+            w.writerow([aid, qid, student.name, sid, student.email, score, grader, adjustment, rnd.choice(COMMENTS) if score != "" else ""] + \
+                       ["true" if v else "false" for v in values])
+        w.writerow(["Point Values", "", "", "", "", "", "", "", ""] + [1] * len(cols))
+        w.writerow(["Rubric Numbers", "", "", "", "", "", "", "", ""] + list(range(1, len(cols)+1)))
+        w.writerow(["Rubric Type", "", "", "", "", "", "", "", ""] + ["positive"] * len(cols))
+
+# Writes the "Download Grades" sheet, which has each submission's lateness.
+def write_scores_sheet(path, rubric, submissions, rnd):
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["Name", "SID", "Email", "Total Score", "Max Points", "Status", "Submission ID", "Submission Time", "Lateness (H:M:S)"])
+        for aid, student, _ in submissions:
+            late = "00:00:00"
+            if rnd.random() < P_LATE:
+                minutes = rnd.choice([rnd.randint(1, 20), rnd.randint(21, 1440), rnd.randint(1441, 5000)])
+                late = "{:02d}:{:02d}:{:02d}".format(minutes // 60, minutes % 60, rnd.randint(0, 59))
+            w.writerow([student.name, student.sid, student.email, rnd.randint(0, rubric['maxScore']), rubric['maxScore'], \
+                        rnd.choice(["Graded", "Graded", "Ungraded"]), aid, "", late])
+
+# Writes an assignment's data directory: one eval sheet per question, plus the scores sheet.
+# :: Each student answers the rubric's expectedQuestionsAnswered of the questions (e.g., the readings they picked).
+# :: Group assignments (group_size > 1) share one submission ID between the members of a group.
+def write_assignment(data_dir, rubric, students, num_questions, rnd, group_size=1):
+    os.makedirs(data_dir, exist_ok=True)
+    submitters = [s for s in students if rnd.random() > P_NO_SUBMISSION]
+    first_aid = rnd.randrange(1, 1000) * 100000
+    num_answered = min(rubric.get('expectedQuestionsAnswered', num_questions), num_questions)
+    submissions = [(first_aid + i // group_size, s, set(rnd.sample(range(1, num_questions+1), num_answered))) for i, s in enumerate(submitters)]
+    for q in range(1, num_questions+1):
+        write_eval_sheet(os.path.join(data_dir, "{}_Question_{}.csv".format(q, q)), rubric, submissions, q, rnd)
+    write_scores_sheet(os.path.join(data_dir, os.path.basename(data_dir) + "_scores.csv"), rubric, submissions, rnd)
+
+# Writes a Canvas gradebook export. load.roster drops rows 1, 2 and the last (test student) ones.
+def write_roster(path, students):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["Student", "ID", "SIS User ID", "SIS Login ID", "Section", "Active Learning Initiative Survey (221004)"])
+        w.writerow(["    Manual Posting", "", "", "", "", ""])
+        w.writerow(["    Points Possible", "", "", "", "", "1"])
+        w.writerow(["Student, Placeholder", "", "", "", "", ""])
+        for i, s in enumerate(students):
+            w.writerow([s.last + ", " + s.first, 100000 + i, s.sid, s.netid, "INFO 4240", 1 if i % 3 == 0 else ""])
+        w.writerow(["Student, Test", "999999", "", "", "", ""])
+
+def write_quizzes(quiz_dir, students, rnd):
+    os.makedirs(quiz_dir, exist_ok=True)
+    for month, day in QUIZ_DATES:
+        due = datetime.datetime(2021, month, day, 17 if month < 4 else 16, 20)
+        with open(os.path.join(quiz_dir, "{}-{}.csv".format(month, day)), 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(["name", "id", "sis_id", "section", "submitted", "attempt", "n correct", "score"])
+            for s in students:
+                if rnd.random() < 0.1: continue
+                for attempt in range(1, rnd.choice([1, 1, 1, 2]) + 1):
+                    submitted = due + datetime.timedelta(minutes=rnd.choice([-30, -10, -2, 5, 120]))
+                    w.writerow([s.name, s.sid % 100000, s.sid, "INFO 4240", submitted.strftime("%Y-%m-%d %H:%M:%S UTC"), attempt, 3, 3])
+    with open(os.path.join(os.path.dirname(quiz_dir), "quiz_exceptions.json"), 'w') as f:
+        json.dump({ "3-2": [students[0].sid] } if len(students) > 0 else {}, f)
+
+def write_final_exam(final_dir, students, rnd):
+    os.makedirs(final_dir, exist_ok=True)
+    with open(os.path.join(final_dir, "final_scores.csv"), 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["Name", "SID", "Email", "Total Score", "Max Points", "Status"])
+        for s in students:
+            if rnd.random() < 0.05: continue
+            w.writerow([s.name, s.sid, s.email, rnd.randint(50, 100), 100, "Graded" if rnd.random() > 0.02 else "Missing"])
+
+def write_extra_slips(path, students, rnd):
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["Name", "Email", "Extra Slip Days", "Excluding"])
+        for s in students:
+            if rnd.random() < 0.05:
+                w.writerow([s.name, s.email, rnd.randint(1, 3), "dw2" if rnd.random() < 0.2 else ""])
+
+def write_ati_survey(path, students, rnd):
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["netid", "response"])
+        for s in students:
+            if rnd.random() < 0.5:
+                w.writerow([s.netid.upper() if rnd.random() < 0.1 else s.netid, "yes"])
+
+# Writes the whole synthetic course to out_dir. Returns the path of its config.json.
+def generate(out_dir, num_students=200, num_questions=3, num_items=None, seed=0):
+    rnd = random.Random(seed)
+    students = [SyntheticStudent(i) for i in range(num_students)]
+    os.makedirs(os.path.join(out_dir, "rubrics"), exist_ok=True)
+    with open(os.path.join(BASE_PATH, "config.json")) as f:
+        base_config = json.load(f)
+
+    # Rubrics
+    rubrics = dict()
+    for name in list(COURSE_ASSIGNMENTS.keys()) + [BENCH_RUBRIC]:
+        with open(os.path.join(BASE_PATH, "rubrics", name + ".json")) as f:
+            rubrics[name] = json.load(f)
+    rubrics['bench'] = synthetic_rubric(num_items) if num_items else rubrics[BENCH_RUBRIC]
+    for name, rubric in rubrics.items():
+        with open(os.path.join(out_dir, "rubrics", name + ".json"), 'w') as f:
+            json.dump(rubric, f, indent=4)
+
+    # Assignments, all due in the past
+    config = { "assignments": dict() }
+    duedate = datetime.datetime(2021, 2, 1, 22, 0)
+    for name, dir_name in list(COURSE_ASSIGNMENTS.items()) + [('bench', 'bench')]:
+        write_assignment(os.path.join(out_dir, "data", dir_name), rubrics[name], students, num_questions, rnd, group_size=3 if name == 'mp3_group' else 1)
+        config["assignments"][name] = { "rubric": os.path.join("rubrics", name + ".json"), "data": os.path.join("data", dir_name),
+                                        "url": "https://www.gradescope.com/courses/288777/assignments/{}/".format(rubrics[name]['gsAssignmentID']),
+                                        "duedate": duedate.strftime('%b %d %Y %I:%M%p'), "fullname": name }
+        duedate += datetime.timedelta(days=7)
+    config["assignments"]["mp3_indiv"]["groupAssignment"] = "mp3_group"
+
+    # Canvas, quizzes, exams, etc.
+    write_roster(os.path.join(out_dir, "data", "roster", "roster.csv"), students)
+    write_quizzes(os.path.join(out_dir, "data", "quizzes"), students, rnd)
+    write_final_exam(os.path.join(out_dir, "data", "final"), students, rnd)
+    write_extra_slips(os.path.join(out_dir, "data", "extra_slip_days.csv"), students, rnd)
+    write_ati_survey(os.path.join(out_dir, "data", "ati_survey_2.csv"), students, rnd)
+    with open(os.path.join(out_dir, "data", "slip_days.csv"), 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["Name", "Email", "Slip Days Remaining", "Late Assignments", "Missing Assignments", "Extra Slips"])
+        for s in students:
+            w.writerow([s.name, s.email, rnd.choice([7, 5, 2, 0, -1]), "", "", ""])
+
+    config.update({ "rosterCSV": os.path.join("data", "roster", "roster.csv"),
+                    "extraSlipsCSV": os.path.join("data", "extra_slip_days.csv"),
+                    "slipDaysCSVExportPath": os.path.join("data", "slip_days.csv"),
+                    "pyppeteerDownloadDir": os.path.join(out_dir, "downloads"),
+                    "finalGradePolicy": base_config["finalGradePolicy"] })
+    config_path = os.path.join(out_dir, "config.json")
+    with open(config_path, 'w') as f:
+        json.dump(config, f, indent=4)
+    return config_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic GradeScope/Canvas data for benchmarking.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=3)
+    parser.add_argument("--items", type=int, default=None, help="use a synthetic rubric with this many items for the 'bench' assignment")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print("Wrote", generate(args.out_dir, args.students, args.questions, args.items, args.seed))
@@ -0,0 +1,115 @@
+# Benchmarks how long each command takes to import what it needs (its cold start), and which heavy libraries it loads.
+# :: Usage: python benchmarks/import_time.py [--repeat N] [--record] [--budget import_budget.json] [--tolerance T]
+# :: Each command's imports run in a new interpreter (from the repo directory), and the best of --repeat runs is kept.
+# :: With --record, saves the results as the budget. Otherwise, exits with an error if any command got slower than
+# :: its budget by more than --tolerance, or started loading a heavy library (e.g., pandas) it didn't before.
+# :: Budgets are relative to the machine: every run also times a fixed set of standard library imports (BASELINE),
+# :: and if that's slower than when the budget was recorded, each budget is scaled up by as much.
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_budget.json")
+# How much slower than the budget a command can get (as a fraction) before it counts as a regression
+DEFAULT_TOLERANCE = 0.5
+# Slack (in seconds) on top of the tolerance, as the timings of commands this fast are noisy
+MIN_SLACK = 0.02
+
+# Libraries slow enough to import that a command should only load them if it uses them
+HEAVY_MODULES = ["pandas", "numpy", "matplotlib", "pyppeteer", "fpdf"]
+
+# Scripts that do their work at the top level: their startup is everything before this marker
+SETUP_END = "''' === END SETUP === '''"
+
+# Runs a script's setup (its imports, and settings), without the rest of it
+def script_setup(path):
+    return "exec(open({!r}).read().split({!r})[0])".format(path, SETUP_END)
+
+# Standard library imports timed on every run, as a measure of how fast the machine is
+BASELINE = ("baseline (stdlib)", "import argparse, csv, decimal, email.mime.multipart, http.server, sqlite3, xml.dom.minidom")
+
+# Each command's startup: what it imports (and any quick lookups it does) before it gets to work.
+COMMANDS = [
+    BASELINE,
+    ("main.py", "import daemon"),
+    ("scrapers", "import load; load.config()"),
+    ("grades.py (rubric lookup)", "import grades; grades.load_rubric('rubrics/dw1.json')"),
+    ("incremental.py", "import incremental"),
+    ("slip_days.py", "import slip_days"),
+    ("final_grades.py", script_setup("final_grades.py")),
+]
+
+# Runs in the new interpreter. Prints (as the last line) the seconds taken and the heavy libraries loaded.
+CHILD = """
+import sys, time, json
+start = time.perf_counter()
+{}
+seconds = time.perf_counter() - start
+loaded = [m for m in {} if any(k.startswith(m + ".") for k in sys.modules)] # (lazily imported modules aren't loaded yet)
+print(json.dumps([seconds, loaded]))
+"""
+
+# Times one command's imports in a new interpreter. Returns (seconds, heavy libraries loaded).
+def time_command(stmt):
+    out = subprocess.run([sys.executable, "-c", CHILD.format(stmt, HEAVY_MODULES)], cwd=BASE_PATH,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    seconds, loaded = json.loads(out.strip().split("\n")[-1])
+    return seconds, loaded
+
+# How much slower this machine is than the one a budget was recorded on (at least 1), going by BASELINE
+def slowdown(results, budget):
+    name = BASELINE[0]
+    if name not in budget or name not in results:
+        return 1.0
+    return max(1.0, results[name]["seconds"] / budget[name]["seconds"])
+
+# Compares results to a budget's. Returns a list of messages, one per regression.
+def over_budget(results, budget, tolerance):
+    problems = []
+    scale = slowdown(results, budget)
+    for name, r in results.items():
+        if name not in budget or name == BASELINE[0]:
+            continue
+        b = budget[name]
+        allowed = b["seconds"] * scale * (1 + tolerance) + MIN_SLACK
+        if r["seconds"] > allowed:
+            problems.append("{} took {:.3f} s to import (budget {:.3f} s, up to {:.3f} s allowed)".format(name, r["seconds"], b["seconds"], allowed))
+        new = sorted(set(r["loads"]) - set(b["loads"]))
+        if len(new) > 0:
+            problems.append("{} now loads {}".format(name, ", ".join(new)))
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cold-start import time of each command.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--record", action="store_true", help="save the results as the budget")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    print("{:<28s}{:>11s}   {}".format("Command", "Import", "Heavy libraries loaded"))
+    results = dict()
+    for name, stmt in COMMANDS:
+        runs = [time_command(stmt) for _ in range(args.repeat)]
+        seconds = min(s for s, _ in runs)
+        results[name] = { "seconds": seconds, "loads": runs[0][1] }
+        print("{:<28s}{:>9.3f} s   {}".format(name, seconds, ", ".join(runs[0][1]) or "-"))
+
+    if args.record:
+        with open(args.budget, 'w') as f:
+            json.dump(results, f, indent=4)
+        print("Saved budget to", args.budget)
+    elif os.path.exists(args.budget):
+        with open(args.budget) as f:
+            budget = json.load(f)
+        problems = over_budget(results, budget, args.tolerance)
+        for p in problems:
+            print("Over budget:", p)
+        if len(problems) > 0:
+            exit(1)
+        print("All commands within budget (tolerance {:.0f}%, scaled by {:.2f} for this machine).".format(args.tolerance * 100, slowdown(results, budget)))
+    else:
+        print("No budget at {} to compare to. Record one with --record.".format(args.budget))
@@ -0,0 +1,187 @@
+# Benchmarks the grading pipeline end-to-end on synthetic data (see gen_data.py), at several scales.
+# :: Usage: python benchmarks/run.py [--scales 100x3,1000x5] [--items R] [--repeat N] [--json out.json] [--baseline old.json]
+# :: For each scale (students x questions) and stage, reports the best wall time of --repeat runs, throughput
+# :: (rows per second, where a row is one student's answer to one question), and peak memory (traced in a separate run,
+# :: as tracing slows things down). Only memory of this process is traced, not of worker processes.
+# :: With --baseline, exits with an error if any stage got slower than the baseline by more than --tolerance.
+
+# Add location of INFO 4240 grading library to module search path
+import os
+import sys
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_PATH)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import io
+import json
+import time
+import runpy
+import shutil
+import argparse
+import tempfile
+import importlib
+import tracemalloc
+import contextlib
+import gen_data
+
+DEFAULT_SCALES = "100x3,1000x5,5000x8"
+# How much slower than the baseline a stage can get (as a fraction) before it counts as a regression
+DEFAULT_TOLERANCE = 0.25
+
+# Each stage is a function of the benchmark's state (a dict), run from inside the data directory.
+# :: It returns the number of rows it processed. Setup that shouldn't be timed goes in the state.
+def stage_calc_grade(state):
+    import grades
+    grades.VECTORIZED_SCORING = False
+    try:
+        return len(grades.load_gradesheet(state['rubric'], "1_Question_1", state['question_csv'], 1, only_submitted=False))
+    finally:
+        grades.VECTORIZED_SCORING = True
+
+def stage_score_gradesheet(state):
+    import grades
+    return len(grades.load_gradesheet(state['rubric'], "1_Question_1", state['question_csv'], 1, only_submitted=False))
+
+def stage_load_grades(state):
+    import grades
+    state['grades'], _, _ = grades.load_grades(state['rubric_path'], state['data_dir'], only_submitted=False)
+    return len(state['grades'])
+
+def stage_load_grades_warm(state):
+    import grades
+    grades.USE_GRADESHEET_CACHE = True
+    try:
+        return len(grades.load_grades(state['rubric_path'], state['data_dir'], only_submitted=False)[0])
+    finally:
+        grades.USE_GRADESHEET_CACHE = False
+
+def stage_outlier_check(state):
+    import grades
+    grades.outlier_check(state['grades'])
+    return len(state['grades'])
+
+def stage_ta_consistency_check(state):
+    import grades
+    grades.ta_consistency_check(state['grades'])
+    return len(state['grades'])
+
+def stage_slip_days(state):
+    import slip_days
+    importlib.reload(slip_days) # re-reads config.json
+    slip_days.calculate_slip_days()
+    return state['num_rows_course']
+
+def stage_final_grades(state):
+    try:
+        runpy.run_path(os.path.join(BASE_PATH, "final_grades.py"))
+    except SystemExit:
+        pass
+    return state['num_rows_course']
+
+STAGES = [
+    ("calc_grade", stage_calc_grade),
+    ("score_gradesheet", stage_score_gradesheet),
+    ("load_grades", stage_load_grades),
+    ("load_grades (warm cache)", stage_load_grades_warm),
+    ("outlier_check", stage_outlier_check),
+    ("ta_consistency_check", stage_ta_consistency_check),
+    ("slip_days", stage_slip_days),
+    ("final_grades", stage_final_grades)
+]
+
+# Runs a stage once, quietly. Returns (seconds, rows, peak bytes or None).
+def run_stage(fn, state, trace=False):
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = fn(state)
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, rows, peak
+
+# Generates data for one scale and benchmarks every stage on it. Returns a list of result dicts.
+def bench_scale(num_students, num_questions, num_items, repeat, work_dir):
+    data_dir = os.path.join(work_dir, "{}x{}".format(num_students, num_questions))
+    gen_data.generate(data_dir, num_students, num_questions, num_items)
+    cwd = os.getcwd()
+    os.chdir(data_dir)
+    try:
+        import grades
+        grades.USE_GRADESHEET_CACHE = False
+        rubric_path = os.path.join("rubrics", "bench.json")
+        state = { "rubric_path": rubric_path,
+                  "rubric": grades.load_rubric(rubric_path),
+                  "data_dir": os.path.join("data", "bench"),
+                  "question_csv": os.path.join("data", "bench", "1_Question_1.csv"),
+                  "num_rows_course": num_students * num_questions * len(gen_data.COURSE_ASSIGNMENTS) }
+
+        # Warm the cache for the warm-cache stage
+        grades.USE_GRADESHEET_CACHE = True
+        with contextlib.redirect_stdout(io.StringIO()):
+            grades.load_grades(rubric_path, state['data_dir'], only_submitted=False)
+        grades.USE_GRADESHEET_CACHE = False
+
+        results = []
+        for name, fn in STAGES:
+            times = []
+            for _ in range(repeat):
+                seconds, rows, _ = run_stage(fn, state)
+                times.append(seconds)
+            _, _, peak = run_stage(fn, state, trace=True)
+            best = min(times)
+            results.append({ "scale": "{}x{}".format(num_students, num_questions), "stage": name, "seconds": best,
+                             "rows": rows, "rows_per_sec": rows / best if best > 0 else None, "peak_bytes": peak })
+            print("{:>12s}  {:<26s}{:>9.3f} s{:>12.0f} rows/s{:>10.1f} MB".format(results[-1]["scale"], name, best, results[-1]["rows_per_sec"] or 0, peak / 1e6))
+        return results
+    finally:
+        os.chdir(cwd)
+
+# Compares results to a baseline's. Returns the list of (scale, stage, seconds, baseline seconds) that regressed.
+def regressions(results, baseline, tolerance):
+    base = { (r["scale"], r["stage"]): r["seconds"] for r in baseline }
+    slower = []
+    for r in results:
+        key = (r["scale"], r["stage"])
+        if key in base and r["seconds"] > base[key] * (1 + tolerance):
+            slower.append((r["scale"], r["stage"], r["seconds"], base[key]))
+    return slower
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the grading pipeline on synthetic data.")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="comma-separated list of <students>x<questions>")
+    parser.add_argument("--items", type=int, default=None, help="use a synthetic rubric with this many items (default: a real rubric)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=None, help="save results to this file")
+    parser.add_argument("--baseline", default=None, help="compare to results saved (with --json) from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--keep", default=None, help="generate data into this directory (and keep it), instead of a temp one")
+    args = parser.parse_args()
+
+    work_dir = args.keep or tempfile.mkdtemp(prefix="grading_bench_")
+    print("{:>12s}  {:<26s}{:>11s}{:>19s}{:>13s}".format("Scale", "Stage", "Time", "Throughput", "Peak mem"))
+    results = []
+    try:
+        for scale in args.scales.split(","):
+            num_students, num_questions = [int(x) for x in scale.split("x")]
+            results.extend(bench_scale(num_students, num_questions, args.items, args.repeat, work_dir))
+    finally:
+        if args.keep is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+        print("Saved results to", args.json)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for scale, stage, seconds, base in slower:
+            print("Regression: {} at {} took {:.3f} s (baseline {:.3f} s)".format(stage, scale, seconds, base))
+        if len(slower) > 0:
+            exit(1)
+        print("No regressions (tolerance {:.0f}%).".format(args.tolerance * 100))
@@ -0,0 +1,165 @@
+import os
+import json
+from collections import defaultdict
+
+# Where resolved column aliases are saved, one JSON file per GS assignment ID.
+# :: Maps rubric item -> eval sheet columns it was fuzzy-matched to in earlier runs,
+# :: so later runs can skip fuzzy matching entirely.
+ALIASES_DIR = ".grading_cache/aliases"
+
+# How many trigram candidates to rank with difflib when fuzzy matching (see TrigramIndex.closest)
+NUM_CANDIDATES = 5
+# How close (by difflib's ratio) a column has to be to match, as in get_close_matches
+CUTOFF = 0.6
+
+# Returns the set of (lowercased, padded) character trigrams of a string
+def trigrams(s):
+    s = "  " + s.lower() + " "
+    return set(s[i:i+3] for i in range(len(s)-2))
+
+# Inverted index from trigrams to column names, for fuzzy matching
+# without computing edit distances against every column.
+class TrigramIndex:
+    def __init__(self, names):
+        self.names = list(names)
+        self.grams = [trigrams(str(name)) for name in self.names]
+        self.postings = defaultdict(list)
+        for i, grams in enumerate(self.grams):
+            for g in grams:
+                self.postings[g].append(i)
+
+    # Names sharing the most trigrams with term (by Dice coefficient), best first
+    def candidates(self, term, limit=NUM_CANDIDATES):
+        term_grams = trigrams(term)
+        shared = defaultdict(int)
+        for g in term_grams:
+            for i in self.postings.get(g, ()):
+                shared[i] += 1
+        ranked = sorted(shared.items(), key=lambda x: -2.0*x[1]/(len(term_grams)+len(self.grams[x[0]])))
+        return [self.names[i] for i, _ in ranked[:limit]]
+
+    # Closest name to term, by difflib's ratio, as in get_close_matches(term, names, 1)[0].
+    # :: Only the trigram shortlist is ranked with difflib; every name is scanned only if none of the shortlist is
+    # :: within cutoff (e.g., a heavily edited rubric item). Ties go to the greater name, like get_close_matches.
+    # :: Raises IndexError if nothing is close, like get_close_matches(...)[0] would.
+    def closest(self, term, cutoff=CUTOFF):
+        best = self.best_match(term, self.candidates(term), cutoff)
+        if best is None:
+            best = self.best_match(term, self.names, cutoff)
+        if best is None:
+            raise IndexError("No column close to '{}'".format(term))
+        return best
+
+    # The name in names with the greatest ratio to term (at least cutoff), or None
+    def best_match(self, term, names, cutoff):
+        from difflib import SequenceMatcher
+        matcher = SequenceMatcher()
+        matcher.set_seq2(term)
+        best = None # (ratio, name)
+        for name in names:
+            matcher.set_seq1(name)
+            bound = cutoff if best is None else best[0]
+            if matcher.real_quick_ratio() >= bound and matcher.quick_ratio() >= bound:
+                ratio = matcher.ratio()
+                if ratio >= cutoff and (best is None or (ratio, name) > best):
+                    best = (ratio, name)
+        return None if best is None else best[1]
+
+# Detects which column name matches a given rubric item, allowing small variations in strings.
+# :: Returns None if there's no exact or near-exact match.
+def exact_column(term, col_names):
+    if term in col_names:
+        return term
+    # Easy checks for single trailing spaces either on ends or near colon
+    if (term+' ') in col_names:
+        return term+" "
+    elif (' '+term in col_names):
+        return " "+term
+    elif ":" in term:
+        lr = term.split(":")
+        if len(lr) > 2:
+            pass
+        elif (lr[0] + ' :' + lr[1]) in col_names:
+            return (lr[0] + ' :' + lr[1])
+        elif (lr[0] + ': ' + lr[1]) in col_names:
+            return (lr[0] + ': ' + lr[1])
+    return None
+
+# Detects which column name matches a given rubric item.
+# Has to be done on a case-by-case basis because of small variations in strings.
+def find_column(term, col_names, index=None):
+    col = exact_column(term, col_names)
+    if col is not None:
+        return col
+    # Return the closest match. This is because sometimes graders edit the rubric and say,
+    # add an extra letter, screwing up the column names for specific questions. We want to ignore these errors.
+    if index is None:
+        index = TrigramIndex(col_names)
+    return index.closest(term)
+
+# Resolves rubric items to columns once per distinct CSV header, for one assignment.
+# :: Fuzzy matches are remembered as aliases and saved (see save()) for later runs.
+class ColumnResolver:
+    def __init__(self, assignment_id=None, aliases_dir=ALIASES_DIR):
+        self.path = None if assignment_id is None else os.path.join(aliases_dir, str(assignment_id) + ".json")
+        self.aliases = dict()
+        self.changed = False
+        self.headers = dict() # header tuple -> { term: column }
+        self.indexes = dict() # header tuple -> TrigramIndex
+        if self.path is not None and os.path.isfile(self.path):
+            with open(self.path) as f:
+                self.aliases = json.load(f)
+
+    # Returns the column in col_names matching the rubric item term.
+    def resolve(self, term, col_names):
+        header = tuple(col_names)
+        if header not in self.headers:
+            self.headers[header] = dict()
+        resolved = self.headers[header]
+        if term in resolved:
+            return resolved[term]
+
+        col = exact_column(term, col_names)
+        if col is None:
+            col = next((c for c in self.aliases.get(term, []) if c in col_names), None)
+        if col is None:
+            if header not in self.indexes:
+                self.indexes[header] = TrigramIndex(header)
+            col = self.indexes[header].closest(term)
+            self.add_alias(term, col)
+        resolved[term] = col
+        return col
+
+    # Returns a dict of each term's matching column in col_names.
+    def resolve_all(self, terms, col_names):
+        return { term: self.resolve(term, col_names) for term in terms }
+
+    def add_alias(self, term, col):
+        cols = self.aliases.setdefault(term, [])
+        if col not in cols:
+            cols.append(col)
+            self.changed = True
+
+    # Adds the aliases another resolver found (e.g., one used in a worker process)
+    def merge(self, other):
+        for term, cols in other.aliases.items():
+            for col in cols:
+                self.add_alias(term, col)
+
+    # Saves any new aliases to this assignment's alias file.
+    def save(self):
+        if self.path is None or not self.changed: return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(self.aliases, f, indent=4)
+        self.changed = False
+
+# All the column terms calc_grade looks up for a rubric (a JSON object)
+def rubric_terms(rubric):
+    terms = []
+    for key, val in rubric['rubric'].items():
+        if isinstance(val, int):
+            terms.append(key)
+        else:
+            terms.extend([key + ": " + subkey for subkey in val])
+    return terms
@@ -1,5 +1,5 @@
 from grades import load_grades
-import pandas as pd
+from linker import SubmissionLinker
 
 # == PART YOU SHOULD EDIT ==
 # Put filepath of rubric to use for this assignment. Rubric is JSON file.
@@ -19,41 +19,18 @@ def grading_url(url_qid, qid):
 group_grades, _, _ = load_grades(group_rubric_path, group_csv_dir, only_submitted=False)
 indiv_grades, _, _ = load_grades(indiv_rubric_path, indiv_csv_dir, only_submitted=False)
 
-# Identify and bucket groups (the lazy way)
-assnIds = set([g['aid'] for g in group_grades])
-groups = []
-for aid in assnIds:
-    members = [g for g in group_grades if g['aid'] == aid]
-    indivs = []
-    for m in members:
-        indiv = [g for g in indiv_grades if g['sid'] == m['sid']]
-        if len(indiv) == 0:
-            print("No individual submission for student", m['name'], m['sid'])
-        elif len(indiv) > 1:
-            print("Somehow, individual student", m['name'], m['sid'], 'submitted twice! O___O')
-        else:
-            indivs.append(indiv[0])
-    print(aid, len(members), len(indivs))
-    groups.append((aid, members, indivs))
+# Link each group's members to their individual submissions
+linker = SubmissionLinker(group_grades, indiv_grades)
+for student in linker.dup_students:
+    print("Somehow, individual student", student, 'submitted twice! O___O (linking their first submission)')
+members = linker.members()
+members = members[members['aid'].notna()]
+for _, m in members[members['indiv_row'] == -1].iterrows():
+    print("No individual submission for student", m['name'], m['sid'])
+for aid, ms in members.groupby('aid', sort=False):
+    print(aid, len(ms), int((ms['indiv_row'] != -1).sum()))
 
 # Print connected submissions to csv
-export_cols = ["Group submission #", "Group question #", "Group Submission", "Member 1", "Member 1 Submission", "Member 2", "Member 2 Submission"]
-export_grades = []
-for (aid, members, indivs) in groups:
-    gsub = grading_url(group_url_qid, members[0]['qid'])
-    m1 = members[0]['name']
-    m2 = members[1]['name'] if len(members) > 1 else "N/A"
-    m1sub = "No submission"
-    m2sub = "No submission"
-    row = [ aid, members[0]['qid'], gsub, m1 ]
-    if len(indivs) > 0:
-        m1sub = grading_url(indiv_url_qid, indivs[0]['qid'])
-    if len(indivs) > 1:
-        m2sub = grading_url(indiv_url_qid, indivs[1]['qid'])
-    row.extend( [m1sub, m2, m2sub] )
-    export_grades.append(row)
-
-export_grades.sort(key=lambda r: r[0])
-df_grades = pd.DataFrame(export_grades, columns=export_cols)
-df_grades.sort_values(by=['Group question #'])
+df_grades = linker.linked_table(lambda qid: grading_url(group_url_qid, qid), lambda qid: grading_url(indiv_url_qid, qid))
+df_grades = df_grades.sort_values(by=['Group submission #'], kind='stable')
 df_grades.to_csv("conn_group_indiv.csv", index=False)
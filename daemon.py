@@ -0,0 +1,321 @@
+import os
+import sys
+import io
+import json
+import time
+import copy
+import socket
+import importlib
+import traceback
+import subprocess
+import contextlib
+
+# A long-lived grading daemon, so that repeated operations from main.py run in an already-warm process,
+# instead of each one paying for a new interpreter, the pandas/numpy imports, and re-reading every CSV.
+# :: The daemon keeps config.json, Canvas rosters, and each assignment's rubric and parsed gradesheets in memory
+# :: (re-scoring only the question CSVs that changed; see incremental.py), and runs commands sent over a Unix socket.
+# :: Assignments it re-scores are saved to the grade store (see store.py), for scripts run outside the daemon.
+# :: A command's output is streamed back to the client, and its prompts are answered from the client's terminal.
+# :: The daemon exits after IDLE_TIMEOUT, or when any of the grading code changes (the client then starts a new one).
+# :: Usage: python daemon.py [start|stop|status]
+
+# Where the daemon listens, relative to the course directory (the one with config.json)
+SOCKET_PATH = ".grading_daemon.sock"
+# Where the daemon's own output (not its commands') goes
+LOG_PATH = ".grading_daemon.log"
+# How long the daemon waits for a command before exiting, in seconds
+IDLE_TIMEOUT = 3*60*60
+# How long to wait for a new daemon to start listening, in seconds
+START_TIMEOUT = 30
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# Commands the daemon runs (see the Session methods of the same names)
+COMMANDS = ["analyze_grades", "calc_slips", "status"]
+
+# Sends a message (a dict) over a connection's file.
+def send(f, **msg):
+    f.write(json.dumps(msg) + "\n")
+    f.flush()
+
+# Receives a message (a dict) from a connection's file.
+def receive(f):
+    line = f.readline()
+    if not line:
+        raise ConnectionError("Connection closed.")
+    return json.loads(line)
+
+# Modification times of the grading code, to tell when the daemon is running old code.
+def code_mtimes():
+    return { entry.path: entry.stat().st_mtime_ns for entry in os.scandir(BASE_PATH) if entry.name.endswith(".py") }
+
+''' === DAEMON === '''
+# Stands in for stdout (and stderr) while running a command, sending what's written to the client.
+class ClientOutput(io.TextIOBase):
+    def __init__(self, f):
+        self.f = f
+    def writable(self):
+        return True
+    def write(self, s):
+        if len(s) > 0:
+            send(self.f, out=s)
+        return len(s)
+
+# Stands in for stdin while running a command, asking the client for each line (e.g., for input()).
+class ClientInput(io.TextIOBase):
+    def __init__(self, f):
+        self.f = f
+    def readable(self):
+        return True
+    def readline(self, size=-1):
+        send(self.f, input=True)
+        line = receive(self.f).get("line")
+        return "" if line is None else line + "\n" # "" is end of input
+
+# What the daemon keeps in memory between commands.
+# :: Everything is reloaded when it changes on disk: config.json, rosters and rubrics by modification time,
+# :: and gradesheets by IncrementalGrades (see incremental.py).
+class Session:
+    def __init__(self):
+        self.started = time.time()
+        self.code = code_mtimes()
+        self.mtimes = dict() # path -> modification time when last loaded
+        self.config_info = None
+        self.slip_days_config = None # the config slip_days.py was last (re)imported with
+        self.rosters = dict() # path -> dict of Student objects (see load.roster)
+        self.assignments = dict() # (rubric path, data dir) -> IncrementalGrades
+
+    # Whether the file at path changed since this was last called for it.
+    def changed(self, path):
+        mtime = os.stat(path).st_mtime_ns
+        if self.mtimes.get(path) == mtime:
+            return False
+        self.mtimes[path] = mtime
+        return True
+
+    def config(self):
+        import load
+        if self.changed("config.json") or self.config_info is None:
+            self.config_info = load.config()
+        return self.config_info
+
+    # A copy of the roster at path (callers flag students' late and missing submissions on it).
+    def roster(self, path):
+        import load
+        if self.changed(path) or path not in self.rosters:
+            self.rosters[path] = load.roster(path)
+        return copy.deepcopy(self.rosters[path])
+
+    # The (refreshed) IncrementalGrades of an assignment. Don't modify its grades; they're shared between commands.
+    # :: If given the assignment's name, also saves its grades to the grade store, if the store's are out of date.
+    def assignment(self, rubric_path, csv_dir, name=None):
+        import store
+        from incremental import IncrementalGrades
+        key = (rubric_path, csv_dir)
+        info = { "rubric": rubric_path, "data": csv_dir }
+        fprint = store.fingerprint(info) if name is not None and store.USE_GRADE_STORE else None
+        if self.changed(rubric_path) or key not in self.assignments:
+            self.assignments[key] = IncrementalGrades(rubric_path, csv_dir)
+        grades = self.assignments[key]
+        updated = grades.refresh()
+        if updated is not None and len(updated) > 0:
+            print("Re-scored {} question(s) of {}".format(len(updated), csv_dir))
+        if fprint is not None:
+            store.save(name, info, grades.grades, grades.rubric, grades.questions, fprint)
+        return grades
+
+    # Like grades.load_many, but from memory.
+    def load_many(self, assignments, to_pandas_df=False, only_submitted=True, processes=None):
+        from grades import to_pandas
+        loaded = dict()
+        for name, info in assignments.items():
+            grades = self.assignment(info["rubric"], info["data"], name)
+            table = grades.grades
+            if only_submitted:
+                table = table[table.column('was_submitted')]
+            loaded[name] = (to_pandas(table) if to_pandas_df else table, grades.rubric, grades.questions)
+        return loaded
+
+    # Runs the grades.py reports for an assignment (prompting for one if not given).
+    # :: The TA grade distribution isn't plotted, as the daemon has no window to show it in; run grades.py for that.
+    def analyze_grades(self, assn_name=None):
+        import load
+        from grades import report
+        config = self.config()
+        if assn_name in config["assignments"]:
+            assn_info = config["assignments"][assn_name]
+        else:
+            assn_name, assn_info = load.promptSelectAssignment(config)
+        print("\n== Loading grades for assignment '{}' ==".format(assn_info["rubric"]))
+        grades = self.assignment(assn_info["rubric"], assn_info["data"], assn_name)
+        report(grades.grades, grades.rubric, grades.questions, grades.scores_sheet is not None, show_plot=False)
+
+    # Runs slip_days.py, re-importing it whenever config.json changes (as it reads the config on import).
+    def calc_slips(self):
+        config = self.config()
+        import slip_days
+        if self.slip_days_config is not config:
+            if self.slip_days_config is not None:
+                importlib.reload(slip_days)
+            self.slip_days_config = config
+        slip_days.calculate_slip_days(load_assignments=self.load_many, load_roster=self.roster)
+
+    def status(self):
+        print("Grading daemon up for {:.0f} min, with {} assignment(s) in memory:".format((time.time() - self.started) / 60, len(self.assignments)))
+        for (rubric_path, csv_dir), grades in self.assignments.items():
+            print(" - {} ({} questions, {} rows)".format(csv_dir, len(grades.questions), len(grades.grades)))
+
+    # Handles one connection. Returns False if the daemon should exit.
+    def handle(self, f):
+        try:
+            request = receive(f)
+        except (ConnectionError, ValueError):
+            return True # e.g., a client checking that we're up
+        op, args = request.get("op"), request.get("args", [])
+        if op == "stop":
+            send(f, exit=0)
+            return False
+        if code_mtimes() != self.code:
+            send(f, restart=True)
+            return False
+        if op not in COMMANDS:
+            send(f, out="Unknown command: {}\n".format(op), exit=1)
+            return True
+
+        code = 0
+        stdin = sys.stdin
+        out = ClientOutput(f)
+        try:
+            sys.stdin = ClientInput(f)
+            with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+                try:
+                    getattr(self, op)(*args)
+                except SystemExit as e: # scripts exit(...) on errors
+                    code = e.code if isinstance(e.code, int) else int(e.code is not None)
+                except ConnectionError:
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    code = 1
+            send(f, exit=code)
+        except (ConnectionError, ValueError):
+            print("Client disconnected during", op)
+        finally:
+            sys.stdin = stdin
+        return True
+
+# Listens for commands until stopped, idle for idle_timeout seconds, or the grading code changes.
+def serve(path=SOCKET_PATH, idle_timeout=IDLE_TIMEOUT):
+    # Pay for the imports once, before listening
+    # :: (pandas and numpy are imported lazily by the grading modules, so use them to actually load them; see lazy.py)
+    import grades, incremental
+    grades.pd.DataFrame, grades.np.ndarray
+    session = Session()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if os.path.exists(path):
+        os.remove(path) # left over from a daemon that died
+    server.bind(path)
+    server.listen()
+    server.settimeout(idle_timeout)
+    print("Grading daemon {} listening on {}".format(os.getpid(), path), flush=True)
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                print("Exiting after {} s idle.".format(idle_timeout))
+                break
+            conn.settimeout(None)
+            with conn, conn.makefile('rw', encoding='utf-8', newline='\n') as f:
+                if not session.handle(f):
+                    break
+    finally:
+        server.close()
+        os.remove(path)
+        print("Grading daemon {} stopped.".format(os.getpid()), flush=True)
+
+''' === CLIENT === '''
+# Connects to the daemon listening at path. Returns None if there isn't one.
+def connect(path=SOCKET_PATH):
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+    except OSError: # left over from a daemon that died
+        conn.close()
+        return None
+    return conn
+
+# Starts a daemon in the background. Returns whether it's listening (within START_TIMEOUT).
+def start(path=SOCKET_PATH):
+    if not hasattr(socket, "AF_UNIX"):
+        return False
+    print("Starting the grading daemon (stop it with 'python daemon.py stop')...")
+    with open(LOG_PATH, 'a') as log:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve"], stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    deadline = time.time() + START_TIMEOUT
+    while time.time() < deadline:
+        conn = connect(path)
+        if conn is not None:
+            conn.close()
+            return True
+        time.sleep(0.05)
+    print("Error: The grading daemon didn't start. See", LOG_PATH)
+    return False
+
+# Runs a command on the daemon (starting one if need be), relaying its output and prompts through this terminal.
+# :: Returns the command's exit code, or None if there's no daemon to run it on (e.g., on Windows),
+# :: in which case, run the script directly instead.
+def run(op, args=[], path=SOCKET_PATH, start_if_needed=True):
+    for attempt in range(2):
+        conn = connect(path)
+        if conn is None:
+            if not start_if_needed or not start(path):
+                return None
+            conn = connect(path)
+            if conn is None:
+                return None
+        with conn, conn.makefile('rw', encoding='utf-8', newline='\n') as f:
+            send(f, op=op, args=args)
+            while True:
+                msg = receive(f)
+                if "out" in msg:
+                    sys.stdout.write(msg["out"])
+                    sys.stdout.flush()
+                if "input" in msg:
+                    try:
+                        line = input()
+                    except EOFError:
+                        line = None
+                    send(f, line=line)
+                if "exit" in msg:
+                    return msg["exit"]
+                if "restart" in msg:
+                    break
+        # The grading code changed, so the daemon exited. Wait for it to stop listening, then start a new one.
+        print("(The grading code changed since the daemon started. Restarting it.)")
+        deadline = time.time() + START_TIMEOUT
+        while os.path.exists(path) and time.time() < deadline:
+            time.sleep(0.05)
+    return None
+
+# Command-line control of the daemon.
+# :: Usage: python daemon.py [start|stop|status]
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "start"
+    if cmd == "serve":
+        serve()
+    elif cmd == "start":
+        conn = connect()
+        if conn is not None:
+            conn.close()
+            print("The grading daemon is already running.")
+        elif start():
+            print("Started.")
+    elif cmd in ["stop", "status"]:
+        if run(cmd, start_if_needed=False) is None:
+            print("The grading daemon isn't running.")
+    else:
+        print("Unknown command:", cmd)
@@ -1,10 +1,9 @@
-# Import smtplib for the actual sending function
-import smtplib, ssl
-import time
+# Import mailer and outbox for the actual sending functions
+import mailer
+import outbox
 import os
 import pandas as pd
 import load
-from getpass import getpass
 
 # Load central config json
 config = load.config()
@@ -92,57 +91,39 @@ if PRINT_TO_CONSOLE:
     exit(0)
 
 # == SEND EMAILS ==
-print("Opening email port...\n(If you're using GMail, please ensure 'Less secure app access' is ON in GMail settings: https://support.google.com/accounts/answer/6010255?hl=en )")
-port = 465  # For SSL
-smtp_server = "smtp.gmail.com"
-sender_email = input("Type your gmail address: ") # Enter your address
-password = getpass("Type your password and press enter: ")
-
-# Create a secure SSL context
-context = ssl.create_default_context()
-
-# Check if there's already a list of names. This helps us
-# keep state as the GMail server might kick us out at random moments.
-emails_sent = []
-if os.path.isfile(TEMP_STORAGE):
-    with open(TEMP_STORAGE) as f:
-        txt = f.read()
-        emails_sent = txt.split(",")
-
-# Login and send email
-excepted = False
-with smtplib.SMTP_SSL(smtp_server, port, context=context) as server:
-    server.login(sender_email, password)
-    # Loop through messages to each student
-    for name, receiver_email, message in msgs:
-        # Skip anyone who has already been messaged:
-        if receiver_email in emails_sent: continue
-
-        # Try to send email to student
-        print("Sending to", name, receiver_email)
-        try:
-            server.sendmail(sender_email, receiver_email, message)
-        except Exception as e:
-            # Server failed us. Print error + break out of loop.
-            print("Server error: {0}".format(err))
-            excepted = True
-            break
-
-        # Keep track of what was sent
-        emails_sent.append(receiver_email)
-
-        # Wait 3 seconds so gmail doesn't get angry at us
-        time.sleep(3)
-
-# If there was an exception, save which emails were sent.
-# Otherwise, delete the "sent emails" file, since everyone's been sent an email.
-if excepted:
-    print("Terminated prematurely. Saving which emails were successfully sent...")
-    txt = ",".join(emails_sent)
-    with open(TEMP_STORAGE, 'w') as f:
-        f.write(txt)
-else:
+# :: Messages are spooled to the outbox (see outbox.py) before any are sent, and every send is journaled there,
+# :: so if this is stopped midway, re-running it sends the rest of the *same* messages, and nobody gets one twice.
+# :: Once everything is sent, the next run starts a new batch, so everyone is emailed again (even if their email is unchanged).
+box = outbox.Outbox()
+outbox.warn_uncertain(box)
+pending = box.pending()
+if len(pending) > 0 and input("The outbox has {} unsent email(s) from a previous run. Type 'd' to discard them and send the new ones instead, or anything else to resume sending them: ".format(len(pending))) == 'd':
+    box.clear()
+    pending = []
+if len(pending) == 0:
+    if len(box.uncertain()) == 0:
+        box.new_batch() # (everything from the last run went out; otherwise, keep holding back its uncertain emails)
+    # Anyone emailed by a run from before the outbox existed (which kept who it emailed in TEMP_STORAGE) is skipped
+    emails_sent = []
+    if os.path.isfile(TEMP_STORAGE):
+        with open(TEMP_STORAGE) as f:
+            emails_sent = f.read().split(",")
+    box.add_all([(receiver_email, message) for _, receiver_email, message in msgs if receiver_email not in emails_sent])
     if os.path.isfile(TEMP_STORAGE):
         os.remove(TEMP_STORAGE)
+    pending = box.pending()
+print("Sending {} emails...".format(len(pending)))
+
+# Login and send emails, over a few connections at a limited rate, so gmail doesn't get angry at us (see mailer.py)
+sender, sender_email = mailer.from_config(config)
+sent, failed = box.drain(sender, sender_email)
+
+# If anything failed, it stays in the outbox, to send next time.
+if len(failed) > 0:
+    print("Could not send {} email(s):".format(len(failed)))
+    for receiver_email, error in failed:
+        print(" -", receiver_email, error)
+    print("They're kept in the outbox ({}). Re-run (or run python outbox.py drain) to send them.".format(box.path))
+box.close()
 
 print("Done!")
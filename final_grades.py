@@ -1,9 +1,19 @@
-from grades import load_grades
+from policy import GradePolicy
+import profiling
+import store
+from quizzes import load_quizzes, load_exceptions, calendar_from_config
+import load
+import ingest
 import os
-import json
-import pandas as pd
-import dateutil.parser
-import numpy as np
+import sys
+from lazy import lazy_import
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+
+# Usage: python final_grades.py [--profile]
+# :: With --profile, saves the time and memory each stage took to profile.json, and prints a summary (see profiling.py).
+if "--profile" in sys.argv:
+    profiling.enable()
 
 ''' === SETUP === '''
 # Path to the Canvas roster (download Gradebook csv) for this class.
@@ -50,27 +60,12 @@ rubric_data_map = {
     'mp4': 'mp4'
 }
 
-# Grade mapping
-letter_grade_map = {
-    97.5: "A+",
-    93.5: "A",
-    90: "A-",
-    87.5: "B+",
-    83.5: "B",
-    80: "B-",
-    77.5: "C+",
-    73.5: "C",
-    70: "C-",
-    60: "D",
-    0: "F"
-}
+# The grading policy (category weights, drops, letter grade cutoffs, etc.) is set in config.json, under "finalGradePolicy".
+# :: See policy.py for the format.
+POLICY = GradePolicy.from_config(load.config())
 ''' === END SETUP === '''
 
 ''' === HELPER CODE === '''
-def grade_mapping(final_grade):
-    for key, letter in letter_grade_map.items():
-        if final_grade >= key:
-            return letter
 # Wrapper class for students
 class Student:
     def __init__(self, email, sid, name):
@@ -95,195 +90,116 @@ class Student:
 ''' === END HELPER CODE === '''
 
 ''' === LOAD SLIP DAYS === '''
-# "Each slip day beyond the 7 allowed for the course will result in a deduction of 1/2 point from your final grade"
-slip_days = dict()
-def read_slips(row):
-    slip_days[row['Email'].strip()] = int(row['Slip Days Remaining'])
-# the final used slip days, to factor into the final grade
-df = pd.read_csv(PATH_TO_SLIP_DAYS_CSV)
-df.apply(read_slips, axis=1)
+with profiling.stage("load_slip_days") as s:
+    # "Each slip day beyond the 7 allowed for the course will result in a deduction of 1/2 point from your final grade"
+    slip_days = dict()
+    def read_slips(row):
+        slip_days[row['Email'].strip()] = int(row['Slip Days Remaining'])
+    # the final used slip days, to factor into the final grade
+    df = pd.read_csv(PATH_TO_SLIP_DAYS_CSV)
+    df.apply(read_slips, axis=1)
+    s.rows = len(df)
 
 ''' === LOAD STUDENT ROSTER === '''
-# The full list of students in the class, a dict of Student objs indexed by sid
-roster = dict()
-df = pd.read_csv(PATH_TO_CANVAS_ROSTER)
-df.drop(index=[1, 2, len(df)-1], inplace=True)
-df.dropna(subset=['SIS User ID'], inplace=True)
-def read_student(row):
-    sid = int(row['SIS User ID'])
-    email = row['SIS Login ID']+"@cornell.edu"
-    name = row['Student']
-    roster[sid] = Student(email, sid, name)
-    roster[sid].set_grade('extra_credit_1', float(row['Active Learning Initiative Survey (221004)']))
-df.apply(read_student, axis=1)
+with profiling.stage("load_roster") as s:
+    # The full list of students in the class, a dict of Student objs indexed by sid
+    roster = dict()
+    df = ingest.read_roster(PATH_TO_CANVAS_ROSTER, extra_columns={'Active Learning Initiative Survey (221004)': "float64"})
+    def read_student(row):
+        sid = int(row['SIS User ID'])
+        email = row['SIS Login ID']+"@cornell.edu"
+        name = row['Student']
+        roster[sid] = Student(email, sid, name)
+        roster[sid].set_grade('extra_credit_1', float(row['Active Learning Initiative Survey (221004)']))
+    df.apply(read_student, axis=1)
+    s.rows = len(roster)
 
 ''' === LOAD FINAL EXAM GRADES === '''
-def read_final_exam(row):
-    sid = int(row['SID'])
-    roster[sid].set_grade('final_exam', int(row['Total Score']))
-final_csvs = [entry.path for entry in os.scandir(PATH_TO_FINALS) if entry.path.endswith(".csv")]
-for csv in final_csvs:
-    df = pd.read_csv(csv)
-    df = df[df['Status']=='Graded'] # Consider only exams marked Graded
-    df.apply(read_final_exam, axis=1) # Read exam score into the dictionary of Students
+with profiling.stage("load_final_exams"):
+    def read_final_exam(row):
+        sid = int(row['SID'])
+        roster[sid].set_grade('final_exam', int(row['Total Score']))
+    final_csvs = [entry.path for entry in os.scandir(PATH_TO_FINALS) if entry.path.endswith(".csv")]
+    for csv in final_csvs:
+        df = ingest.read_scores_sheet(csv)
+        df = df[df['Status']=='Graded'] # Consider only exams marked Graded
+        df.apply(read_final_exam, axis=1) # Read exam score into the dictionary of Students
 
 ''' === LOAD SECOND ATI SURVEY EXTRA CREDIT === '''
-emails_to_sids = {}
-for sid, student in roster.items():
-    emails_to_sids[student.email] = sid
-def read_ati_survey_2(row):
-    email = row['netid'].strip().lower() + "@cornell.edu"
-    if email not in emails_to_sids:
-        print("Warning: Student", email, "that took ATI Survey 2 is not in final Canvas roster. Skipping.")
-        return
-    sid = emails_to_sids[email]
-    roster[sid].set_grade('extra_credit_2', 3)
-df = pd.read_csv(PATH_TO_ATI_SURVEY_2)
-df.apply(read_ati_survey_2, axis=1)
+with profiling.stage("load_ati_survey_2") as s:
+    emails_to_sids = {}
+    for sid, student in roster.items():
+        emails_to_sids[student.email] = sid
+    def read_ati_survey_2(row):
+        email = row['netid'].strip().lower() + "@cornell.edu"
+        if email not in emails_to_sids:
+            print("Warning: Student", email, "that took ATI Survey 2 is not in final Canvas roster. Skipping.")
+            return
+        sid = emails_to_sids[email]
+        roster[sid].set_grade('extra_credit_2', 3)
+    df = pd.read_csv(PATH_TO_ATI_SURVEY_2)
+    df.apply(read_ati_survey_2, axis=1)
+    s.rows = len(df)
 
 ''' === LOAD QUIZ GRADES === '''
-# :: Quiz names should be in format: [Month#]-[Day#]
-quiz_exceptions = {}
-if PATH_TO_QUIZ_EXCEPTIONS_JSON:
-    with open(PATH_TO_QUIZ_EXCEPTIONS_JSON) as f:
-      quiz_exceptions = json.load(f)
-quizzes = []
-for entry in os.scandir(PATH_TO_QUIZ_DIR):
-    if not entry.path.endswith(".csv"): continue
-
-    # Extract file name
-    filename = os.path.splitext(os.path.basename(entry.path))[0]
-    assn_name = 'quiz-'+filename
-    quizzes.append(assn_name)
-
-    # Calculate the proper submission time for this quiz,
-    # assuming csv files are named with the dates quizzes were due...
-    month, day = filename.split('-')
-    if len(day) == 1:
-        day = '0'+day
-    # Note that it SHOULD be 16:20 UTC to correspond to 12:20 EST, HOWEVER
-    # for some reason Canvas is off by 1 hour (maybe daylight savings...?)
-    # :: I give 1 minute grace period for quizzes
-    if int(month) < 4 or (int(month) == 3 and int(day) < 14):
-        proper_submission_time = dateutil.parser.parse('2021-0{}-{} 17:21:00 UTC'.format(month, day))
-    else:
-        proper_submission_time = dateutil.parser.parse('2021-0{}-{} 16:21:00 UTC'.format(month, day))
-
-    # Special exception quizzes
-    if int(month) == 3 and int(day) == 25:
-        proper_submission_time = dateutil.parser.parse('2021-0{}-{} 03:59:00 UTC'.format(month, int(day)+1))
-
-    def calc_quiz_grade(row):
-        sid = row['sis_id']
-        if sid not in roster: return # if person dropped the class, skip
-        if filename in quiz_exceptions and \
-            sid in quiz_exceptions[filename]: return # people exempt from specific quizzes
-        datestring = row['submitted']
-        time_submitted = dateutil.parser.parse(datestring)
-        is_late = time_submitted > proper_submission_time # if it's late
-        score = 0.5 if is_late else 1
-        roster[sid].set_grade(assn_name, score)
-
-    # Read quiz data
-    df = pd.read_csv(entry.path)
-
-    # Keep only the very *first* attempt (we only care about lateness, not score)
-    # :: https://stackoverflow.com/questions/15705630/get-the-rows-which-have-the-max-value-in-groups-using-groupby
-    df.sort_values('attempt', ascending=True).drop_duplicates(['sis_id'], inplace=True)
-
-    # For each student's attempt, calculate lateness + final score:
-    df.apply(calc_quiz_grade, axis=1)
+with profiling.stage("load_quizzes") as s:
+    # :: Quiz names should be in format: [Month#]-[Day#]. Deadlines are set under "quizCalendar" in config.json (see quizzes.py).
+    quiz_scores = load_quizzes(PATH_TO_QUIZ_DIR, calendar_from_config(load.config()), load_exceptions(PATH_TO_QUIZ_EXCEPTIONS_JSON), sids=roster.keys())
+    quizzes = list(quiz_scores.keys())
+    for assn_name, scores in quiz_scores.items():
+        for sid, score in scores.items():
+            roster[sid].set_grade(assn_name, score)
+    s.rows = len(quizzes)
 
 ''' === LOAD ASSIGNMENT GRADES === '''
-# The max scores/points for each assignment
-max_score = dict()
-max_score['mp3'] = 100.0
-
-# For each assignment, extract grades and set in that Student obj
-# :: NOTE: We have to keep track of slip days *chronologically* w/ assignments
-# :: in order to decide when to take off for lateness.
-for rubric_name, dir_name in rubric_data_map.items():
-    rubric_path, data_path = os.path.join('rubrics', rubric_name+'.json'), os.path.join('data', dir_name)
-    if not (os.path.exists(rubric_path) and os.path.exists(data_path)):
-        print('Skipping assignment "{}": Could not find rubric or data.'.format(rubric_path))
-        continue
-    grades, rubric, questions = load_grades(rubric_path, data_path, only_submitted=True)
-    max_score[rubric_name] = rubric['maxScore']
-    for g in grades:
-        sid = g['sid']
-        if sid not in roster: continue # this student dropped
-
-        # Set/add grade for this assignment to the student's score:
-        score = g['total_score']
-        roster[sid].add_grade(rubric_name, score)
+with profiling.stage("load_assignments"):
+    # The max scores/points for each assignment
+    # :: (Ones without a rubric, like mp3 = mp3_indiv + mp3_group, are set in the policy.)
+    max_score = dict()
+
+    # For each assignment, extract grades and set in that Student obj
+    # :: NOTE: We have to keep track of slip days *chronologically* w/ assignments
+    # :: in order to decide when to take off for lateness.
+    assns_to_load = dict()
+    for rubric_name, dir_name in rubric_data_map.items():
+        rubric_path, data_path = os.path.join('rubrics', rubric_name+'.json'), os.path.join('data', dir_name)
+        if not (os.path.exists(rubric_path) and os.path.exists(data_path)):
+            print('Skipping assignment "{}": Could not find rubric or data.'.format(rubric_path))
+            continue
+        assns_to_load[rubric_name] = { "rubric": rubric_path, "data": data_path }
+    # :: Each student's total is summed in the grade store (see store.py), which only re-parses assignments that changed.
+    # :: Assignments come back in the order of rubric_data_map.
+    for rubric_name, (max_points, totals) in store.assignment_totals(assns_to_load, only_submitted=True).items():
+        max_score[rubric_name] = max_points
+        for sid, score in totals.items():
+            if sid not in roster: continue # this student dropped
+
+            # Set/add grade for this assignment to the student's score:
+            roster[sid].add_grade(rubric_name, score)
 
 
 
 ''' === ADD EXTRA CREDIT BONUSES === '''
-print("\n== Adding extra credit bonus points ==")
-for sid, student in roster.items():
-    if student.grade_for('extra_credit_1') > 0:
-        student.add_grade('dw1', 1)
-        print(' - 1 pt EC to DW1 for', roster[sid].name, roster[sid].email)
-    if student.grade_for('extra_credit_2') > 0:
-        student.add_grade('dw5', 3)
-        print(' - 3 pt EC to DW5 for', roster[sid].name, roster[sid].email)
+with profiling.stage("extra_credit") as s:
+    print("\n== Adding extra credit bonus points ==")
+    for sid, student in roster.items():
+        if student.grade_for('extra_credit_1') > 0:
+            student.add_grade('dw1', 1)
+            print(' - 1 pt EC to DW1 for', roster[sid].name, roster[sid].email)
+        if student.grade_for('extra_credit_2') > 0:
+            student.add_grade('dw5', 3)
+            print(' - 3 pt EC to DW5 for', roster[sid].name, roster[sid].email)
+    s.rows = len(roster)
 
 ''' === THE FINAL COUNTDOWN TALLY === '''
-# Now we should have all grades loaded. For each student, we need to tally grades
-print('\n{:>20s}\t{}\t{}\t{}\t{}\t{}\t{}\t{}'.format('Name', 'DW', 'MP', 'Quiz', 'Exam', 'Slip', 'Total', 'Letter'))
-final_grades = []
-for sid, student in roster.items():
-
-    # Design workbook tally -- regular
-    dropped_dw4 = False
-    if student.grade_for('dw4') > 0:
-        dw_total_score = sum([max_score[a] for a in ['checkin', 'dw1', 'dw2', 'dw3', 'dw4', 'dw5']])
-        dw_percent = sum([student.grade_for(a) for a in ['checkin', 'dw1', 'dw2', 'dw3', 'dw4', 'dw5']]) / dw_total_score
-    else:
-        dropped_dw4 = True
-        dw_total_score = sum([max_score[a] for a in ['checkin', 'dw1', 'dw2', 'dw3', 'dw5']])
-        dw_percent = sum([student.grade_for(a) for a in ['checkin', 'dw1', 'dw2', 'dw3', 'dw5']]) / dw_total_score
-    # Design workbook tally -- where dw1 is downweighted
-    if student.grade_for('dw4') > 0:
-        dw_total_score = sum([max_score[a] for a in ['checkin', 'dw2', 'dw3', 'dw4', 'dw5']]) + 60
-        dw_percent_2 = (sum([student.grade_for(a) for a in ['checkin', 'dw2', 'dw3', 'dw4', 'dw5']]) + student.grade_for('dw1')*3/5.0) / dw_total_score
-    else:
-        dropped_dw4 = True
-        dw_total_score = sum([max_score[a] for a in ['checkin', 'dw2', 'dw3', 'dw5']]) + 60
-        dw_percent_2 = (sum([student.grade_for(a) for a in ['checkin', 'dw2', 'dw3', 'dw5']]) + student.grade_for('dw1')*3/5.0) / dw_total_score
-    # Take largest for final DW grade:
-    dw_final_perc = max(dw_percent, dw_percent_2)
-
-    dw_scores = ''
-    for a in ['checkin', 'dw1', 'dw2', 'dw3', 'dw4', 'dw5']:
-        if a == 'dw4' and dropped_dw4:
-            dw_scores += "(dropped: {:.1f}) ".format(student.grade_for(a) / max_score[a] * 100)
-        else:
-            dw_scores += "{:.1f} ".format(student.grade_for(a) / max_score[a] * 100)
-
-    # Miniprojects --all weighted equally
-    mp_final_perc = 0
-    mp_scores = ''
-    student.set_grade('mp3', student.grade_for('mp3_indiv') + student.grade_for('mp3_group'))
-    for a in ['mp1', 'mp2', 'mp3', 'mp4']:
-        perc = student.grade_for(a) / max_score[a]
-        mp_final_perc += perc
-        mp_scores += "{:.1f} ".format(perc*100)
-    mp_final_perc /= 4.0
-
-    # Tally total quiz score (percentage)
-    quiz_final_perc = sum([student.grade_for(q) for q in quizzes]) / len(quizzes)
-
-    # Extract final exam score (if taken)
-    exam_final_perc = student.grade_for('final_exam') / 100.0
-
-    # Tally any slip days
-    slip_mod = 0
-    if student.email in slip_days:
-        slips = slip_days[student.email]
-        if slips < 0:
-            slip_mod = -0.5 * slips
+with profiling.stage("tally") as s:
+    # Now we should have all grades loaded. Grade the whole roster at once, as a (students x assignments) score matrix:
+    print('\n{:>20s}\t{}\t{}\t{}\t{}\t{}\t{}\t{}'.format('Name', 'DW', 'MP', 'Quiz', 'Exam', 'Slip', 'Total', 'Letter'))
+    students = list(roster.values())
+    assn_names = list(max_score.keys()) + quizzes + ['final_exam']
+    scores = np.array([[student.grade_for(a) for a in assn_names] for student in students], dtype=np.float64).reshape(len(students), len(assn_names))
+    slips_remaining = [slip_days.get(student.email, 0) for student in students]
+    result = POLICY.grade(assn_names, scores, max_score, slips_remaining)
 
     '''(Sample calculation from last year:
     Design responses: 93.166664 DR: 95.0 89.5 (dropped: 76.5) 90.0 95.0 97.5 92.0
@@ -291,16 +207,21 @@ for sid, student in roster.items():
     Final exam: 95.8 (Exam grade: 94.8; Extra credit: 1.0)
     Participation: 100.0")'''
 
-    # Final percentage grade
-    if exam_final_perc == 0:
-        final_grade = (40*dw_final_perc + 40*mp_final_perc + 5*quiz_final_perc) / 85.0 * 100 - slip_mod
-    else:
-        final_grade = (40*dw_final_perc + 40*mp_final_perc + 5*quiz_final_perc + 15*exam_final_perc) - slip_mod
+    # Lists each assignment percentage in a category, marking the dropped ones
+    def category_scores(category, i):
+        return ''.join([("(dropped: {:.1f}) " if dropped else "{:.1f} ").format(perc*100) for perc, dropped in \
+                        zip(result['scores'][category][i], result['dropped'][category][i])])
 
-    # Calculate final letter grade
-    final_letter_grade = grade_mapping(final_grade)
+    # Points docked for slip days, as a negative number (or 0, not -0.0, if none were)
+    def slip_mod(penalty):
+        return -float(penalty) if penalty != 0 else 0
 
-    final_grades.append((student.name, student.email, student.sid, dw_final_perc*100, dw_scores, mp_final_perc*100, mp_scores, quiz_final_perc*100, exam_final_perc*100, -slip_mod, final_grade, final_letter_grade))
+    final_grades = []
+    percents = result['percents']
+    for i, student in enumerate(students):
+        final_grades.append((student.name, student.email, student.sid, percents['dw'][i]*100, category_scores('dw', i), percents['mp'][i]*100, category_scores('mp', i), \
+                             percents['quiz'][i]*100, percents['exam'][i]*100, slip_mod(result['penalty'][i]), result['final'][i], result['letters'][i]))
+    s.rows = len(students)
 
 ''' === PRETTY PRINT FINAL GRADE TABLE === '''
 final_grades.sort(key=lambda x: x[10]) # sort by final grade
@@ -314,8 +235,11 @@ for b, f in zip(bins[1:], frequency):
     print(round(b, 1), ' '.join(np.repeat('*', f)))
 
 ''' === EXPORT FINAL GRADE TABLE === '''
-df_slips = pd.DataFrame(final_grades, columns=["Name", "Email", "SID", "DW Final", "DWs: Checkin 1 2 3 (4) 5", "MP Final", "MPs: 1 2 [3_indiv 3_group] 4", "Quizzes", "Final Exam", "Slip Penalty (points docked from final percentage)", "Final Perc", "Calc Letter Grade"])
-df_slips.to_csv("final_grades.csv", index=False)
+with profiling.stage("export") as s:
+    df_slips = pd.DataFrame(final_grades, columns=["Name", "Email", "SID", "DW Final", "DWs: Checkin 1 2 3 (4) 5", "MP Final", "MPs: 1 2 [3_indiv 3_group] 4", "Quizzes", "Final Exam", "Slip Penalty (points docked from final percentage)", "Final Perc", "Calc Letter Grade"])
+    df_slips.to_csv("final_grades.csv", index=False)
+    s.rows = len(df_slips)
+profiling.finish()
 
 ''' ------------------------------------------------------ '''
 ''' === EXPORT STUDENT GRADE REPORTS (PDFs; optional) === '''
@@ -1,4 +1,5 @@
 from grades import load_grades
+import ingest
 import os
 import json
 import pandas as pd
@@ -15,9 +16,7 @@ PATH_TO_CANVAS_ROSTER_CURR = "data/roster/roster_fa21_curr.csv"
 # The full list of students in the class, a dict of Student objs indexed by sid
 def read_roster(path):
     roster = []
-    df = pd.read_csv(path)
-    df.drop(index=[1, 2, len(df)-1], inplace=True)
-    df.dropna(subset=['SIS User ID'], inplace=True)
+    df = ingest.read_roster(path)
     def read_student(row):
         sid = int(row['SIS User ID'])
         email = row['SIS Login ID']+"@cornell.edu"
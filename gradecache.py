@@ -0,0 +1,94 @@
+import os
+import json
+import pickle
+import hashlib
+
+# Where parsed + scored gradesheets are cached between runs.
+CACHE_DIR = ".grading_cache/sheets"
+# Max total size of the cache (in bytes). Least recently used entries are evicted past this.
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Bump this whenever the format of what's cached changes, so old entries are ignored.
+CACHE_VERSION = 2
+
+# Hash of a file's contents
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+# Hash of a rubric (a JSON object)
+def rubric_hash(rubric):
+    return hashlib.sha256(json.dumps(rubric, sort_keys=True).encode('utf-8')).hexdigest()
+
+# Combines the given parts (strings, numbers) into a single cache key
+def cache_key(*parts):
+    h = hashlib.sha256(str(CACHE_VERSION).encode('utf-8'))
+    for p in parts:
+        h.update(b'\0' + str(p).encode('utf-8'))
+    return h.hexdigest()
+
+# Size-bounded, on-disk LRU cache of pickled objects.
+# :: Entries are written atomically, so several processes can share the cache.
+class SheetCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    # Returns the object cached under key, or None if there isn't one.
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path) # mark as recently used
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("Warning: Ignoring unreadable cache entry", path, "({})".format(e))
+            self.remove(path)
+            return None
+
+    def put(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    # Removes least recently used entries until the cache fits in max_bytes.
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".pkl"): continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes: break
+            self.remove(path)
+            total -= size
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # Deletes everything in the cache.
+    def clear(self):
+        if not os.path.isdir(self.cache_dir): return
+        for entry in os.scandir(self.cache_dir):
+            self.remove(entry.path)
@@ -1,11 +1,18 @@
-import pandas as pd
 import os
 import sys
 import json
-import datetime
-import statistics as stat
-import numpy as np
-from difflib import get_close_matches
+from lazy import lazy_import
+pd = lazy_import("pandas")
+np = lazy_import("numpy")
+from columns import ColumnResolver, find_column, rubric_terms
+import gradecache
+import ingest
+import profiling
+import snapshot
+import store
+from gradetable import GradeTable, make_column, all_ints
+from groupstats import group_codes, grouped_stats, grouped_range
+from reports import ReportAggregator
 
 # == PART YOU CAN EDIT ==
 # NOTE: This file uses "config.json" to load rubric and grade csvs.
@@ -14,13 +21,27 @@ from difflib import get_close_matches
 # :: Generate CSVs from clicking "Export Evaluations" in GradeScope.
 # :: You can also include the 'scores' csv by clicking "Download Grades." Drop that
 # :: into the dir (don't rename it!) if you want more info on graded/ungraded and lateness.
-additional_scores_sheet = None
-# Whether to keep persistent timestamps on when a particular error was first seen
-# (Note: if the error is no longer present, it just won't appear.)
+# Whether to keep persistent timestamps on when a particular error was first seen (in an error ledger; see ledger.py)
+# (Note: if the error is no longer present, it just won't appear, but the ledger remembers it as resolved.)
 ERROR_CHECK_PERSISTENCE = False
 # Whether to show TA grade distribution plot
 SHOW_TA_GRADE_DIST = True
 SHOW_TA_GRADE_DIST_ONLY_TA = None # None # Default: None. Change to EXACT full name (string) to mask in only that TA
+# Flag a student whose question grades (of an assignment) vary by at least this many points (max - min)...
+OUTLIER_PT_DIFF = 5
+# ...or whose question grades' z-scores (against each question's mean) vary by at least this much (None to not check)...
+OUTLIER_Z_SPREAD = None
+# ...or whose question grades' median absolute deviation (from their median) is at least this many points (None to not check)
+OUTLIER_MAD = None
+# Flag a TA whose mean score on a question (or rubric item) is more than this many standard errors from all TAs' mean on it
+TA_FLAG_STDEVS = 2.5
+# ...but only if they graded at least this many submissions of it
+TA_FLAG_MIN_GRADED = 5
+# Whether to score each eval sheet column-by-column (fast) instead of row-by-row with calc_grade.
+# :: Both give identical grades; set to False to fall back to the original row-wise scorer.
+VECTORIZED_SCORING = True
+# Whether to cache parsed + scored gradesheets on disk (see gradecache.py), so unchanged CSVs aren't re-parsed.
+USE_GRADESHEET_CACHE = True
 # ===========================
 
 # Loads rubric JSON file
@@ -36,6 +57,7 @@ def load_rubric(rubric_path):
 # into separate columns.
 def to_pandas(grades):
     if len(grades) == 0: return None
+    if isinstance(grades, GradeTable): return grades.to_pandas()
     entries = []
     cols = list(grades[0].keys())
     for d in grades:
@@ -51,13 +73,155 @@ def to_pandas(grades):
     cols = cols[0:grade_col_idx] + rubric_items + cols[grade_col_idx+1:]
     return pd.DataFrame(entries, columns=cols)
 
+# Finds the GS eval sheets (as 'questions') and the optional scores sheet in csv_dir.
+# :: Recurses one level into subdirectories. Questions are ordered by file name.
+# :: Returns (questions, scores_sheet), where scores_sheet is None if there isn't one.
+# :: If csv_dir is a snapshot symlink (see snapshot.py), the paths are within the snapshot it points to now,
+# :: so the sheets all come from the same download even if a new one is swapped in while they're read.
+def scan_csv_dir(csv_dir):
+    questions = dict()
+    scores_sheet = None
+    def load_dir(dir_path, recurse=1):
+        nonlocal scores_sheet
+        for entry in sorted(os.scandir(dir_path), key=lambda e: e.name):
+            if os.path.isdir(entry.path) and recurse > 0:
+                load_dir(entry.path, recurse=0)
+            elif entry.path.endswith(".csv"):
+                filename = os.path.splitext(os.path.basename(entry.path))[0]
+                if "_scores" in filename:
+                    scores_sheet = entry.path
+                elif filename[-13:] == "Please_ignore":
+                    continue # skip the correction sheet
+                else:
+                    simplified_key = filename[:20]
+                    questions[simplified_key] = entry.path
+    load_dir(snapshot.resolve(csv_dir))
+    return questions, scores_sheet
+
+# Process pool to load in. Scripts like final_grades.py run at import time, so where possible
+# we fork workers instead of spawning them (spawned workers would re-run the calling script).
+def process_pool(processes=None):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    if "fork" in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("fork"))
+    return ProcessPoolExecutor(max_workers=processes)
+
+# Loads a GS scores sheet ("Download Grades") into its grading progress counts
+# and lateness per SID (see lateness_index). Cached like gradesheets are.
+def load_scores_sheet(path):
+    key = None
+    if USE_GRADESHEET_CACHE:
+        key = gradecache.cache_key('scores', gradecache.file_hash(path))
+        sheet = gradecache.SheetCache().get(key)
+        if sheet is not None:
+            return sheet
+
+    df = ingest.read_scores_sheet(path)
+    graded, ungraded = df['Status']=="Graded", df['Status']=="Ungraded"
+    ontime = df['Lateness (H:M:S)']=="00:00:00"
+    late_by_sid, dup_sids = lateness_index(df)
+    sheet = {
+        "num_graded": int(graded.sum()),
+        "num_ungraded": int(ungraded.sum()),
+        "num_ontime": int(ontime.sum()),
+        "num_graded_ontime": int((graded & ontime).sum()),
+        "num_ungraded_ontime": int((ungraded & ontime).sum()),
+        "num_graded_late": int((graded & ~ontime).sum()),
+        "num_ungraded_late": int((ungraded & ~ontime).sum()),
+        "late_by_sid": late_by_sid,
+        "dup_sids": dup_sids
+    }
+
+    if key is not None:
+        gradecache.SheetCache().put(key, sheet)
+    return sheet
+
+# Prints the grading progress in a scores sheet (from load_scores_sheet),
+# and marks each grade (in a GradeTable) with its lateness in minutes (as 'late').
+def attach_lateness(grades, sheet):
+    num_graded, num_ungraded = sheet['num_graded'], sheet['num_ungraded']
+    num_graded_ontime, num_ungraded_ontime = sheet['num_graded_ontime'], sheet['num_ungraded_ontime']
+    num_graded_late, num_ungraded_late = sheet['num_graded_late'], sheet['num_ungraded_late']
+
+    # (No submissions yet counts as all done)
+    def perc_done(graded, ungraded):
+        return 100*graded/(graded+ungraded) if graded + ungraded > 0 else 100.0
+
+    print("Total submissions: {} fully graded, {} left to grade ({:.2f}% done)".format(num_graded, num_ungraded, perc_done(num_graded, num_ungraded)))
+    print(" > Ontime submissions: {} fully graded, {} left to grade ({:.2f}% done)".format(num_graded_ontime, num_ungraded_ontime, perc_done(num_graded_ontime, num_ungraded_ontime)))
+    if num_graded_late + num_ungraded_late > 0:
+        print(" > Late submissions: {} fully graded, {} left to grade ({:.2f}% done)".format(num_graded_late, num_ungraded_late, perc_done(num_graded_late, num_ungraded_late)))
+    else:
+        print(" > Late submissions: 0")
+
+    # Mark lateness in grades, joining on SID
+    late_by_sid, dup_sids = sheet['late_by_sid'], sheet['dup_sids']
+    lateness = late_by_sid.reindex(grades.column('sid').astype(str))
+    grades.set_column('late', lateness.fillna(0).to_numpy())
+
+    # Report any SIDs we couldn't find a (unique) lateness for
+    if len(dup_sids) > 0:
+        print("Error: Found more than one student with SID(s) {} in the scores sheet. Treating them as on-time.".format(", ".join(dup_sids)))
+    no_sid = int((grades.column('sid') == -1).sum())
+    not_found = sorted(set(lateness.index[lateness.isna()]) - set(dup_sids) - {"-1"})
+    if no_sid > 0:
+        print("Warning: {} grades have no SID, so their lateness is unknown.".format(no_sid))
+    if len(not_found) > 0:
+        print("Warning: {} SID(s) are missing from the scores sheet: {}".format(len(not_found), ", ".join(not_found)))
+
+# Parses a GS scores sheet (as a DataFrame with str SIDs) into lateness in minutes per SID.
+# :: Returns (a Series of minutes indexed by SID, a list of the SIDs that appear more than once).
+# :: Duplicated SIDs are left out of the Series, since we can't tell which lateness is theirs.
+# :: A sheet with no students (e.g., exported before anyone submitted) gives an empty Series.
+def lateness_index(df):
+    df = df.dropna(subset=['SID'])
+    if len(df) == 0:
+        return pd.Series([], index=pd.Index([], dtype=object, name='SID'), dtype=float), []
+    hms = df['Lateness (H:M:S)'].fillna("00:00:00").str.split(':', expand=True).astype(int)
+    minutes = hms[0]*60 + hms[1] + hms[2]/60
+    minutes.index = df['SID']
+    dup = minutes.index.duplicated(keep=False)
+    return minutes[~dup], sorted(set(minutes.index[dup]))
+
+# Loads one question's gradesheet. Returns the grades and the resolver (with any new aliases).
+# :: Top-level so that it can run in a worker process.
+def load_question(rubric, name, csv, only_submitted, resolver):
+    num = int(os.path.basename(csv).split("_")[0])
+    gs = load_gradesheet(rubric, name, csv, num, only_submitted=only_submitted, resolver=resolver)
+    return gs, resolver
+
 # Read in all the grades for all the csvs specified in questions,
 # using the given rubric (a JSON object).
-# :: Returns grades as a list of dicts. See end of calc_grade for format.
+# :: Returns grades as a GradeTable (see gradetable.py). Its rows act like dicts in the format at the end of calc_grade.
 # :: Alternatively, you can set to_pandas_df to get an equivalent DataFrame format.
-def load_grades(rubric_path, csv_dir, to_pandas_df=False, only_submitted=True):
-    global additional_scores_sheet
+# :: Set processes > 1 (or None, for one per core) to parse the question csvs in parallel.
+# :: (When profiling, questions are always parsed in this process, so that each one is profiled.)
+# :: Set with_scores_sheet to also return whether csv_dir had a scores sheet (i.e., whether lateness is known).
+# :: Set store_as to the assignment's name (in config.json) to also save its grades to the grade store (see store.py),
+# :: so that slip_days.py and final_grades.py don't have to parse them again.
+# :: Raises a ValueError if the rubric is missing its gsAssignmentID.
+def load_grades(rubric_path, csv_dir, to_pandas_df=False, only_submitted=True, processes=1, with_scores_sheet=False, store_as=None):
+    with profiling.stage("load_grades", assignment=rubric_path) as s:
+        if store_as is not None and store.USE_GRADE_STORE:
+            # (The store keeps every grade, so load them all, then cull)
+            info = { "rubric": rubric_path, "data": csv_dir }
+            fprint = store.fingerprint(info)
+            grades, rubric, questions, has_scores_sheet = _load_grades(rubric_path, csv_dir, False, processes)
+            with profiling.stage("store_save"):
+                store.save(store_as, info, grades, rubric, questions, fprint)
+            if only_submitted:
+                grades = grades[grades.column('was_submitted')]
+        else:
+            grades, rubric, questions, has_scores_sheet = _load_grades(rubric_path, csv_dir, only_submitted, processes)
+        s.rows = len(grades)
+    if to_pandas_df:
+        grades = to_pandas(grades)
+    if with_scores_sheet:
+        return grades, rubric, questions, has_scores_sheet
+    return grades, rubric, questions
 
+def _load_grades(rubric_path, csv_dir, only_submitted, processes):
     print("\n== Loading grades for assignment '{}' ==".format(rubric_path))
 
     # Load rubric
@@ -65,27 +229,12 @@ def load_grades(rubric_path, csv_dir, to_pandas_df=False, only_submitted=True):
 
     # Verify there's an assignment ID so we can generate URLs
     if 'gsAssignmentID' not in rubric:
-        print("Error: Gradescope assignment ID (check in URL text) is not present for this rubric. Please include it.")
-        exit(0)
+        raise ValueError("Gradescope assignment ID (check in URL text) is not present in rubric {}. Please include it.".format(rubric_path))
 
     # Load csv files as 'questions'
     # :: Recurses into subdirectories at csv_path.
-    questions = dict()
-    def load_dir(dir_path, recurse=1):
-        global additional_scores_sheet
-        for entry in os.scandir(dir_path):
-            if os.path.isdir(entry.path) and recurse > 0:
-                load_dir(entry.path, recurse=0)
-            elif entry.path.endswith(".csv"):
-                filename = os.path.splitext(os.path.basename(entry.path))[0]
-                if "_scores" in filename:
-                    additional_scores_sheet = entry.path
-                elif filename[-13:] == "Please_ignore":
-                    continue # skip the correction sheet
-                else:
-                    simplified_key = filename[:20]
-                    questions[simplified_key] = entry.path
-    load_dir(csv_dir)
+    with profiling.stage("scan_csv_dir"):
+        questions, additional_scores_sheet = scan_csv_dir(csv_dir)
 
     # Remove any questions rubric wants us to skip:
     if "skipQuestions" in rubric:
@@ -94,73 +243,127 @@ def load_grades(rubric_path, csv_dir, to_pandas_df=False, only_submitted=True):
                 del questions[q]
 
     # Load grades for each question
-    grades = []
-    for name, csv in questions.items():
-        print(" - Loaded question:", name, csv)
-        num = int(os.path.basename(csv).split("_")[0])
-        gs = load_gradesheet(rubric, name, csv, num, only_submitted=only_submitted)
-        grades.extend(gs)
+    # :: Rubric items are matched to columns once per CSV header, remembering fuzzy matches for next time.
+    resolver = ColumnResolver(rubric['gsAssignmentID'])
+    tables = []
+    if processes == 1 or len(questions) < 2 or profiling.ENABLED:
+        for name, csv in questions.items():
+            print(" - Loaded question:", name, csv)
+            gs, _ = load_question(rubric, name, csv, only_submitted, resolver)
+            tables.append(gs)
+    else:
+        # Results come back in question order, whichever worker finishes first
+        with process_pool(processes) as pool:
+            futures = [pool.submit(load_question, rubric, name, csv, only_submitted, resolver) for name, csv in questions.items()]
+            for (name, csv), future in zip(questions.items(), futures):
+                gs, worker_resolver = future.result()
+                print(" - Loaded question:", name, csv)
+                tables.append(gs)
+                resolver.merge(worker_resolver)
+    resolver.save()
+    grades = GradeTable.concat(tables) if len(tables) > 0 else GradeTable.empty(assignment_id=rubric['gsAssignmentID'])
 
     # (Optional) Load lateness markers from score sheet
     # :: If there's an additional score sheet identified, add "graded/ungraded" and "lateness" info:
     if additional_scores_sheet is not None:
-        df = pd.read_csv(additional_scores_sheet)
-        num_graded = len(df[df['Status']=="Graded"])
-        num_ungraded = len(df[df['Status']=="Ungraded"])
-        num_ontime = len(df[df['Lateness (H:M:S)']=="00:00:00"])
-        num_graded_ontime = len(df[(df['Status']=="Graded") & (df['Lateness (H:M:S)']=="00:00:00")])
-        num_ungraded_ontime = len(df[(df['Status']=="Ungraded") & (df['Lateness (H:M:S)']=="00:00:00")])
-        num_graded_late = len(df[(df['Status']=="Graded") & (df['Lateness (H:M:S)']!="00:00:00")])
-        num_ungraded_late = len(df[(df['Status']=="Ungraded") & (df['Lateness (H:M:S)']!="00:00:00")])
-
-        df_scores_sheet = df
-        def hms_to_min(hms_str):
-            t = hms_str.split(':')
-            return int(t[0])*60+int(t[1])+int(t[2])/60
-        def lateness(sid):
-            student = df_scores_sheet[df_scores_sheet['SID']==str(sid)]
-            if len(student) == 0:
-                pass #print("Error: Could not find student with SID", sid)
-            elif len(student) > 1:
-                print("Error: Found more than one student with SID", sid)
-            else:
-                return hms_to_min(student['Lateness (H:M:S)'].tolist()[0])
-            return 0
-
-        print("Total submissions: {} fully graded, {} left to grade ({:.2f}% done)".format(num_graded, num_ungraded, 100*num_graded/(num_graded+num_ungraded)))
-        print(" > Ontime submissions: {} fully graded, {} left to grade ({:.2f}% done)".format(num_graded_ontime, num_ungraded_ontime, 100*num_graded_ontime/(num_graded_ontime+num_ungraded_ontime)))
-        if num_graded_late + num_ungraded_late > 0:
-            print(" > Late submissions: {} fully graded, {} left to grade ({:.2f}% done)".format(num_graded_late, num_ungraded_late, 100*num_graded_late/(num_graded_late+num_ungraded_late)))
-        else:
-            print(" > Late submissions: 0")
-
-        # Mark lateness in grades
-        for g in grades:
-            if g['sid'] == -1:
-                pass #print('Warning: Student', g['email'], 'has no SID.')
-            g['late'] = lateness(g['sid'])
-
-    if to_pandas_df:
-        return to_pandas(grades), rubric, questions
-    else:
+        with profiling.stage("lateness") as s:
+            attach_lateness(grades, load_scores_sheet(additional_scores_sheet))
+            s.rows = len(grades)
+
+    return grades, rubric, questions, additional_scores_sheet is not None
+
+# Loads grades for many assignments at once, one assignment per worker process.
+# :: assignments maps names to info dicts with "rubric" and "data" paths (as in config.json).
+# :: Returns a dict mapping each name to (grades, rubric, questions), in the same order as assignments.
+# :: (When profiling, assignments are always loaded in this process, so that each one is profiled.)
+# :: If an assignment can't be loaded, prints which one and why, then raises the error.
+# :: Grades are parsed from the CSVs (through the grade sheet cache). Unless use_store is False (or store.USE_GRADE_STORE is),
+# :: assignments that changed since they were saved to the grade store (see store.py) are saved to it too, for its queries.
+def load_many(assignments, to_pandas_df=False, only_submitted=True, processes=None, use_store=None):
+    if use_store is None:
+        use_store = store.USE_GRADE_STORE
+    # name -> fingerprint (from before the CSVs are read) of the assignments to save. They're loaded in full, saved, then culled.
+    to_store = store.stale(assignments) if use_store else dict()
+
+    def kwargs(name):
+        if name in to_store:
+            return dict(to_pandas_df=False, only_submitted=False)
+        return dict(to_pandas_df=to_pandas_df, only_submitted=only_submitted)
+
+    def result(name, load):
+        try:
+            grades, rubric, questions = load()
+        except Exception as e:
+            print("Error: Couldn't load grades for assignment '{}': {}".format(name, e))
+            raise
+        if name in to_store:
+            with profiling.stage("store_save", assignment=name):
+                store.save(name, assignments[name], grades, rubric, questions, to_store[name])
+            if only_submitted:
+                grades = grades[grades.column('was_submitted')]
+            if to_pandas_df:
+                grades = to_pandas(grades)
         return grades, rubric, questions
 
+    if processes == 1 or len(assignments) < 2 or profiling.ENABLED:
+        return { name: result(name, lambda: load_grades(info["rubric"], info["data"], **kwargs(name))) \
+                 for name, info in assignments.items() }
+    with process_pool(processes) as pool:
+        futures = { name: pool.submit(load_grades, info["rubric"], info["data"], **kwargs(name)) \
+                    for name, info in assignments.items() }
+        return { name: result(name, future.result) for name, future in futures.items() }
+
 # Read in all the grades for a single GS eval sheet
-# :: Returns grades as a list of dicts. See end of calc_grade for format.
-def load_gradesheet(rubric, question_name, csv, question_num, only_submitted=True):
-    df = pd.read_csv(csv)
-    df.drop(index=[len(df)-1, len(df)-2, len(df)-3], inplace=True)
-    df.dropna(subset=['SID'], inplace=True)
+# :: Returns grades as a GradeTable, whose rows have the format at the end of calc_grade.
+# :: resolver is the ColumnResolver to match rubric items to columns with (a fresh one if None).
+def load_gradesheet(rubric, question_name, csv, question_num, only_submitted=True, resolver=None):
+    with profiling.stage("load_gradesheet", question=question_name) as s:
+        grades = _load_gradesheet(rubric, question_name, csv, question_num, only_submitted, resolver)
+        s.rows = len(grades)
+    return grades
 
-    grades = df.apply(lambda row: calc_grade(row, rubric, question_name, df.columns, question_num), axis=1)
+def _load_gradesheet(rubric, question_name, csv, question_num, only_submitted, resolver):
+    # Reuse the grades from a previous run if neither the CSV nor the rubric changed
+    key = None
+    grades = None
+    if USE_GRADESHEET_CACHE:
+        with profiling.stage("cache_get"):
+            key = gradecache.cache_key('gradesheet', gradecache.file_hash(csv), gradecache.rubric_hash(rubric), question_name, question_num)
+            grades = gradecache.SheetCache().get(key)
+
+    if grades is None:
+        grades = parse_gradesheet(rubric, question_name, csv, question_num, resolver=resolver)
+        if key is not None:
+            with profiling.stage("cache_put"):
+                gradecache.SheetCache().put(key, grades)
 
     if only_submitted:
-        grades = [g for g in grades if g['was_submitted'] is True] # cull the Nones
+        grades = grades[grades.column('was_submitted')] # cull the Nones
 
     return grades
 
+# Parses and scores every row of a single GS eval sheet, into a GradeTable.
+def parse_gradesheet(rubric, question_name, csv, question_num, resolver=None):
+    # Match rubric items to columns once for the whole sheet, then read only the columns we need
+    if resolver is None:
+        resolver = ColumnResolver()
+    header = ingest.header(csv)
+    columns = resolver.resolve_all(rubric_terms(rubric), header)
+    with profiling.stage("read_csv") as s:
+        df = ingest.read_gradesheet(csv, columns.values(), header)
+        s.rows = len(df)
+
+    with profiling.stage("score") as s:
+        s.rows = len(df)
+        if VECTORIZED_SCORING:
+            return score_gradesheet(df, rubric, question_name, question_num, columns)
+        else:
+            records = list(df.apply(lambda row: calc_grade(row, rubric, question_name, df.columns, question_num, columns), axis=1))
+            return GradeTable.from_records(records, rubric['gsAssignmentID'])
+
 # Calculate the grade for a specific row of a GS eval sheet
-def calc_grade(row, rubric, question_name, col_names, question_num):
+# :: columns optionally maps rubric items to their already-resolved column names.
+def calc_grade(row, rubric, question_name, col_names, question_num, columns=None):
     scores = dict()
     no_score = pd.isna(row['Score']) or row['Score'] == 0
     gs_score = 0 if no_score else row['Score']
@@ -180,30 +383,10 @@ def calc_grade(row, rubric, question_name, col_names, question_num):
     rubric = rubric['rubric']
 
     # Detects which column name matches a given rubric item.
-    # Has to be done on a case-by-case basis because of small variations in strings.
     def col_inc_term(term):
-        if term in col_names:
-            return term
-        else:
-            # Easy checks for single trailing spaces either on ends or near colon
-            if (term+' ') in col_names:
-                return term+" "
-            elif (' '+term in col_names):
-                return " "+term
-            elif ":" in term:
-                lr = term.split(":")
-                if len(lr) > 2:
-                    pass
-                elif (lr[0] + ' :' + lr[1]) in col_names:
-                    return (lr[0] + ' :' + lr[1])
-                elif (lr[0] + ': ' + lr[1]) in col_names:
-                    return (lr[0] + ': ' + lr[1])
-            # Compute edit distance (this is intensive) and return the closest match.
-            # This is because sometimes graders edit the rubric and say, add an extra letter,
-            # screwing up the column names for specific questions. We want to ignore these errors.
-            # print(term, col_names)
-            closest = get_close_matches(term, col_names, 1)[0]
-            return closest
+        if columns is not None and term in columns:
+            return columns[term]
+        return find_column(term, col_names)
 
     # Calculate score (pts) for each rubric item
     for key, val in rubric.items():
@@ -300,113 +483,414 @@ def calc_grade(row, rubric, question_name, col_names, question_num):
                 row["Assignment Submission ID"] + "#" + "Question_" + str(question_num)
     }
 
+# Column-wise equivalent of calc_grade, scoring every row of a GS eval sheet at once.
+# :: Each rubric column is compared against "true"/"TRUE"/True a single time, and the
+# :: "max"/"sum" aggregations run over whole columns. Returns a GradeTable whose rows
+# :: are identical to what calc_grade returns.
+# :: columns optionally maps rubric items to their already-resolved column names.
+def score_gradesheet(df, rubric, question_name, question_num, columns=None):
+    n = len(df)
+    col_names = df.columns
+    gsAssignmentID = rubric['gsAssignmentID']
+    aggr_method = rubric['aggr_method']
+    shortnames = rubric['shortnames']
+    was_submitted_check = None
+    if 'wasSubmittedItem' in rubric:
+        was_submitted_item = rubric['wasSubmittedItem']
+        was_submitted_check = "+"
+    elif 'wasNotSubmittedItem' in rubric:
+        was_submitted_item = rubric['wasNotSubmittedItem']
+        was_submitted_check = "-"
+    rubric = rubric['rubric']
+
+    # Column matching a rubric item
+    def column(term, check_missing=False):
+        col = columns[term] if columns is not None and term in columns else find_column(term, col_names)
+        if check_missing and col not in col_names:
+            print("Error: Column", col, "is not in row for question", question_name)
+        return df[col]
+
+    # Applies an elementwise test of values (as Python objects, like a row of df.apply sees them) to a column.
+    # :: For categorical columns (see ingest.py), each category is tested once. Missing values never pass.
+    def test(values, fn):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            passed = fn(values.cat.categories.to_numpy(dtype=object))
+            return np.append(passed, False)[values.cat.codes.to_numpy()]
+        return fn(values.to_numpy(dtype=object))
+
+    # Elementwise `v == "true" or v is True or v == "TRUE"`
+    def is_checked(values):
+        is_true = np.fromiter((v is True for v in values), dtype=bool, count=len(values))
+        return (values == "true") | is_true | (values == "TRUE")
+
+    gs_scores = df['Score'].tolist()
+    no_score = df['Score'].isna().to_numpy() | (df['Score'] == 0).to_numpy()
+    gs_score = np.where(no_score, 0, df['Score'].to_numpy(dtype=float, na_value=0))
+    incomplete_score = np.zeros(n, dtype=bool)
+    was_submitted = np.ones(n, dtype=bool)
+    item_errors = [] # (mask, message) pairs, in the order calc_grade would append them
+
+    # Calculate score (pts) for each rubric item, as a column of Python scores + a float column for summing
+    scores = dict()
+    points = dict()
+    for key, val in rubric.items():
+
+        # Is single rubric item w/ no subitems
+        if isinstance(val, int):
+            values = column(key)
+            if was_submitted_check != None and key == was_submitted_item:
+                # This is a special rubric item to mark if the current question had a submission.
+                was_submitted = test(values, lambda v: (v == "true") | (v == True) | (v == "TRUE"))
+                if was_submitted_check == '-': was_submitted = ~was_submitted
+                score = np.where(was_submitted, val, 0)
+            else:
+                score = np.where(test(values, lambda v: v == "true"), val, 0)
+            scores[shortnames[key]] = score.tolist()
+            points[shortnames[key]] = score.astype(float)
+            continue
+
+        # Is rubric item w/ subitems (dict)
+        subvals = np.empty(len(val), dtype=object)
+        num_checked = np.zeros(n, dtype=int)
+        best = np.full(n, -np.inf)
+        best_idx = np.zeros(n, dtype=int)
+        total = np.zeros(n)
+        has_float = np.zeros(n, dtype=bool)
+        for j, (subkey, subval) in enumerate(val.items()):
+            subvals[j] = subval
+            checked = test(column(key + ": " + subkey, check_missing=True), is_checked)
+            num_checked += checked
+            # Keep the first of equal maxima, like max() does
+            better = checked & (subval > best)
+            best[better] = subval
+            best_idx[better] = j
+            total += np.where(checked, subval, 0)
+            if isinstance(subval, float): has_float |= checked
+
+        # Aggregate scores using appropriate method for this rubric item
+        if aggr_method[key] == "max":
+            none_checked = num_checked == 0
+            incomplete_score |= none_checked
+            item_errors.append((none_checked & (gs_score > 0), "No score entered for rubric item: " + str(key)))
+            item_errors.append((num_checked > 1, "More than one score entered for single-select rubric item: " + str(key)))
+            score = np.zeros(n, dtype=object)
+            score[~none_checked] = subvals[best_idx[~none_checked]]
+            scores[shortnames[key]] = score.tolist()
+            points[shortnames[key]] = np.where(none_checked, 0, best)
+        elif aggr_method[key] == "sum":
+            scores[shortnames[key]] = [float(t) if f else int(t) for t, f in zip(total, has_float)]
+            points[shortnames[key]] = total
+        else:
+            scores[shortnames[key]] = [0] * n
+            points[shortnames[key]] = np.zeros(n)
+
+    # Sanity check that our extracted scores sum to GradeScope's total score
+    agg = np.zeros(n)
+    for pts in points.values():
+        agg += pts
+    adjustments = df['Adjustment'].to_numpy(dtype=object)
+    has_adjustment = (adjustments != "") & ~pd.isna(adjustments)
+    agg += np.where(has_adjustment, adjustments, 0).astype(float)
+    mismatched = agg != gs_score
+
+    # Check for errors in grading
+    # Check whether comments are blank
+    comments = df['Comments'].tolist()
+    blank = np.array([not isinstance(c, str) or len(c.strip()) == 0 for c in comments], dtype=bool)
+    says_you = np.array([not b and any(s in c for s in ('you', 'You')) for b, c in zip(blank, comments)], dtype=bool)
+    blank_scored = blank & (gs_score > 0)
+    # Someone marked the "not/submitted" rubric item when they shouldn't have...
+    submitted_mismatch = ~was_submitted & (gs_score > 0)
+    was_submitted = was_submitted | submitted_mismatch
+
+    errors = [[] for _ in range(n)]
+    for mask, msg in item_errors:
+        for i in np.flatnonzero(mask):
+            errors[i].append(msg)
+    for i in np.flatnonzero(mismatched):
+        errors[i].append("Calc grade doesn't match GradeScope." + str(float(adjustments[i])))
+    for i in np.flatnonzero(blank_scored | says_you):
+        if says_you[i]:
+            errors[i].append("Comment contains the word 'you.'")
+        elif incomplete_score[i]:
+            errors[i].append("Comment is blank, and not all rubric items are completed.")
+        else:
+            errors[i].append("Comment is blank after all rubric items were completed.")
+    for i in np.flatnonzero(submitted_mismatch):
+        errors[i].append("'Was submitted' rubric item mismatched; this question has a score.")
+
+    # Compatibility issues
+    # :: GS seems to have changed their eval sheets from "First/Last Name" cols to just a "Name" col.
+    names = df['Name'] if 'Name' in col_names else (df["First Name"] + " " + df["Last Name"])
+    sids = [int(s) if not pd.isna(s) and (isinstance(s, float) or s.isdigit()) else -1 for s in df["SID"].tolist()]
+    adjustments = [0 if pd.isna(adj) else adj for adj in df['Adjustment'].tolist()]
+    total_scores = [0 if ns else gs for ns, gs in zip(no_score, gs_scores)]
+
+    # Return the grade details, as a GradeTable with the same fields as calc_grade returns
+    columns = {
+        "name" : make_column(names.tolist()),
+        "sid" : make_column(sids, np.int64),
+        "aid" : make_column(df["Assignment Submission ID"].tolist()),
+        "qid" : make_column(df["Question Submission ID"].tolist()),
+        "email" : make_column(df["Email"].tolist()),
+        "comments" : make_column(comments),
+        "question" : make_column([question_name] * n),
+        "grader" : make_column(df["Grader"].tolist()),
+        "adjustment": make_column(adjustments, np.float64),
+        "total_score" : make_column(total_scores, np.float64),
+        "was_submitted" : was_submitted,
+        "inc_score" : incomplete_score,
+        "errors" : make_column(errors),
+        "question_num": np.full(n, question_num, dtype=np.int64)
+    }
+    int_columns = [f for f, values in (("adjustment", adjustments), ("total_score", total_scores)) if all_ints(values)]
+    int_columns += [item for item, values in scores.items() if all_ints(values)]
+    item_points = np.column_stack(list(points.values())) if len(points) > 0 else np.zeros((n, 0))
+    return GradeTable(columns, list(scores.keys()), item_points, gsAssignmentID, int_columns)
+
+# Spread of each student's question grades (for the same assignment), for all students at once.
+# :: Only submitted, completely scored grades count, and only students with more than one of them get a row.
+# :: Returns a DataFrame with a row per student (in order of appearance): SID, Name, Email, Questions (# of grades),
+# :: Min, Max, Spread (max - min points), MAD (median absolute deviation from their median, in points),
+# :: Z Spread (max - min z-score of their grades against each question's mean and st. dev.), and Flagged,
+# :: if any of Spread, Z Spread or MAD reach the given thresholds (None to not check one).
+def outlier_table(grades, pt_diff=OUTLIER_PT_DIFF, z_spread=OUTLIER_Z_SPREAD, mad=OUTLIER_MAD):
+    grades = grades[grades.column('was_submitted') & ~grades.column('inc_score')]
+    scores = grades.column('total_score')
+
+    # z-score of each grade against its question's grades
+    q_codes, q_first = group_codes(grades.column('question'))
+    _, q_means, q_stdevs, _ = grouped_stats(q_codes, len(q_first), scores)
+    q_means, q_stdevs = q_means[q_codes, 0], q_stdevs[q_codes, 0]
+    z = np.divide(scores - q_means, q_stdevs, out=np.zeros(len(scores)), where=q_stdevs > 0)
+
+    # Per student: range of points and z-scores, and the median absolute deviation
+    codes, first = group_codes(grades.column('sid'))
+    counts, _, _, medians = grouped_stats(codes, len(first), scores)
+    mins, maxs = grouped_range(codes, len(first), np.column_stack([scores, z]))
+    _, _, _, mads = grouped_stats(codes, len(first), np.abs(scores - medians[codes, 0]))
+
+    df = pd.DataFrame({ "SID": grades.export_column('sid')[first], "Name": grades.column('name')[first],
+                        "Email": grades.column('email')[first], "Questions": counts,
+                        "Min": mins[:, 0], "Max": maxs[:, 0], "Spread": maxs[:, 0] - mins[:, 0], "MAD": mads[:, 0],
+                        "Z Spread": maxs[:, 1] - mins[:, 1] })
+    flagged = np.zeros(len(df), dtype=bool)
+    for col, threshold in [("Spread", pt_diff), ("Z Spread", z_spread), ("MAD", mad)]:
+        if threshold is not None:
+            flagged |= df[col].to_numpy() >= threshold
+    df["Flagged"] = flagged
+    return df[df["Questions"] > 1].reset_index(drop=True)
+
 # Check for outliers *within* students' question grades (for the same assignment)
 # :: grades must be the same assignment, where every question is worth the same # of points
-# :: pt_diff is how many points difference between question grades before we flag the grades
-def outlier_check(grades, pt_diff=5):
-    outliers = dict()
-
-    # Bucket grades by student
-    student_submissions = dict()
-    for g in grades:
-        # Skip unsubmitted or incomplete score grades
-        if g['was_submitted'] == False or g['inc_score'] == True: continue
-        elif g['sid'] in student_submissions:
-            student_submissions[g['sid']].append(g)
-        else:
-            student_submissions[g['sid']] = [ g ]
+# :: Prints each flagged student's grades (see outlier_table for the thresholds), and returns the table of flagged students.
+def outlier_check(grades, pt_diff=OUTLIER_PT_DIFF, z_spread=OUTLIER_Z_SPREAD, mad=OUTLIER_MAD):
+    table = outlier_table(grades, pt_diff, z_spread, mad)
+    outliers = table[table["Flagged"]].reset_index(drop=True)
+
+    # Each flagged student's grades, grouped by student (in order of appearance, like the table)
+    grades = grades[grades.column('was_submitted') & ~grades.column('inc_score')]
+    codes, _ = group_codes(grades.column('sid'))
+    rows = np.flatnonzero(np.isin(grades.column('sid'), outliers["SID"].to_numpy()))
+    rows = rows[np.argsort(codes[rows], kind='stable')]
+    by_student = np.split(rows, np.flatnonzero(np.diff(codes[rows])) + 1) if len(rows) > 0 else []
 
-    # For each student, check for outlier pattern:
     print('Wide variations between grades for specific students')
     print('-----------------------------------------------------')
-    for (sid, question_grades) in student_submissions.items():
-        init_score = -1
-        for g in question_grades:
-            if init_score == -1:
-                init_score = g['total_score']
-            elif abs(g['total_score'] - init_score) >= pt_diff:
-                # Flag this students' grades as inconsistent
-                print('Wide variation for student {} {} ({} pt difference)'.format(g['name'], g['email'], abs(g['total_score'] - init_score)))
-                for g in question_grades:
-                    print(' > Question: {}\tScore: {}\tGrader: {:>16s}\tURL: {}'.format(g['question'], g['total_score'], g['grader'][:16], g['url']))
-                outliers[sid] = question_grades
-                print()
-                break
+    for r, student_rows in zip(outliers.itertuples(), by_student):
+        print('Wide variation for student {} {} ({} pt difference)'.format(r.Name, r.Email, r.Spread))
+        for i in student_rows:
+            g = grades[int(i)]
+            print(' > Question: {}\tScore: {}\tGrader: {:>16s}\tURL: {}'.format(g['question'], g['total_score'], str(g['grader'])[:16], g['url']))
+        print()
 
     return outliers
 
+# The grades TA stats are taken over: submitted, completely scored grades with a grader.
+def ta_graded(grades):
+    graders = grades.column('grader')
+    has_grader = np.array([isinstance(g, str) for g in graders], dtype=bool)
+    return grades[grades.column('was_submitted') & ~grades.column('inc_score') & has_grader]
+
 # Is a TA consistently grading higher or lower than others (for the given grades)?
+# :: Returns a dict mapping each grader's name to a GradeTable of their (submitted, completely scored) grades.
 def ta_stats(grades):
+    grades = ta_graded(grades)
     # Bucket grades by grader
-    graders = dict()
-    for g in grades:
-        # Skip unsubmitted or incomplete score grades
-        if g['was_submitted'] == False or g['inc_score'] == True: continue
-        elif g['grader'] in graders:
-            graders[g['grader']].append(g)
-        else:
-            graders[g['grader']] = [ g ]
-    # Calculate mean+st.dev per grader
-    graders_scores = dict()
-    for (gname, qs) in graders.items():
-        graders_scores[gname] = [(g['total_score'], g['name'], g['email'], g['url']) for g in qs]
-    return graders_scores
-
+    codes, names = pd.factorize(grades.column('grader'))
+    return { gname: grades[codes == c] for c, gname in enumerate(names) }
+
+# TA stats (count, mean, st. dev. and median) at three levels, each in one grouped pass (see groupstats.py):
+# :: 'grader' (total scores per grader), 'question' (total scores per grader x question),
+# :: and 'item' (rubric item scores per grader x item).
+# :: Returns a dict of DataFrames, one per level, with a row per group: Grader (plus Question or Item), Count, Mean, St. Dev, Median.
+# :: Question and item rows also have the mean and st. dev. of all TAs' grades of that question or item (All Mean, All St. Dev),
+# :: and whether the TA's mean is far from it (Flagged; see TA_FLAG_STDEVS and TA_FLAG_MIN_GRADED).
+def ta_group_stats(grades):
+    grades = ta_graded(grades)
+    grader, question, total = grades.column('grader'), grades.column('question'), grades.column('total_score')
+    stats = dict()
+
+    def table(keys, counts, means, stdevs, medians):
+        return pd.DataFrame({ **keys, "Count": counts, "Mean": means, "St. Dev": stdevs, "Median": medians })
+
+    def flag(df):
+        far = (df["Mean"] - df["All Mean"]).abs() > TA_FLAG_STDEVS * df["All St. Dev"] / np.sqrt(df["Count"])
+        df["Flagged"] = far & (df["Count"] >= TA_FLAG_MIN_GRADED)
+        return df
+
+    # Per grader
+    grader_codes, grader_first = group_codes(grader)
+    counts, means, stdevs, medians = grouped_stats(grader_codes, len(grader_first), total)
+    stats['grader'] = table({ "Grader": grader[grader_first] }, counts, means[:, 0], stdevs[:, 0], medians[:, 0])
+
+    # Per grader x question, compared to everyone's grades of the question
+    q_codes, q_first = group_codes(question)
+    _, q_means, q_stdevs, _ = grouped_stats(q_codes, len(q_first), total)
+    codes, first = group_codes(grader, question)
+    counts, means, stdevs, medians = grouped_stats(codes, len(first), total)
+    df = table({ "Grader": grader[first], "Question": question[first] }, counts, means[:, 0], stdevs[:, 0], medians[:, 0])
+    df["All Mean"], df["All St. Dev"] = q_means[q_codes[first], 0], q_stdevs[q_codes[first], 0]
+    stats['question'] = flag(df).sort_values("Question", kind='stable').reset_index(drop=True)
+
+    # Per grader x rubric item (item-major), compared to everyone's scores of the item
+    num_graders, num_items = len(grader_first), len(grades.items)
+    _, all_means, all_stdevs, _ = grouped_stats(np.zeros(len(grades), dtype=np.int64), min(len(grades), 1), grades.scores)
+    counts, means, stdevs, medians = grouped_stats(grader_codes, num_graders, grades.scores)
+    df = table({ "Grader": np.tile(grader[grader_first], num_items), "Item": np.repeat(grades.items, num_graders) },
+               np.tile(counts, num_items), means.T.ravel(), stdevs.T.ravel(), medians.T.ravel())
+    df["All Mean"], df["All St. Dev"] = np.repeat(all_means.ravel(), num_graders), np.repeat(all_stdevs.ravel(), num_graders)
+    stats['item'] = flag(df)
+    return stats
+
+# Prints each TA's stats (sorted by mean), grades far from the median of all grades, and TAs whose grading of
+# a question or rubric item is far from other TAs'. Returns the stats (see ta_group_stats), or None if there are no grades.
 def ta_consistency_check(grades):
-    print('{:<20s}\t{}\t{}'.format('TA Name', 'Num graded', 'Mean, St. Dev'))
+    print('{:<20s}\t{}\t{}'.format('TA Name', 'Num graded', 'Mean, St. Dev, Median'))
     print('-----------------------------------------------------')
-    graders_scores = ta_stats(grades)
-    graders_stats = []
-    all_scores = []
-    outliers = []
-
-    # Detect total mean + st dev
-    for gname, data in graders_scores.items():
-        scores = [d[0] for d in data]
-        if not isinstance(gname, str): continue
-        if len(scores) == 0: continue
-        all_scores.extend(scores)
-
-    if len(all_scores) == 0:
+    graded = ta_graded(grades)
+    if len(graded) == 0:
         print("No scores detected.")
-        return
+        return None
+    stats = ta_group_stats(grades)
 
-    total_stdev = stat.stdev(all_scores)
-    total_med = stat.median(all_scores)
+    # Flag grades far from the total median (of graders with more than one grade)
+    scores = graded.column('total_score')
+    total_stdev = np.std(scores, ddof=1) if len(scores) > 1 else 0
+    total_med = np.median(scores)
+    codes, _ = group_codes(graded.column('grader'))
+    far = np.flatnonzero((np.abs(scores - total_med) > total_stdev*2.5) & (stats['grader']["Count"].to_numpy()[codes] > 1))
+    far = far[np.argsort(codes[far], kind='stable')] # by grader
 
-    for gname, data in graders_scores.items():
-        if not isinstance(gname, str): continue
-        scores = [d[0] for d in data]
-        if len(scores) == 0: continue
-        elif len(scores) == 1:
-            graders_stats.append((gname, 1, scores[0], 0))
-        else:
-            for d in data:
-                score = d[0]
-                if abs(score-total_med) > total_stdev*2.5: # flag outliers
-                    outliers.append((gname, score, d[1:]))
-            graders_stats.append((gname, len(scores), stat.mean(scores), stat.stdev(scores)))
+    for _, r in stats['grader'].sort_values("Mean", kind='stable').iterrows():
+        print('{:<20s}\t{:<10s}\t{:.2f}\t{:.2f}\t{:.2f}'.format(r["Grader"][:20], str(r["Count"]), r["Mean"], r["St. Dev"], r["Median"]))
 
-    graders_stats.sort(key=lambda x: x[2])
-    for (gname, n, m, sd) in graders_stats:
-        print('{:<20s}\t{:<10s}\t{:.2f}\t{:.2f}'.format(gname[:20], str(n), m, sd))
-
-    if len(outliers) > 0:
+    if len(far) > 0:
         print('\nDetected outliers (grader scores that are 2.5 st. deviations away from total median score):')
-        for o in outliers:
-            print(o[0], o[1], o[2])
+        for i in far:
+            print(graded.value('grader', i), graded.value('total_score', i), (graded.value('name', i), graded.value('email', i), graded.value('url', i)))
+
+    for level in ['question', 'item']:
+        flagged = stats[level][stats[level]["Flagged"]]
+        if len(flagged) > 0:
+            print('\nTAs whose mean {} score is over {} standard errors from all TAs\' mean:'.format(level, TA_FLAG_STDEVS))
+            for _, r in flagged.iterrows():
+                print(' > {:<20s}\t{}: {:.2f} (all TAs: {:.2f} +/- {:.2f}, n={})'.format(r["Grader"][:20], r[level.capitalize()], r["Mean"], r["All Mean"], r["All St. Dev"], r["Count"]))
+    return stats
+
+# A ReportAggregator for the reports on an assignment's grades (see report)
+def new_aggregator(rubric, questions, is_late_submitter):
+    return ReportAggregator(rubric, questions, is_late_submitter, ERROR_CHECK_PERSISTENCE)
+
+# Runs the command-line reports on an assignment's grades (as loaded by load_grades with only_submitted=False):
+# prints outliers, TA stats and grading progress, and exports all_grades.csv, left_to_grade.csv,
+# grading_errors.csv, unassigned_to_question.csv, missing_questions.csv, student_outliers.csv, and TA stats per question and
+# rubric item (ta_stats_by_question.csv and ta_stats_by_item.csv).
+# :: is_late_submitter is whether the grades have lateness info (from a scores sheet).
+# :: aggregator is a ReportAggregator already holding the grades (e.g., kept up to date a question at a time, as by
+# :: incremental.watch); if None, one is made for them.
+def report(grades, rubric, questions, is_late_submitter, show_plot=SHOW_TA_GRADE_DIST, aggregator=None):
+    if len(questions) > 1:
+        print('\n')
+        with profiling.stage("outlier_check") as s:
+            s.rows = len(grades)
+            outliers = outlier_check(grades)
+            outliers.to_csv("student_outliers.csv", index=False)
+    print('\n')
+    with profiling.stage("ta_consistency_check") as s:
+        s.rows = len(grades)
+        ta_group = ta_consistency_check(grades)
+    if ta_group is not None:
+        with profiling.stage("export_ta_stats"):
+            ta_group['question'].to_csv("ta_stats_by_question.csv", index=False)
+            ta_group['item'].to_csv("ta_stats_by_item.csv", index=False)
+
+    # Unassigned students, completion rates and the exports, from one pass over the grades (see reports.py)
+    if aggregator is None:
+        aggregator = new_aggregator(rubric, questions, is_late_submitter)
+        with profiling.stage("aggregate") as s:
+            s.rows = len(grades)
+            aggregator.add(grades)
+    complete = aggregator.emit()
+
+    # Show TA grade distribution
+    if show_plot:
+        with profiling.stage("plot"): # (includes the time the plot window is open)
+            import matplotlib
+            matplotlib.use('TkAgg')
+            import matplotlib.pyplot as plt
+
+            def set_axis_style(ax, labels):
+                ax.xaxis.set_tick_params(direction='out')
+                ax.xaxis.set_ticks_position('bottom')
+                ax.set_xticks(np.arange(1, len(labels) + 1))
+                ax.set_xticklabels(labels)
+                ax.set_xlim(0.25, len(labels) + 0.75)
+                ax.set_xlabel('Grader Name')
+
+            graders_scores = [(g, gs.column('total_score')) for g, gs in ta_stats(complete).items()]
+            graders_scores.sort(key=lambda x: x[1].mean())
+            data = [np.sort(scores) for (_, scores) in graders_scores]
+            if len(data) == 0:
+                print("Skipping dist visual: No grades to display.")
+                return
+            total_mean = np.median(np.hstack(data))
+
+            fig, ax1 = plt.subplots(nrows=1, ncols=1, figsize=(16, 6), sharey=True)
+
+            ax1.set_title('TA Score Distribution')
+            ax1.set_ylabel('Scores')
+            plt.xticks(rotation = 90) # Rotates X-Axis Ticks by 45-degrees
+            ax1.violinplot(data)
+
+            plt.axhline(y=total_mean, color='k', linestyle='dashed', linewidth=1)
+
+            # set style for the axes
+            if SHOW_TA_GRADE_DIST_ONLY_TA is not None:
+                labels = [(g if g == SHOW_TA_GRADE_DIST_ONLY_TA else ".") for (g, _) in graders_scores]
+            else:
+                labels = [(g + " ({})".format(len(_))) for (g, _) in graders_scores]
+            for ax in [ax1]:
+                set_axis_style(ax, labels)
+
+            plt.subplots_adjust(bottom=0.4, wspace=0.05)
+            plt.show()
 
 # Command-line loading.
+# :: Usage: python grades.py [assn_name] [--watch] [--profile]
+# :: With --watch, keeps re-running the reports whenever the assignment's CSVs change (see incremental.py).
+# :: With --profile, saves the time and memory each stage took to profile.json, and prints a summary (see profiling.py).
 if __name__ == "__main__":
+
     # Load central config file
     import load
     config = load.config()
 
     # Check for special command-line argument of which assignment to analyze:
     assn_name, assn_info = None, None
-    if len(sys.argv) > 1:
-        if sys.argv[1] in config["assignments"]:
-            assn_name, assn_info = sys.argv[1], config["assignments"][sys.argv[1]]
+    for arg in sys.argv[1:]:
+        if arg in config["assignments"]:
+            assn_name, assn_info = arg, config["assignments"][arg]
 
     # Ask for which assignment to load:
     if assn_name is None:
@@ -416,199 +900,19 @@ if __name__ == "__main__":
     rubric_path = assn_info["rubric"]
     csv_dir = assn_info["data"]
 
-    # Calculate grades
-    grades, rubric, questions = load_grades(rubric_path, csv_dir, only_submitted=False)
-    qkeys = sorted(list(questions.keys()))
-    num_questions = len(questions)
-
-    if num_questions > 1:
-        print('\n')
-        outlier_check(grades)
-    print('\n')
-    ta_consistency_check(grades)
-
-    # Special check --unassigned questions:
-    total_unassigned = []
-    unassigned = dict()
-    unassigned_urls = dict()
-    unscored = [g for g in grades if g['was_submitted'] is False and g['total_score'] == 0]
-    for g in unscored:
-        email = g['email']
-        if email not in unassigned_urls: unassigned_urls[email] = g['url'].split("#")[0]
-        if email not in unassigned: unassigned[email] = 1
-        else: unassigned[email] += 1
-    for key, num_unassigned in unassigned.items():
-        if num_unassigned == num_questions:
-            print("\nUnassigned detected for", key, unassigned_urls[key])
-            total_unassigned.append(["", "*Unassigned*", unassigned_urls[key]])
-    print("Total unassigned: ", len(total_unassigned))
-    df_unassigned = pd.DataFrame(total_unassigned, columns=["Grader", "Question", "URL"])
-    df_unassigned.to_csv("unassigned_to_question.csv", index=False)
-
-    # If there's more than one question, count the grading progress of each:
-    is_late_submitter = additional_scores_sheet is not None
-    graded_but_score_zero = []
-    if num_questions > 1:
-        print("\nPer question completion rates (assumes you've included a 'was submitted' rubric item per question and filled this out for all submissions):")
-        completion_rates = []
-        for q in qkeys:
-            submitted = [g for g in grades if g['was_submitted'] is True and g['question'] is q]
-            submitted_ungraded = [g for g in submitted if g['total_score'] == 0 or g['inc_score'] is True]
-
-            # print("For question", q)
-            # for g in submitted:
-            #     print(g['grader'], g['name'], g['total_score'])
-
-            # print("For question", q)
-            # ta_consistency_check(submitted)
-
-            if is_late_submitter: # if we have late submission information from the Download Grades sheet...
-                submitted_ontime = [g for g in submitted if g['late'] == 0]
-                submitted_ungraded_ontime = [g for g in submitted if g['late'] == 0 and (g['total_score'] == 0 or g['inc_score'] is True)]
-                completion_rates.append( (q, len(submitted)-len(submitted_ungraded), len(submitted_ungraded), \
-                                              len(submitted_ontime)-len(submitted_ungraded_ontime), len(submitted_ungraded_ontime)))
-            else:
-                completion_rates.append( (q, len(submitted)-len(submitted_ungraded), len(submitted_ungraded)) )
-
-        if is_late_submitter:
-            for (q, num_graded, num_ungraded, num_graded_ontime, num_ungraded_ontime) in completion_rates:
-                total_submitted = num_graded + num_ungraded
-                total_ontime = num_graded_ontime + num_ungraded_ontime
-                print(" > {}:\t{} / {} total graded ({:.0f}%),\t{} / {} ontime graded ({:.0f}%)".format(q, num_graded, total_submitted, 100 if total_submitted==0 else 100*num_graded/total_submitted, num_graded_ontime, total_ontime, 100 if total_ontime==0 else 100*num_graded_ontime/total_ontime))
-        else:
-            for (q, num_graded, num_ungraded) in completion_rates:
-                total_submitted = num_graded + num_ungraded
-                print(" > {}:\t{} / {} graded ({:.0f}%)".format(q, num_graded, total_submitted, 100 if total_submitted==0 else 100*num_graded/(num_graded+num_ungraded)))
-
-    # We need to remove all non-submissions to each question before doing useful operations
-    grades = [g for g in grades if g['was_submitted'] is True]
-
-    student_submissions = dict()
-    for g in grades:
-        if g['sid'] in student_submissions:
-            student_submissions[g['sid']].append(g)
-        else:
-            student_submissions[g['sid']] = [ g ]
-
-    # Export all grades, sorted by student and question:
-    export_cols = ["Name", "Email", "Question", "Grader", "Comments", "Adjustment", "Total Score"]
-    item_names = rubric['shortnames'].keys()
-    export_cols.extend(item_names)
-    export_cols.extend(["URL", "SID", "Assignment Submission ID", "Question Submission ID"])
-    export_grades = []
-    for g in grades:
-        if g['inc_score'] == True: continue
-        row = [ g['name'], g['email'], g['question'], g['grader'], g['comments'], g['adjustment'], g['total_score'] ]
-        row.extend([score for _, score in g['grade'].items()])
-        row.extend([g['url'], g['sid'], g['aid'], g['qid']])
-        export_grades.append(row)
-    export_grades.sort(key=lambda r: (r[0], r[2]))
-    df_grades = pd.DataFrame(export_grades, columns=export_cols)
-    df_grades.to_csv("all_grades.csv", index=False)
-
-    # Export only what is left to grade:
-    export_cols = ["Grader", "Question", "URL"]
-    export_grades = []
-    for g in grades:
-        if g['inc_score'] == False:
-            if g['total_score'] == 0: # check for weird graded-but-zero assignments:
-                export_grades.append([ g['grader'], "Warning: Grade is 0 but marked as fully graded.", g['url'] ])
-            continue
-        export_grades.append([ g['grader'], g['question'], g['url'] ])
-    export_grades += total_unassigned
-    export_grades.sort(key=lambda r: r[1])
-    df_leftgrades = pd.DataFrame(export_grades, columns=export_cols)
-    df_leftgrades.to_csv("left_to_grade.csv", index=False)
-
-    # Collect grading errors into a spreadsheet
-    aggr_errs = []
-    for sid, gs in student_submissions.items():
-        for g in gs:
-            for e in g['errors']:
-                aggr_errs.append( [str(datetime.datetime.now()), e, g['grader'], g['comments'], g['question'], g['url'] ] )
-    aggr_errs.sort(key=lambda r: (r[0], r[1], r[2], r[4])) # sort on time first, then error type, then grader, then question #
-    df_errs = pd.DataFrame(aggr_errs, columns=["First seen", "Issue", "Grader", "Comments", "Question", "URL"])
-
-    if ERROR_CHECK_PERSISTENCE and os.path.exists("grading_errors.csv"):
-        # Load the prior error list, if it exists
-        df_prev = pd.read_csv("grading_errors.csv")
-        df_prev['Question'] = df_prev['Question'].astype(str) # a fix since single-question csvs have the name "1" which confuses pandas
-        # Find which rows are *shared* between the prior error check and the current one (excluding timestamp column)
-        df_shared_rows = df_prev.merge(df_errs.drop(columns=['First seen'], inplace=False), how='inner', indicator=False)
-        # Find rows in the current errors which are new (not in prev list)
-        df_new_errs = df_errs.merge(df_prev.drop(columns=['First seen'], inplace=False), \
-                            how ='outer', indicator=True).loc[lambda x:x['_merge']=='left_only']
-        # Merge the new with the old, which keeps the timestamps:
-        df_merged_errs = pd.concat([df_new_errs, df_shared_rows], ignore_index=True, sort=False)
-        df_merged_errs.drop(columns=['_merge'], inplace=False).to_csv("grading_errors.csv", index=False)
+    if "--watch" in sys.argv:
+        import incremental
+        incremental.watch(rubric_path, csv_dir)
     else:
-        df_errs.to_csv("grading_errors.csv", index=False)
-
-    # Collect student 'missed questions' into a spreadsheet
-    if num_questions > 1:
-        if 'expectedQuestionsAnswered' not in rubric:
-            print("Error: Cannot export which students are missing questions. Set expectedQuestionsAnswered in rubric.")
-        else:
-            # Loop through students
-            students_missing_qs = []
-            for sid, gs in student_submissions.items():
-                if len(gs) != rubric['expectedQuestionsAnswered']:
-                    students_missing_qs.append( [sid, gs[0]['name'], gs[0]['email'], rubric['expectedQuestionsAnswered']-len(gs)] )
-            df_miss = pd.DataFrame(students_missing_qs, columns=["SID", "Name", "Email", "Number Missing"])
-            df_miss.to_csv("missing_questions.csv", index=False)
-
-    # Show TA grade distribution
-    if SHOW_TA_GRADE_DIST:
-        import matplotlib
-        matplotlib.use('TkAgg')
-        import matplotlib.pyplot as plt
-
-        def set_axis_style(ax, labels):
-            ax.xaxis.set_tick_params(direction='out')
-            ax.xaxis.set_ticks_position('bottom')
-            ax.set_xticks(np.arange(1, len(labels) + 1))
-            ax.set_xticklabels(labels)
-            ax.set_xlim(0.25, len(labels) + 0.75)
-            ax.set_xlabel('Grader Name')
-
-        complete_grades = [g for g in grades if g['inc_score'] == False]
-        graders_scores = [(g, d) for g, d in ta_stats(complete_grades).items()]
-        graders_scores.sort(key=lambda x: stat.mean([d[0] for d in x[1]]))
-        data = [np.array(sorted([d[0] for d in data])) for (_, data) in graders_scores] #, dtype=object)
-        if len(data) == 0:
-            print("Skipping dist visual: No grades to display.")
-            exit(0)
-        total_mean = np.median(np.hstack(data))
-
-        fig, ax1 = plt.subplots(nrows=1, ncols=1, figsize=(16, 6), sharey=True)
-
-        ax1.set_title('TA Score Distribution')
-        ax1.set_ylabel('Scores')
-        plt.xticks(rotation = 90) # Rotates X-Axis Ticks by 45-degrees
-        ax1.violinplot(data)
-
-        plt.axhline(y=total_mean, color='k', linestyle='dashed', linewidth=1)
-
-        # set style for the axes
-        if SHOW_TA_GRADE_DIST_ONLY_TA is not None:
-            labels = [(g if g == SHOW_TA_GRADE_DIST_ONLY_TA else ".") for (g, _) in graders_scores]
-        else:
-            labels = [(g + " ({})".format(len(_))) for (g, _) in graders_scores]
-        for ax in [ax1]:
-            set_axis_style(ax, labels)
-
-        plt.subplots_adjust(bottom=0.4, wspace=0.05)
-        plt.show()
-
-    # Calculate grading distributions per rubric item
-    # item_scores = [[] for i in range(len(rubric['shortnames']))]
-    # for g in grades:
-    #     for i, key in enumerate(g['grade']):
-    #         item_scores[i].append(g['grade'][key])
-    #
-    # for i, name in enumerate(rubric['shortnames']):
-    #     print(name)
-    #     dist = item_scores[i]
-    #     print(stat.median(dist))
-    #     print(stat.mean(dist))
-    #     print(stat.stdev(dist))
+        if "--profile" in sys.argv:
+            profiling.enable()
+
+        # Calculate grades
+        try:
+            grades, rubric, questions, has_scores_sheet = load_grades(rubric_path, csv_dir, only_submitted=False, with_scores_sheet=True, store_as=assn_name)
+        except ValueError as e:
+            print("Error:", e)
+            sys.exit(1)
+        with profiling.stage("report"):
+            report(grades, rubric, questions, has_scores_sheet)
+        profiling.finish()
@@ -0,0 +1,202 @@
+from collections.abc import Mapping
+from lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# The fields of a grade, in the order calc_grade returns them.
+# :: 'grade' is the dict of rubric item scores, and 'url' is built from the other fields when asked for.
+FIELDS = ["name", "sid", "aid", "qid", "email", "comments", "question", "grader", "grade", \
+          "adjustment", "total_score", "was_submitted", "inc_score", "errors", "url"]
+
+# Columns used to build other fields, which aren't fields of a grade themselves
+INTERNAL_COLUMNS = ["question_num"]
+
+# Column types (as numpy dtype names). Anything not listed here (e.g., strings, error lists) is a Python object column.
+DTYPES = {
+    "sid": "int64",
+    "adjustment": "float64",
+    "total_score": "float64",
+    "was_submitted": "bool",
+    "inc_score": "bool",
+    "question_num": "int64",
+    "late": "float64"
+}
+
+URL_FORMAT = "https://www.gradescope.com/courses/288777/assignments/{}/submissions/{}#Question_{}"
+
+# Makes a 1-D array for a column from a list of values.
+# :: (Done by hand for objects, as np.array would turn a list of lists into a 2-D array.)
+def make_column(values, dtype=object):
+    if dtype is object:
+        col = np.empty(len(values), dtype=object)
+        col[:] = values
+        return col
+    return np.asarray(values, dtype=dtype)
+
+# Whether a list of numbers holds only Python ints. Such columns are exported as ints, like they used to be.
+def all_ints(values):
+    return all(type(v) is int for v in values)
+
+# Struct-of-arrays table of grades: one typed array per field, plus a 2-D matrix of rubric item scores
+# (one row per grade, one column per rubric item shortname).
+# :: Iterating (or indexing with an int) gives dict-like rows, so code written for lists of grade dicts keeps working.
+# :: Indexing with a boolean mask, slice or array of indices gives a new GradeTable.
+class GradeTable:
+    def __init__(self, columns, items, scores, assignment_id="", int_columns=()):
+        self.columns = columns # field name -> 1-D array
+        self.items = list(items) # rubric item shortnames, in rubric order
+        self.scores = scores # 2-D float array of rubric item scores
+        self.assignment_id = assignment_id # GS assignment ID, for URLs
+        self.int_columns = set(int_columns) # numeric fields and items that only held ints
+
+    # An empty table
+    @classmethod
+    def empty(cls, items=(), assignment_id=""):
+        columns = { f: make_column([], DTYPES.get(f, object)) for f in FIELDS + INTERNAL_COLUMNS if f not in ("grade", "url") }
+        return cls(columns, items, np.zeros((0, len(items))), assignment_id, int_columns=set(items) | {"adjustment", "total_score"})
+
+    # Builds a table from a list of grade dicts (in the format calc_grade returns).
+    @classmethod
+    def from_records(cls, records, assignment_id=""):
+        if len(records) == 0:
+            return cls.empty(assignment_id=assignment_id)
+        items = list(records[0]['grade'].keys())
+        columns = dict()
+        int_columns = set()
+        for f in records[0].keys():
+            if f == 'grade': continue
+            values = [r[f] for r in records]
+            columns[f] = make_column(values, DTYPES.get(f, object))
+            if f in DTYPES and all_ints(values):
+                int_columns.add(f)
+        item_values = [[r['grade'][item] for r in records] for item in items]
+        int_columns.update(item for item, values in zip(items, item_values) if all_ints(values))
+        scores = np.array(item_values, dtype=np.float64).T.reshape(len(records), len(items))
+        return cls(columns, items, scores, assignment_id, int_columns)
+
+    # Stacks tables (e.g., of different questions of the same assignment) into one.
+    @classmethod
+    def concat(cls, tables):
+        tables = list(tables)
+        if len(tables) == 0:
+            return cls.empty()
+        items = []
+        for t in tables:
+            items.extend(i for i in t.items if i not in items)
+        names = []
+        for t in tables:
+            names.extend(c for c in t.columns if c not in names)
+        columns = dict()
+        for c in names:
+            parts = [t.columns[c] if c in t.columns else t.default_column(c) for t in tables]
+            columns[c] = np.concatenate(parts) if len(parts) > 1 else parts[0].copy()
+        scores = np.zeros((sum(len(t) for t in tables), len(items)))
+        start = 0
+        for t in tables:
+            cols = [items.index(i) for i in t.items]
+            scores[start:start+len(t), cols] = t.scores
+            start += len(t)
+        int_columns = set(names) | set(items)
+        for t in tables:
+            int_columns &= t.int_columns | (set(names) - set(t.columns)) | (set(items) - set(t.items))
+        return cls(columns, items, scores, tables[0].assignment_id, int_columns)
+
+    def __len__(self):
+        return self.scores.shape[0]
+
+    def __iter__(self):
+        return (GradeRow(self, i) for i in range(len(self)))
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return GradeRow(self, int(key) if key >= 0 else len(self) + int(key))
+        return self.take(key)
+
+    # A new table with only the given rows (a boolean mask, slice or array of indices).
+    def take(self, rows):
+        columns = { c: col[rows] for c, col in self.columns.items() }
+        return GradeTable(columns, self.items, self.scores[rows], self.assignment_id, self.int_columns)
+
+    # The array of values of a field or rubric item (built, for 'url').
+    def column(self, name):
+        if name == 'url' and 'url' not in self.columns:
+            return make_column([URL_FORMAT.format(self.assignment_id, aid, num) for aid, num in \
+                                zip(self.columns['aid'], self.columns['question_num'].tolist())])
+        if name in self.columns:
+            return self.columns[name]
+        return self.scores[:, self.items.index(name)]
+
+    # Sets (or adds) a field for every row.
+    def set_column(self, name, values):
+        self.columns[name] = make_column(values, DTYPES.get(name, object)) if isinstance(values, list) else np.asarray(values)
+        self.int_columns.discard(name)
+
+    # A column of the right type and length filled with 'missing' values
+    def default_column(self, name):
+        dtype = DTYPES.get(name, object)
+        if dtype is object:
+            return make_column([None] * len(self))
+        return np.zeros(len(self), dtype=dtype)
+
+    # The fields each row has, in order
+    def fields(self):
+        fields = [f for f in FIELDS if f in self.columns or f in ("grade", "url")]
+        return fields + [c for c in self.columns if c not in FIELDS and c not in INTERNAL_COLUMNS]
+
+    # The array of values of a field or rubric item, as ints if it only ever held ints (for exporting).
+    def export_column(self, name):
+        col = self.column(name)
+        return col.astype(np.int64) if name in self.int_columns else col
+
+    # Converts to a DataFrame with one column per field, where 'grade' is expanded into one column per rubric item.
+    def to_pandas(self):
+        data = dict()
+        for f in self.fields():
+            if f == 'grade':
+                for item in self.items:
+                    data[item] = self.export_column(item)
+            else:
+                data[f] = self.export_column(f)
+        return pd.DataFrame(data)
+
+    def value(self, name, i):
+        if name == 'grade':
+            return { item: (int(s) if item in self.int_columns else float(s)) for item, s in zip(self.items, self.scores[i]) }
+        if name == 'url' and 'url' not in self.columns:
+            return URL_FORMAT.format(self.assignment_id, self.columns['aid'][i], int(self.columns['question_num'][i]))
+        v = self.columns[name][i]
+        if name in self.int_columns:
+            return int(v)
+        return v.item() if isinstance(v, np.generic) else v
+
+    def set_value(self, name, i, value):
+        if name not in self.columns:
+            self.columns[name] = self.default_column(name)
+        elif name in self.int_columns and type(value) is not int:
+            self.int_columns.discard(name)
+        self.columns[name][i] = value
+
+# A dict-like view of one row of a GradeTable. Setting a key writes through to the table.
+class GradeRow(Mapping):
+    __slots__ = ('table', 'i')
+
+    def __init__(self, table, i):
+        self.table = table
+        self.i = i
+
+    def __getitem__(self, key):
+        if key not in ('grade', 'url') and key not in self.table.columns:
+            raise KeyError(key)
+        return self.table.value(key, self.i)
+
+    def __setitem__(self, key, value):
+        self.table.set_value(key, self.i, value)
+
+    def __iter__(self):
+        return iter(self.table.fields())
+
+    def __len__(self):
+        return len(self.table.fields())
+
+    def __repr__(self):
+        return repr(dict(self))
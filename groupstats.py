@@ -0,0 +1,58 @@
+from lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Grouped statistics over columns of grades (e.g., total scores, or the rubric item score matrix),
+# for every group (e.g., grader, or grader x question) at once.
+# :: Rows are sorted by group once, and sums are taken per group with np.add.reduceat, so the cost doesn't grow
+# :: with the number of groups or columns the way a Python loop over groups would.
+
+# Dense group codes for the combinations of keys (arrays of the same length) that occur, in order of first appearance.
+# :: Returns (codes, first), where first[c] is the index of the first row in group c.
+def group_codes(*keys):
+    combined = np.zeros(len(keys[0]), dtype=np.int64)
+    for key in keys:
+        codes, uniques = pd.factorize(key)
+        combined = combined * len(uniques) + codes
+    codes, _ = pd.factorize(combined)
+    _, first = np.unique(codes, return_index=True)
+    return codes, first
+
+# Count, mean, sample st. dev. and median of each column of values (a 1-D or 2-D array, one row per grade) per group.
+# :: codes are each row's group, from 0 to num_groups-1 (as from group_codes), and every group must have a row.
+# :: St. devs. of groups of one are 0 (as ta_consistency_check has always shown them).
+# :: Returns (counts, means, stdevs, medians), where counts is 1-D and the others are (groups x columns).
+def grouped_stats(codes, num_groups, values):
+    values = np.asarray(values, dtype=np.float64).reshape(len(codes), -1)
+    if num_groups == 0:
+        empty = np.zeros((0, values.shape[1]))
+        return np.zeros(0, dtype=np.int64), empty, empty.copy(), empty.copy()
+
+    counts = np.bincount(codes, minlength=num_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    order = np.argsort(codes, kind='stable')
+    grouped = values[order]
+
+    means = np.add.reduceat(grouped, starts, axis=0) / counts[:, None]
+    sq_dev = np.add.reduceat((grouped - means[codes[order]])**2, starts, axis=0)
+    stdevs = np.sqrt(sq_dev / np.maximum(counts - 1, 1)[:, None])
+
+    # Medians: sort each column within groups, and take the middle one (or two) of each
+    lo, hi = starts + (counts - 1) // 2, starts + counts // 2
+    medians = np.empty_like(means)
+    for j in range(values.shape[1]):
+        col = values[np.lexsort((values[:, j], codes)), j]
+        medians[:, j] = (col[lo] + col[hi]) / 2
+    return counts, means, stdevs, medians
+
+# Min and max of each column of values per group (with codes and num_groups as for grouped_stats).
+# :: Returns (mins, maxs), each (groups x columns).
+def grouped_range(codes, num_groups, values):
+    values = np.asarray(values, dtype=np.float64).reshape(len(codes), -1)
+    if num_groups == 0:
+        empty = np.zeros((0, values.shape[1]))
+        return empty, empty.copy()
+    counts = np.bincount(codes, minlength=num_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    grouped = values[np.argsort(codes, kind='stable')]
+    return np.minimum.reduceat(grouped, starts, axis=0), np.maximum.reduceat(grouped, starts, axis=0)
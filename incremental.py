@@ -0,0 +1,159 @@
+import os
+import time
+import gradecache
+import snapshot
+from columns import ColumnResolver
+from grades import load_rubric, scan_csv_dir, load_gradesheet, load_scores_sheet, attach_lateness, report, new_aggregator
+from gradetable import GradeTable
+
+# How often to check the data directory for changed CSVs, in seconds
+POLL_INTERVAL = 2
+
+# Keeps an assignment's grades up to date as its CSVs change, re-scoring only the question CSVs that changed.
+# :: Changes are detected by polling each CSV's modification time and size, and confirmed with a content hash
+# :: (so re-downloads of identical files don't count as changes).
+# :: If the data directory is a snapshot symlink (see snapshot.py), nothing changed unless it points to a new snapshot,
+# :: and CSVs are matched across snapshots by their path within them.
+class IncrementalGrades:
+    def __init__(self, rubric_path, csv_dir):
+        self.csv_dir = csv_dir
+        self.rubric = load_rubric(rubric_path)
+        self.resolver = ColumnResolver(self.rubric['gsAssignmentID'])
+        self.questions = dict() # question name -> csv path
+        self.question_grades = dict() # question name -> grades, for all rows of that csv
+        self.scores_sheet = None # loaded scores sheet (see load_scores_sheet), if any
+        self.signatures = dict() # csv path (within csv_dir) -> (mtime, size, content hash) when last loaded
+        self.root = None # the directory the CSVs were last read from (csv_dir, or the snapshot it points to)
+        self.grades = GradeTable.empty(assignment_id=self.rubric['gsAssignmentID']) # all questions' grades, as of the last refresh
+        self.rows = dict() # question name -> slice of its rows in grades
+
+    # Returns the signature of the CSV at path if it changed since it was last loaded, otherwise None.
+    def changed(self, path):
+        st = os.stat(path)
+        old = self.signatures.get(self.key(path))
+        if old is not None and old[:2] == (st.st_mtime_ns, st.st_size):
+            return None
+        sig = (st.st_mtime_ns, st.st_size, gradecache.file_hash(path))
+        if old is not None and old[2] == sig[2]:
+            self.signatures[self.key(path)] = sig # touched but not changed
+            return None
+        return sig
+
+    # Key of a CSV in signatures: its path within the directory it was read from
+    def key(self, path, root=None):
+        return os.path.relpath(path, root or self.root)
+
+    # Re-loads whatever changed on disk since the last call.
+    # :: Returns the names of the questions that were re-scored, or None if nothing changed at all.
+    def refresh(self):
+        root = snapshot.resolve(self.csv_dir)
+        if root != self.csv_dir and root == self.root:
+            return None # same snapshot as last time (snapshots don't change)
+        try:
+            questions, scores_path = scan_csv_dir(root)
+        except FileNotFoundError:
+            return None # directory is being replaced; try again next time
+        prev_root, self.root = self.root, root
+        for q in self.rubric.get("skipQuestions", []):
+            questions.pop(q, None)
+
+        updated = []
+        for name, csv in list(questions.items()):
+            try:
+                sig = self.changed(csv)
+                if sig is None and name in self.question_grades and self.key(self.questions[name], prev_root) == self.key(csv):
+                    continue
+                num = int(os.path.basename(csv).split("_")[0])
+                self.question_grades[name] = load_gradesheet(self.rubric, name, csv, num, only_submitted=False, resolver=self.resolver)
+                if sig is not None:
+                    self.signatures[self.key(csv)] = sig
+                updated.append(name)
+            except Exception as e:
+                # Likely a half-written download. Keep the old grades and try again next time.
+                print("Warning: Could not load {} ({}). Will retry.".format(csv, e))
+                questions[name] = self.questions.get(name)
+                if questions[name] is None: del questions[name]
+        self.resolver.save()
+
+        removed = [name for name in self.question_grades if name not in questions]
+        for name in removed:
+            del self.question_grades[name]
+
+        scores_changed = False
+        if scores_path is None:
+            scores_changed = self.scores_sheet is not None
+            self.scores_sheet = None
+        else:
+            try:
+                sig = self.changed(scores_path)
+                if sig is not None or self.scores_sheet is None:
+                    self.scores_sheet = load_scores_sheet(scores_path)
+                    if sig is not None: self.signatures[self.key(scores_path)] = sig
+                    scores_changed = True
+            except Exception as e:
+                print("Warning: Could not load {} ({}). Will retry.".format(scores_path, e))
+
+        self.questions = questions
+        if len(updated) == 0 and len(removed) == 0 and not scores_changed:
+            return None
+
+        # Re-stack the questions' grades, in question order (like load_grades with only_submitted=False).
+        # :: Lateness is re-joined onto every grade, as the scores sheet covers all questions
+        tables = [self.question_grades[name] for name in self.questions]
+        self.grades = GradeTable.concat(tables) if tables else GradeTable.empty(assignment_id=self.rubric['gsAssignmentID'])
+        if self.scores_sheet is not None:
+            attach_lateness(self.grades, self.scores_sheet)
+        self.rows, start = dict(), 0
+        for name, table in zip(self.questions, tables):
+            self.rows[name] = slice(start, start + len(table))
+            start += len(table)
+        return updated
+
+    # A question's grades (with lateness, if known), as of the last refresh
+    def question(self, name):
+        return self.grades[self.rows[name]]
+
+# Keeps a ReportAggregator of an assignment's grades (an IncrementalGrades) up to date across refreshes,
+# swapping in only the re-scored questions' parts.
+# :: It's rebuilt from every question when the questions themselves, or the scores sheet (whose lateness
+# :: touches every question), changed.
+class IncrementalReports:
+    def __init__(self, grades):
+        self.grades = grades
+        self.aggregator = None
+        self.questions = None # question names, and the scores sheet, the aggregator was built for
+        self.scores_sheet = None
+
+    # Brings the aggregator up to date with the questions re-scored by the last refresh (updated). Returns it.
+    def update(self, updated):
+        grades = self.grades
+        if self.aggregator is None or list(grades.questions) != self.questions or grades.scores_sheet is not self.scores_sheet:
+            self.aggregator = new_aggregator(grades.rubric, grades.questions, grades.scores_sheet is not None)
+            self.questions, self.scores_sheet = list(grades.questions), grades.scores_sheet
+            updated = list(grades.questions) if len(grades.questions) > 0 else None
+            if updated is None:
+                self.aggregator.add(grades.grades) # (empty)
+        for name in updated or []:
+            self.aggregator.add(grades.question(name), key=name)
+        return self.aggregator
+
+# Watches an assignment's data directory, re-running the grades.py reports whenever its CSVs change.
+# :: Per-question completion rates, unassigned students and the exports are patched with just the re-scored questions
+# :: (see IncrementalReports); the outlier and TA checks compare students and TAs across questions, so they're re-run
+# :: over all grades (each is one vectorized pass), and every report file is rewritten whole.
+def watch(rubric_path, csv_dir, interval=POLL_INTERVAL):
+    grades = IncrementalGrades(rubric_path, csv_dir)
+    reports = IncrementalReports(grades)
+    print("Watching", csv_dir, "for changes. Press Ctrl-C to stop.")
+    try:
+        while True:
+            updated = grades.refresh()
+            if updated is not None:
+                if len(updated) > 0:
+                    print("\n== Re-scored question(s): {} ==".format(", ".join(updated)))
+                report(grades.grades, grades.rubric, grades.questions, grades.scores_sheet is not None, show_plot=False,
+                       aggregator=reports.update(updated))
+                print("\n== Reports updated at {} ==".format(time.strftime("%H:%M:%S")))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
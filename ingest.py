@@ -0,0 +1,137 @@
+import os
+from lazy import lazy_import
+pd = lazy_import("pandas")
+
+# Typed CSV reading for every source the scripts load: GS eval sheets, GS scores sheets ("Download Grades",
+# also used for the final exam), Canvas rosters and Canvas quiz exports.
+# :: Each source has a schema: the columns we use, and their types. Other columns are skipped when reading,
+# :: and columns aren't type-inferred, which saves parse time and (with rubric items as categories) most of the memory.
+# :: Rows that aren't students (GS' trailer rows, Canvas' "Points Possible", etc.) are dropped by what they are,
+# :: rather than by position.
+# :: If a file doesn't fit its schema (e.g., text in a numeric column), it's re-read with inferred types instead.
+
+# Use the (multithreaded) pyarrow CSV reader when it's installed
+USE_PYARROW = True
+# Files bigger than this (in bytes) are read CHUNK_ROWS rows at a time, dropping unneeded rows as they go
+CHUNK_BYTES = 64 * 1024 * 1024
+CHUNK_ROWS = 50000
+
+# GS eval sheet ("Export Evaluations", one per question). Rubric item columns (named by the rubric) are added as
+# categories, whose values stay the strings GS writes ("true"/"false") so that scoring reads them the same as ever.
+GS_EVAL_COLUMNS = {
+    "Assignment Submission ID": str,
+    "Question Submission ID": "float64",
+    "Name": str,
+    "First Name": str,
+    "Last Name": str,
+    "SID": str,
+    "Email": str,
+    "Score": "float64",
+    "Grader": str,
+    "Adjustment": "float64",
+    "Comments": str
+}
+# Labels (in the first column) of the rows GS adds to the end of eval sheets
+GS_TRAILER_LABELS = ["Point Values", "Rubric Numbers", "Rubric Type"]
+
+# GS scores sheet ("Download Grades")
+GS_SCORES_COLUMNS = {
+    "SID": str,
+    "Email": str,
+    "Total Score": "float64",
+    "Status": "category",
+    "Lateness (H:M:S)": str
+}
+
+# Canvas roster ("Export" from the Gradebook). Assignment columns (e.g., extra credit) can be added when reading.
+CANVAS_ROSTER_COLUMNS = {
+    "Student": str,
+    "SIS User ID": "float64",
+    "SIS Login ID": str,
+    "Section": str
+}
+
+# Canvas quiz export ("Student Analysis")
+CANVAS_QUIZ_COLUMNS = {
+    "sis_id": "float64",
+    "attempt": "float64",
+    "submitted": str
+}
+
+def pyarrow_installed():
+    try:
+        import pyarrow
+        return True
+    except ImportError:
+        return False
+
+# The column names of a CSV
+def header(path):
+    return pd.read_csv(path, nrows=0).columns
+
+# Concatenates chunks of a CSV, merging the categories of categorical columns (which pd.concat would turn into objects)
+def concat_chunks(chunks):
+    if len(chunks) == 1:
+        return chunks[0]
+    df = pd.concat(chunks, ignore_index=True)
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            df[col] = pd.api.types.union_categoricals([c[col] for c in chunks])
+    return df
+
+# Reads the columns of a CSV that are in the schema (a dict of column name -> dtype), with those types.
+# :: keep optionally maps a DataFrame to a mask of the rows to keep (applied per chunk, for big files).
+# :: cols is the CSV's header, if already read.
+def read_csv(path, schema, keep=None, cols=None):
+    if cols is None:
+        cols = header(path)
+    usecols = [c for c in cols if c in schema]
+    dtype = { c: schema[c] for c in usecols }
+
+    def read(dtype):
+        if os.path.getsize(path) > CHUNK_BYTES:
+            chunks = [c[keep(c)] if keep is not None else c for c in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=CHUNK_ROWS)]
+            return concat_chunks(chunks) if len(chunks) > 0 else pd.read_csv(path, usecols=usecols, dtype=dtype, nrows=0)
+        df = None
+        if USE_PYARROW and pyarrow_installed():
+            try:
+                df = pd.read_csv(path, usecols=usecols, dtype=dtype, engine="pyarrow")
+            except Exception:
+                df = None # an option pyarrow doesn't support; use the default reader
+        if df is None:
+            df = pd.read_csv(path, usecols=usecols, dtype=dtype)
+        return df[keep(df)] if keep is not None else df
+
+    try:
+        return read(dtype)
+    except (ValueError, TypeError) as e:
+        print("Warning: {} doesn't match the expected column types ({}). Reading it with inferred types.".format(path, e))
+        return read({ c: t for c, t in dtype.items() if t in (str, "category") })
+
+# Reads a GS eval sheet: the standard columns, plus the given rubric item columns, for rows with a SID.
+# :: cols is the sheet's header, if already read.
+def read_gradesheet(path, item_columns=(), cols=None):
+    if cols is None:
+        cols = header(path)
+    schema = dict(GS_EVAL_COLUMNS)
+    schema.update({ col: "category" for col in item_columns })
+    schema.setdefault(cols[0], str)
+    return read_csv(path, schema, keep=lambda df: df['SID'].notna() & ~df[cols[0]].isin(GS_TRAILER_LABELS), cols=cols)
+
+# Reads a GS scores sheet (e.g., for lateness, or final exam scores)
+def read_scores_sheet(path):
+    return read_csv(path, GS_SCORES_COLUMNS)
+
+# Reads a Canvas roster's students (rows with a SIS User ID, which leaves out "Points Possible", the test student, etc.).
+# :: extra_columns maps any other columns to read (e.g., an extra credit assignment) to their types.
+# :: 'SIS User ID' is returned as ints.
+def read_roster(path, extra_columns={}):
+    schema = dict(CANVAS_ROSTER_COLUMNS)
+    schema.update(extra_columns)
+    df = read_csv(path, schema, keep=lambda df: df['SIS User ID'].notna())
+    return df.astype({ 'SIS User ID': 'int64' })
+
+# Reads a Canvas quiz export's attempts, for students with a SIS ID. 'sis_id' is returned as ints.
+def read_quiz(path):
+    df = read_csv(path, CANVAS_QUIZ_COLUMNS, keep=lambda df: df['sis_id'].notna())
+    return df.astype({ 'sis_id': 'int64' })
@@ -0,0 +1,18 @@
+import sys
+import importlib.util
+
+# Imports a module lazily: it's only loaded the first time one of its attributes is used.
+# :: Use as `pd = lazy_import("pandas")` in place of `import pandas as pd`, so that scripts which import a grading
+# :: module just for a quick lookup (e.g., load.config or grades.load_rubric) don't pay to import pandas and numpy.
+# :: If the module was already imported (lazily or not), returns that.
+def lazy_import(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named '{}'".format(name), name=name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,145 @@
+import os
+import json
+import math
+import hashlib
+import datetime
+from lazy import lazy_import
+pd = lazy_import("pandas")
+
+# Append-only ledger of grading errors, to remember when each was first seen across runs (see ERROR_CHECK_PERSISTENCE
+# in grades.py), and which have since been resolved.
+# :: Each error is keyed by a hash of (issue, question submission ID, grader), so it keeps its "First seen" time even
+# :: if, e.g., its comments change. The ledger file has one JSON line per change to an error (its full new state);
+# :: loading replays them into a dict by key (the last line for a key wins), so each run is one read of the ledger
+# :: plus an O(1) upsert per current error, and only errors that changed are appended.
+# :: The file is compacted (rewritten with one line per error) once most of its lines are out of date.
+# :: The first time (when there's no ledger file yet), errors take their "First seen" times from the grading_errors.csv
+# :: of an earlier run, if given one, by matching its columns (as grades.py did before it had a ledger).
+
+# Where the ledger is kept, relative to the course directory
+LEDGER_PATH = ".grading_cache/error_ledger.jsonl"
+# Compact the ledger once it has more than this many lines per error it holds (and at least COMPACT_MIN_LINES lines)
+COMPACT_RATIO = 4
+COMPACT_MIN_LINES = 1000
+
+# Columns of grading_errors.csv
+EXPORT_COLUMNS = ["First seen", "Issue", "Grader", "Comments", "Question", "URL"]
+
+# Stable key of an error
+def error_key(issue, qid, grader):
+    return hashlib.sha1(json.dumps([issue, qid, grader]).encode('utf-8')).hexdigest()[:20]
+
+# A value as stored in the ledger (None for missing values, ints for whole-number IDs)
+def plain(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value.item() if hasattr(value, 'item') else value
+
+# How an error is matched to a row of an exported grading_errors.csv: by its columns (but "First seen"), as strings
+def export_match(issue, grader, comments, question, url):
+    return tuple("" if plain(v) is None else str(plain(v)) for v in (issue, grader, comments, question, url))
+
+class ErrorLedger:
+    # :: seed_csv is the path of an earlier run's grading_errors.csv, to take "First seen" times from if there's no ledger yet.
+    def __init__(self, path=LEDGER_PATH, seed_csv=None):
+        self.path = path
+        self.errors = dict() # key -> latest state of the error (a dict)
+        self.lines = 0 # lines in the ledger file
+        self.seeds = dict() # export_match(...) -> first seen, from seed_csv
+        if not os.path.exists(path) and seed_csv is not None and os.path.exists(seed_csv):
+            df = pd.read_csv(seed_csv, dtype=str)
+            for first_seen, *row in df[EXPORT_COLUMNS].itertuples(index=False):
+                if not pd.isna(first_seen):
+                    self.seeds.setdefault(export_match(*row), first_seen)
+            print("Seeding the error ledger with the first seen times of {} errors in {}".format(len(self.seeds), seed_csv))
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    self.lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # e.g., a line cut short by a crash
+                    self.errors[entry['key']] = entry
+        self.pending = [] # changed entries, to append on save()
+
+    # Records an error as currently present. Returns its entry.
+    # :: New errors (and resolved ones that reappear) are first seen at now.
+    def upsert(self, assignment, issue, qid, grader, comments, question, url, now):
+        key = error_key(issue, qid, grader)
+        entry = self.errors.get(key)
+        fields = { "assignment": assignment, "issue": issue, "qid": qid, "grader": grader,
+                   "comments": comments, "question": question, "url": url }
+        if entry is None:
+            first_seen = self.seeds.pop(export_match(issue, grader, comments, question, url), now)
+            entry = dict(key=key, first_seen=first_seen, resolved=None, **fields)
+        elif entry["resolved"] is not None:
+            entry = dict(key=key, first_seen=now, resolved=None, **fields)
+        elif all(entry[f] == v for f, v in fields.items()):
+            return entry # unchanged
+        else:
+            entry = dict(entry, **fields)
+        self.errors[key] = entry
+        self.pending.append(entry)
+        return entry
+
+    # Marks the open errors of an assignment whose keys aren't in present as resolved at now. Returns how many were.
+    def resolve_missing(self, assignment, present, now):
+        resolved = 0
+        for key, entry in list(self.errors.items()):
+            if entry["assignment"] == assignment and entry["resolved"] is None and key not in present:
+                self.errors[key] = dict(entry, resolved=now)
+                self.pending.append(self.errors[key])
+                resolved += 1
+        return resolved
+
+    # The open errors of an assignment
+    def open_errors(self, assignment):
+        return [e for e in self.errors.values() if e["assignment"] == assignment and e["resolved"] is None]
+
+    # Appends the changes since loading to the ledger file (compacting it, if it's mostly out of date).
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self.lines + len(self.pending) > max(COMPACT_MIN_LINES, COMPACT_RATIO * len(self.errors)):
+            self.compact()
+            return
+        with open(self.path, 'a') as f:
+            for entry in self.pending:
+                f.write(json.dumps(entry) + "\n")
+        self.lines += len(self.pending)
+        self.pending = []
+
+    # Rewrites the ledger with one line per error (atomically, so a crash leaves the old one).
+    def compact(self):
+        tmp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            for entry in self.errors.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+        self.lines = len(self.errors)
+        self.pending = []
+
+    # Brings the ledger up to date with an assignment's current errors, given as a DataFrame with the columns of
+    # grading_errors.csv (whose "First seen" is ignored) and the question submission ID of each error.
+    # :: Prints how many errors are new and resolved since the last run, saves the ledger, and returns the
+    # :: assignment's open errors as a DataFrame to export, with when each was first seen.
+    def sync(self, assignment, df_errs, qids):
+        now = str(datetime.datetime.now())
+        before = len(self.open_errors(assignment))
+        present = set()
+        new = 0
+        for (issue, grader, comments, question, url), qid in zip(df_errs[["Issue", "Grader", "Comments", "Question", "URL"]].itertuples(index=False), qids):
+            entry = self.upsert(assignment, plain(issue), plain(qid), plain(grader), plain(comments), plain(question), plain(url), now)
+            new += entry["first_seen"] == now and entry["key"] not in present
+            present.add(entry["key"])
+        resolved = self.resolve_missing(assignment, present, now)
+        self.save()
+        print("Grading errors: {} new and {} resolved since the last run ({} open, {} before).".format(new, resolved, len(present), before))
+
+        errors = self.open_errors(assignment)
+        df = pd.DataFrame({ "First seen": [e["first_seen"] for e in errors], "Issue": [e["issue"] for e in errors],
+                            "Grader": [e["grader"] for e in errors], "Comments": [e["comments"] for e in errors],
+                            "Question": [e["question"] for e in errors], "URL": [e["url"] for e in errors] }, columns=EXPORT_COLUMNS)
+        return df.sort_values(["First seen", "Issue", "Grader", "Question"], kind='stable')
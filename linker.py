@@ -0,0 +1,93 @@
+from lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Links a group assignment's submissions to its members' submissions of a paired individual assignment.
+# :: GS exports one row per question, and a group submission shows up once per member (each with the member's own SID),
+# :: so groups are bucketed by assignment submission ID (aid), and both sides are collapsed to one row per student:
+# :: their SID, or their email if GS has no SID for them (-1). Members are then joined to individual submissions by
+# :: student. Both sides are indexed once (aid -> members, student -> individual submission), so linking is a single pass.
+class SubmissionLinker:
+    def __init__(self, group_grades, indiv_grades):
+        self.group_grades = group_grades
+        self.indiv_grades = indiv_grades
+
+        # aid -> members. Each member is counted once per group, in order of appearance.
+        aids, group_students = group_grades.column('aid'), student_keys(group_grades)
+        self.member_rows = np.flatnonzero(~pd.MultiIndex.from_arrays([aids, group_students]).duplicated())
+        self.group_codes, self.aids = pd.factorize(aids[self.member_rows])
+        self.member_students = group_students[self.member_rows]
+
+        # Student -> individual submission (their first row). Students with more than one submission (different aids)
+        # are linked to the first, and listed in dup_students (by SID, or email if they have none).
+        indiv_students = pd.Series(student_keys(indiv_grades))
+        self.indiv_positions = np.flatnonzero(~indiv_students.duplicated())
+        self.indiv_index = pd.Index(indiv_students.to_numpy()[self.indiv_positions])
+        num_aids = pd.Series(indiv_grades.column('aid')).groupby(indiv_students, sort=False).nunique()
+        dups = indiv_students.isin(num_aids.index[num_aids > 1]).to_numpy()
+        firsts = self.indiv_positions[dups[self.indiv_positions]]
+        self.dup_students = [sid if sid != -1 else email for sid, email in \
+                             zip(indiv_grades.column('sid')[firsts].tolist(), indiv_grades.column('email')[firsts])]
+
+    # The row (in indiv_grades) of each student's individual submission, or -1 if they have none.
+    # :: Students are as from student_keys.
+    def indiv_rows(self, students):
+        pos = self.indiv_index.get_indexer(students) # -1 where missing, which picks the appended -1
+        return np.append(self.indiv_positions, -1)[pos]
+
+    # One row per group member, with their group and individual submissions side by side.
+    # :: Students submitting individually but not part of any group are appended at the end (with no 'aid').
+    def members(self):
+        order = np.argsort(self.group_codes, kind='stable')
+        rows = self.member_rows[order]
+        group, indiv = self.group_grades, self.indiv_grades
+        indiv_rows = self.indiv_rows(self.member_students[order])
+        codes = np.sort(self.group_codes)
+        df = pd.DataFrame({ "aid": group.column('aid')[rows],
+                            "member": np.arange(len(rows)) - np.searchsorted(codes, codes),
+                            "name": group.column('name')[rows],
+                            "email": group.column('email')[rows],
+                            "sid": group.column('sid')[rows],
+                            "group_row": rows,
+                            "group_qid": group.column('qid')[rows],
+                            "indiv_row": indiv_rows,
+                            "indiv_qid": np.append(indiv.column('qid'), None)[indiv_rows] })
+
+        # Individual submissions from students in no group
+        alone = self.indiv_positions[~self.indiv_index.isin(self.member_students)]
+        df_alone = pd.DataFrame({ "aid": None,
+                                  "member": 0,
+                                  "name": indiv.column('name')[alone],
+                                  "email": indiv.column('email')[alone],
+                                  "sid": indiv.column('sid')[alone],
+                                  "group_row": -1,
+                                  "group_qid": None,
+                                  "indiv_row": alone,
+                                  "indiv_qid": indiv.column('qid')[alone] })
+        return pd.concat([df, df_alone], ignore_index=True) if len(df_alone) > 0 else df
+
+    # One row per group: the group's submission, then each member and their individual submission.
+    # :: Groups can be any size. Columns are named "Member 1", "Member 1 Submission", "Member 2", ... up to the largest group
+    # :: (but at least min_members), where missing members are "N/A" and missing submissions are "No submission".
+    # :: Takes: functions mapping a group qid / individual qid to what should go in the submission columns (e.g., a grading URL).
+    def linked_table(self, group_submission=str, indiv_submission=str, min_members=2):
+        members = self.members()
+        members = members[members['aid'].notna()]
+        num_members = max([min_members, members['member'].max() + 1 if len(members) > 0 else 0])
+
+        df = members.groupby('aid', sort=False).first()[['group_qid']]
+        df.insert(1, "Group Submission", df['group_qid'].map(group_submission))
+        members = members.assign(indiv_submission=members['indiv_qid'].map(indiv_submission, na_action='ignore'))
+        names = members.pivot(index='aid', columns='member', values='name').reindex(index=df.index, columns=range(num_members))
+        subs = members.pivot(index='aid', columns='member', values='indiv_submission').reindex(index=df.index, columns=range(num_members))
+        for m in range(num_members):
+            df["Member {}".format(m+1)] = names[m].fillna("N/A")
+            df["Member {} Submission".format(m+1)] = subs[m].fillna("No submission")
+        df = df.rename(columns={ "group_qid": "Group question #" }).rename_axis("Group submission #").reset_index()
+        return df
+
+# A key for the student of each row: their SID, or their (stripped, lowercased) email if GS has no SID for them (-1)
+def student_keys(grades):
+    sids = pd.Series(grades.column('sid'))
+    emails = pd.Series(grades.column('email'), dtype=object).str.strip().str.lower()
+    return ("sid:" + sids.astype(str)).where(sids != -1, "email:" + emails).to_numpy(dtype=object)
@@ -1,5 +1,5 @@
-import pandas as pd
 import json
+import ingest
 
 # Load config file
 # :: Takes: path to central config JSON that specifies locations of assignments, assignment info, etc.
@@ -55,9 +55,7 @@ class Student:
 # Load Canvas roster. Outputs dict of Student objects indexed by SID.
 def roster(PATH_TO_CANVAS_ROSTER):
     roster = dict()
-    df = pd.read_csv(PATH_TO_CANVAS_ROSTER)
-    df.drop(index=[1, 2, len(df)-1], inplace=True)
-    df.dropna(subset=['SIS User ID'], inplace=True)
+    df = ingest.read_roster(PATH_TO_CANVAS_ROSTER)
     def read_student(row):
         sid = int(row['SIS User ID'])
         email = row['SIS Login ID']+"@cornell.edu"
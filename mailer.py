@@ -0,0 +1,178 @@
+import ssl
+import time
+import queue
+import smtplib
+import threading
+
+# Sends many emails over a small pool of SMTP connections, at a limited rate, retrying what fails.
+# :: Messages are sent by CONNECTIONS worker threads, each with its own SMTP connection, taking messages from one queue.
+# :: Every send first takes a token from a token bucket shared by the workers, so the sending rate stays under RATE
+# :: messages per second on average (with bursts of up to BURST), however many connections there are.
+# :: A transient failure (a dropped connection, a timeout, a 4xx reply) closes the worker's connection; it reconnects
+# :: with exponential backoff and retries the message, up to MAX_RETRIES times. Permanent failures (5xx replies,
+# :: e.g., a refused recipient) aren't retried. A failed login stops all workers, as it'd fail for every message.
+
+# Default server (GMail, over SSL)
+SMTP_SERVER = "smtp.gmail.com"
+SMTP_PORT = 465
+USE_SSL = True
+# How many connections (and messages in flight) at once
+CONNECTIONS = 3
+# Average messages per second across all connections, and how many can be sent at once after a pause
+RATE = 0.5
+BURST = 3
+# Retries per message, and the backoff before the first retry / reconnect (doubled each time, up to MAX_BACKOFF), in seconds
+MAX_RETRIES = 4
+BACKOFF = 2
+MAX_BACKOFF = 60
+# Seconds to wait on the server before a connection counts as dropped
+TIMEOUT = 30
+
+# Token bucket rate limiter, safe to share between threads
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Blocks until a token is available, and takes it
+    def take(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Whether an error sending a message might go away if retried
+def is_transient(e):
+    if isinstance(e, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return all(code < 500 for code, _ in e.recipients.values())
+    if isinstance(e, smtplib.SMTPResponseException):
+        return e.smtp_code < 500
+    return isinstance(e, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError))
+
+class Mailer:
+    def __init__(self, server=SMTP_SERVER, port=SMTP_PORT, use_ssl=USE_SSL, username=None, password=None,
+                 connections=CONNECTIONS, rate=RATE, burst=BURST, max_retries=MAX_RETRIES, backoff=BACKOFF):
+        self.server = server
+        self.port = port
+        self.use_ssl = use_ssl
+        self.username = username # (no login if None)
+        self.password = password
+        self.connections = connections
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stop = threading.Event() # set on a failed login
+        self.lock = threading.Lock() # (for the callbacks, and results)
+
+    # Opens a logged-in connection
+    def connect(self):
+        if self.use_ssl:
+            conn = smtplib.SMTP_SSL(self.server, self.port, context=ssl.create_default_context(), timeout=TIMEOUT)
+        else:
+            conn = smtplib.SMTP(self.server, self.port, timeout=TIMEOUT)
+        try:
+            if self.username is not None:
+                conn.login(self.username, self.password)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    # Sends every message (a list of (receiver email, message) pairs) from sender.
+    # :: on_sending(receiver, message) is called before a message is first sent, and on_sent(receiver, message) after it
+    # :: was, e.g., to journal progress (each from one thread at a time).
+    # :: Returns (receivers sent to, list of (receiver, error) for those that failed).
+    def send_all(self, sender, messages, on_sending=None, on_sent=None):
+        todo = queue.Queue()
+        for receiver, message in messages:
+            todo.put((receiver, message))
+        sent, failed = [], []
+
+        def worker():
+            conn = None
+            while not self.stop.is_set():
+                try:
+                    receiver, message = todo.get_nowait()
+                except queue.Empty:
+                    break
+                if on_sending is not None:
+                    with self.lock:
+                        on_sending(receiver, message)
+                conn, error = self.send(conn, sender, receiver, message)
+                with self.lock:
+                    if error is None:
+                        sent.append(receiver)
+                        if on_sent is not None:
+                            on_sent(receiver, message)
+                    else:
+                        failed.append((receiver, error))
+            if conn is not None:
+                try:
+                    conn.quit()
+                except Exception:
+                    pass
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(self.connections, todo.qsize())))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Messages left unsent after a failed login
+        while not todo.empty():
+            receiver, _ = todo.get_nowait()
+            failed.append((receiver, "not sent (stopped)"))
+        return sent, failed
+
+    # Sends one message on conn (connecting first, if it's None), retrying transient failures.
+    # :: Returns (the connection to use next, None if sent or the last error).
+    def send(self, conn, sender, receiver, message):
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                if conn is None:
+                    conn = self.connect()
+                self.bucket.take()
+                conn.sendmail(sender, receiver, message)
+                return conn, None
+            except Exception as e:
+                if isinstance(e, smtplib.SMTPAuthenticationError):
+                    print("Login failed: {}. Stopping.".format(e))
+                    self.stop.set()
+                    return None, e
+                if not is_transient(e) or attempt == self.max_retries:
+                    print("Failed to send to {}: {}".format(receiver, e))
+                    return conn, e
+                print("Error sending to {} ({}). Reconnecting and retrying in {} seconds...".format(receiver, e, delay))
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                    conn = None
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF)
+
+# A Mailer for the server set under "smtp" in config.json ({ "server", "port", "ssl", "login" }; GMail by default),
+# asking for the sender's address (and password). Returns (mailer, sender address).
+# :: E.g., to try sending against a local stand-in (python -m aiosmtpd -n -l localhost:8025):
+# :: "smtp": { "server": "localhost", "port": 8025, "ssl": false, "login": false }
+def from_config(config):
+    from getpass import getpass
+    smtp = config.get("smtp", {})
+    print("Opening email port...\n(If you're using GMail, please ensure 'Less secure app access' is ON in GMail settings: https://support.google.com/accounts/answer/6010255?hl=en )")
+    sender_email = input("Type your gmail address: ") # Enter your address
+    password = getpass("Type your password and press enter: ") if smtp.get("login", True) else None
+    return Mailer(smtp.get("server", SMTP_SERVER), smtp.get("port", SMTP_PORT), use_ssl=smtp.get("ssl", USE_SSL),
+                  username=sender_email if password is not None else None, password=password), sender_email
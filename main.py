@@ -1,6 +1,12 @@
 # Nice command-line interface for accessing common scripts
+# :: Grading operations run in the grading daemon (see daemon.py), which keeps grades in memory between operations,
+# :: so repeated operations during a grading session don't each re-import pandas and re-read every CSV.
 import subprocess
-import load
+import daemon
+
+# Set to False to always run the scripts in a new process instead of the daemon
+USE_DAEMON = True
+
 OPS = ["analyze_grades", "download_grades", "calc_slips", "email_slips", "mark_reading_not_selected", "open_config", "download_then_analyze"]
 
 # Safely ask for an operation from a constrained list 'ops'.
@@ -16,18 +22,24 @@ def input_op(ops, prompt, error_msg):
             op = None
     return op
 
+# Runs a grading operation in the daemon, or (if it can't) runs its script in a new process.
+def run_op(op, script, args=[]):
+    if USE_DAEMON and daemon.run(op, args) is not None:
+        return
+    subprocess.call(" ".join(["python", script] + args), shell=True)
+
 op = input_op(OPS, "Which operation do you wish to perform?", "Sorry, I don't recognize that input. Try again.")
 
 if op == "analyze_grades":
-    subprocess.call("python grades.py", shell=True)
+    run_op("analyze_grades", "grades.py")
 elif op == "download_grades":
     subprocess.call("python scrapers/watch_grading_sheets.py", shell=True)
 elif op == "calc_slips":
-    subprocess.call("python slip_days.py", shell=True)
+    run_op("calc_slips", "slip_days.py")
 elif op == "email_slips":
     yn = input("Do you want to recalculate slip days first? (y/n): ")
     if yn == "y":
-        subprocess.call("python slip_days.py", shell=True)
+        run_op("calc_slips", "slip_days.py")
     print("\n=== BEGIN EMAIL SLIP DAYS SCRIPT ===")
     subprocess.call("python email_slip_days.py", shell=True)
 elif op == "mark_reading_not_selected":
@@ -37,7 +49,8 @@ elif op == "open_config":
     subprocess.call("open config.json", shell=True)
 elif op == "download_then_analyze":
     # Download a particular assignment then analyze it:
+    import load
     assn_name, _ = load.promptSelectAssignment()
     subprocess.call("python scrapers/watch_grading_sheets.py {} --once".format(assn_name), shell=True)
     print("\n=== BEGIN GRADE ANALYZE SCRIPT ===")
-    subprocess.call("python grades.py {}".format(assn_name), shell=True)
+    run_op("analyze_grades", "grades.py", [assn_name])
@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import hashlib
+import datetime
+import threading
+
+# Durable outbox for emails: messages are spooled to disk before any are sent, and every send is journaled,
+# so a run that crashes (or is stopped) can be resumed without emailing anyone twice.
+# :: Messages are spooled in batches (e.g., one week's slip day emails): a message is only ever sent once per batch,
+# :: but the same message can be sent again in a later batch (see new_batch).
+# :: The spool is a Maildir: each message is written to tmp/, fsync'd, then renamed into new/ (so new/ only ever has
+# :: whole messages), and moved to cur/ once sent. Each file is named by its key, a hash of its batch, receiver and content.
+# :: The journal is an append-only file of JSON lines, fsync'd after each: "sending" right before a message is handed to
+# :: the server, and "sent" (or "failed") after. A resumed run skips every key journaled as sent, and holds back
+# :: "uncertain" ones, which were being sent when the run died (they may or may not have gone out), until you
+# :: choose to resend them (python outbox.py retry-uncertain).
+# :: Messages carry a Message-ID made from their key, so mail clients can also tell a resent message is a duplicate.
+# :: Usage: python outbox.py status | drain | retry-uncertain | clear
+
+# Where the outbox is kept, relative to the course directory
+OUTBOX_PATH = ".outbox"
+
+# Key of a message in a batch: a hash of the batch, its receiver and content
+def message_key(receiver, message, batch=""):
+    return hashlib.sha256(json.dumps([batch, receiver, message]).encode('utf-8')).hexdigest()[:32]
+
+# Writes data to path (atomically, via a temporary file in the same folder), and fsyncs it
+def write_durably(tmp_path, path, data):
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, path)
+
+# fsyncs a folder, so renames into it survive a crash
+def sync_dir(path):
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+class Outbox:
+    def __init__(self, path=OUTBOX_PATH):
+        self.path = path
+        for d in ["tmp", "new", "cur"]:
+            os.makedirs(os.path.join(path, d), exist_ok=True)
+        self.batch_path = os.path.join(path, "batch")
+        if os.path.exists(self.batch_path):
+            with open(self.batch_path) as f:
+                self.batch = f.read().strip()
+        else:
+            self.new_batch()
+        self.journal_path = os.path.join(path, "journal.jsonl")
+        self.states = dict() # key -> last journaled state ("sending", "sent", "failed" or "retry")
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue # a line cut short by a crash
+                    self.states[entry["key"]] = entry["state"]
+        self.journal = open(self.journal_path, 'a')
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.journal.close()
+
+    # Starts a new batch, so messages sent in earlier batches can be sent again. Returns its ID.
+    # :: (Start one only when nothing is pending, e.g., before spooling a new run's messages; see email_slip_days.py.)
+    def new_batch(self):
+        self.batch = "{}-{}".format(datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f"), os.getpid())
+        write_durably(os.path.join(self.path, "tmp", "batch.{}".format(os.getpid())), self.batch_path, self.batch)
+        return self.batch
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # Appends a state change to the journal, and fsyncs it
+    def record(self, key, state, receiver=None):
+        with self.lock:
+            self.journal.write(json.dumps({ "key": key, "state": state, "to": receiver, "batch": self.batch, "at": str(datetime.datetime.now()) }) + "\n")
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+            self.states[key] = state
+
+    # Spools a message to receiver (unless the same message was already spooled or sent in this batch). Returns its key.
+    def add(self, receiver, message):
+        key = message_key(receiver, message, self.batch)
+        path = os.path.join(self.path, "new", key)
+        if key in self.states or os.path.exists(path) or os.path.exists(os.path.join(self.path, "cur", key)):
+            return key
+        data = "To: {}\nMessage-ID: <{}@outbox>\n{}".format(receiver, key, message)
+        write_durably(os.path.join(self.path, "tmp", "{}.{}".format(key, os.getpid())), path, data)
+        return key
+
+    # Spools many messages (a list of (receiver, message) pairs), syncing the spool once at the end. Returns their keys.
+    def add_all(self, messages):
+        keys = [self.add(receiver, message) for receiver, message in messages]
+        sync_dir(os.path.join(self.path, "new"))
+        return keys
+
+    # The spooled messages still to send, as a list of (key, receiver, message), in the order they were spooled.
+    # :: Leaves out sent and uncertain messages.
+    def pending(self):
+        new_dir = os.path.join(self.path, "new")
+        entries = sorted(os.scandir(new_dir), key=lambda e: (e.stat().st_mtime_ns, e.name))
+        messages = []
+        for entry in entries:
+            state = self.states.get(entry.name)
+            if state == "sent":
+                self.archive(entry.name) # (sent, but the run died before moving it)
+                continue
+            if state == "sending":
+                continue # uncertain
+            with open(entry.path) as f:
+                data = f.read()
+            receiver = data.split("\n", 1)[0][len("To: "):]
+            messages.append((entry.name, receiver, data))
+        return messages
+
+    # Keys of messages that were being sent when a run died (they may or may not have been sent)
+    def uncertain(self):
+        return [key for key, state in self.states.items() if state == "sending"]
+
+    # Lets uncertain messages be sent again. Returns how many there were.
+    def retry_uncertain(self):
+        keys = self.uncertain()
+        for key in keys:
+            self.record(key, "retry")
+        return len(keys)
+
+    # Moves a sent message from new/ to cur/
+    def archive(self, key):
+        try:
+            os.rename(os.path.join(self.path, "new", key), os.path.join(self.path, "cur", key))
+        except FileNotFoundError:
+            pass
+
+    # Sends every pending message with a mailer.Mailer, journaling each. Returns (receivers sent to, list of (receiver, error)).
+    # :: Messages the server refused are journaled as failed (so they're pending again next time).
+    def drain(self, mail, sender):
+        pending = self.pending()
+        keys = { data: key for key, _, data in pending }
+        in_flight = set()
+        def on_sending(receiver, data):
+            self.record(keys[data], "sending", receiver)
+            in_flight.add(keys[data])
+        def on_sent(receiver, data):
+            self.record(keys[data], "sent", receiver)
+            self.archive(keys[data])
+            in_flight.discard(keys[data])
+        sent, failed = mail.send_all(sender, [(receiver, data) for _, receiver, data in pending], on_sending=on_sending, on_sent=on_sent)
+        for key in in_flight:
+            self.record(key, "failed")
+        return sent, failed
+
+    # Prints how many messages are pending, sent and uncertain
+    def status(self):
+        pending, uncertain = self.pending(), self.uncertain()
+        sent = sum(1 for state in self.states.values() if state == "sent")
+        print("Outbox {} (batch {}): {} pending, {} sent, {} uncertain".format(self.path, self.batch, len(pending), sent, len(uncertain)))
+        for key in uncertain:
+            print(" - uncertain:", key)
+        return len(pending), len(uncertain)
+
+    # Removes every spooled message and the journal (e.g., to start over with new messages)
+    def clear(self):
+        import shutil
+        self.close()
+        shutil.rmtree(self.path)
+        self.__init__(self.path)
+
+# Prints any uncertain messages, and how to resend them
+def warn_uncertain(box):
+    uncertain = box.uncertain()
+    if len(uncertain) > 0:
+        print("Warning: {} message(s) were being sent when a previous run stopped, so they may or may not have been sent. "
+              "They won't be resent unless you run: python outbox.py retry-uncertain".format(len(uncertain)))
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "status"
+    with Outbox() as box:
+        if cmd == "status":
+            box.status()
+        elif cmd == "drain":
+            import load, mailer
+            warn_uncertain(box)
+            mail, sender = mailer.from_config(load.config())
+            sent, failed = box.drain(mail, sender)
+            print("Sent {} email(s); {} failed.".format(len(sent), len(failed)))
+        elif cmd == "retry-uncertain":
+            print("{} uncertain message(s) will be sent on the next drain.".format(box.retry_uncertain()))
+        elif cmd == "clear":
+            box.clear()
+            print("Cleared", box.path)
+        else:
+            print("Usage: python outbox.py status | drain | retry-uncertain | clear")
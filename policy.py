@@ -0,0 +1,143 @@
+from fnmatch import fnmatch
+from lazy import lazy_import
+np = lazy_import("numpy")
+
+# Final grade policies, declared as JSON (under "finalGradePolicy" in config.json) and evaluated
+# over a whole roster at once, as a (students x assignments) matrix of scores.
+#
+# A policy looks like:
+#   "categories": {                       Categories, weighted and summed in this order.
+#     "dw": {
+#       "weight": 40,                     Points of the final grade this category is worth.
+#       "assignments": ["dw1", "dw2"],    Assignment names (or patterns, like "quiz-*").
+#       "combine": "total",               "total": points earned / points possible, or
+#                                         "mean": the mean of each assignment's percentage.
+#       "dropIfZero": ["dw2"],            (Optional) Assignments left out of the category when a student scored 0 on them.
+#       "dropLowest": 0,                  (Optional) How many of each student's lowest assignment percentages to leave out.
+#       "alternatives": [{"dw1": 0.6}],   (Optional) Other weightings of assignments (scaling both points earned and possible).
+#                                         Each student gets whichever weighting (including the regular one) is best for them.
+#       "optional": false                 (Optional) If true, students with a 0 in this category are graded out of the
+#     }, ...                              remaining categories' weights (e.g., for an exam not everyone took).
+#   },
+#   "sumAssignments": {"mp3": ["mp3_indiv", "mp3_group"]},   (Optional) Assignments graded as the sum of others.
+#   "maxScores": {"mp3": 100, "quiz-*": 1},                  (Optional) Max scores of assignments without a rubric.
+#   "slipPenalty": 0.5,                   Points docked from the final grade per slip day used beyond those allowed.
+#   "letterGrades": {"93.5": "A", ...}    Lowest final grade for each letter.
+
+# Assignments (columns) of names matching the given names or patterns, in the order of the patterns.
+def match_assignments(patterns, names):
+    cols = []
+    for p in patterns:
+        cols.extend(i for i, name in enumerate(names) if fnmatch(name, p) and i not in cols)
+    return cols
+
+# Value in a dict keyed by assignment names or patterns, for the given assignment name
+def lookup(d, name, default=None):
+    if name in d:
+        return d[name]
+    return next((v for p, v in d.items() if fnmatch(name, p)), default)
+
+class GradePolicy:
+    def __init__(self, policy):
+        self.categories = policy["categories"]
+        self.sum_assignments = policy.get("sumAssignments", dict())
+        self.max_scores = policy.get("maxScores", dict())
+        self.slip_penalty = policy.get("slipPenalty", 0)
+        # (Kept as lists, so that loading a policy doesn't load numpy)
+        cutoffs = sorted((float(c), letter) for c, letter in policy.get("letterGrades", dict()).items())
+        self.cutoffs = [c for c, _ in cutoffs]
+        self.letters = [None] + [letter for _, letter in cutoffs]
+
+    @classmethod
+    def from_config(cls, config):
+        if "finalGradePolicy" not in config:
+            raise KeyError("No finalGradePolicy in config.")
+        return cls(config["finalGradePolicy"])
+
+    # Adds the columns of assignments graded as the sum of others (see "sumAssignments").
+    # :: Returns the new (names, scores, max_scores).
+    def add_sums(self, names, scores, max_scores):
+        names, max_scores = list(names), dict(max_scores)
+        cols = []
+        for name, parts in self.sum_assignments.items():
+            parts = [p for p in parts if p in names]
+            cols.append(scores[:, [names.index(p) for p in parts]].sum(axis=1))
+            if name not in max_scores:
+                max_scores[name] = lookup(self.max_scores, name, sum(max_scores[p] for p in parts))
+            names.append(name)
+        if len(cols) > 0:
+            scores = np.column_stack([scores] + cols)
+        return names, scores, max_scores
+
+    # Grades one category.
+    # :: Returns the category's assignments, each student's percentage (0-1) on each of them,
+    # :: a mask of the assignments left out for each student, and each student's percentage for the category.
+    def grade_category(self, category, names, scores, max_scores):
+        cols = match_assignments(category["assignments"], names)
+        if len(cols) == 0:
+            return [], np.zeros((len(scores), 0)), np.zeros((len(scores), 0), dtype=bool), np.zeros(len(scores))
+        points = scores[:, cols]
+        possible = np.array([max_scores[names[c]] for c in cols], dtype=np.float64)
+        percents = points / possible
+
+        # Leave out assignments that are dropped
+        dropped = np.zeros(points.shape, dtype=bool)
+        drop_if_zero = [j for j, c in enumerate(cols) if names[c] in category.get("dropIfZero", [])]
+        dropped[:, drop_if_zero] = points[:, drop_if_zero] <= 0
+        num_lowest = category.get("dropLowest", 0)
+        if num_lowest > 0:
+            ranked = np.argsort(np.where(dropped, np.inf, percents), axis=1, kind='stable')[:, :num_lowest]
+            np.put_along_axis(dropped, ranked, True, axis=1)
+        kept = ~dropped
+
+        # Try each weighting, and take the best for each student
+        scales = [np.ones(len(cols))]
+        for alt in category.get("alternatives", []):
+            scales.append(np.array([alt.get(names[c], 1.0) for c in cols], dtype=np.float64))
+        results = []
+        for scale in scales:
+            if category.get("combine", "total") == "mean":
+                earned, out_of = (percents * scale * kept).sum(axis=1), (scale * kept).sum(axis=1)
+            else:
+                earned, out_of = (points * scale * kept).sum(axis=1), (possible * scale * kept).sum(axis=1)
+            results.append(np.divide(earned, out_of, out=np.zeros(len(scores)), where=out_of > 0))
+        return [names[c] for c in cols], percents, dropped, np.max(results, axis=0)
+
+    # Grades a roster.
+    # :: Takes: names of the assignments (columns of scores), a (students x assignments) matrix of scores,
+    # :: a dict of max scores for (at least) the graded assignments, and (optionally) each student's slip days remaining.
+    # :: Returns a dict with, for each category, its assignments, the (students x assignments) percentages (0-1) and
+    # :: dropped assignments, and the category percentages (0-1); then the slip penalty, final grade (0-100)
+    # :: and letter grade, each as an array with one entry per student.
+    def grade(self, names, scores, max_scores, slips_remaining=None):
+        scores = np.asarray(scores, dtype=np.float64).reshape(-1, len(names))
+        max_scores = dict(max_scores)
+        for name in names:
+            if name not in max_scores and lookup(self.max_scores, name) is not None:
+                max_scores[name] = lookup(self.max_scores, name)
+        names, scores, max_scores = self.add_sums(names, scores, max_scores)
+
+        assignments, scores_perc, dropped, percents = dict(), dict(), dict(), dict()
+        weighted = np.zeros(len(scores))
+        weights = np.zeros(len(scores))
+        total_weight = 0
+        for cname, category in self.categories.items():
+            assignments[cname], scores_perc[cname], dropped[cname], percents[cname] = self.grade_category(category, names, scores, max_scores)
+            weight = category["weight"]
+            weighted += weight * percents[cname]
+            total_weight += weight
+            if category.get("optional", False):
+                weights += np.where(percents[cname] == 0, 0, weight)
+            else:
+                weights += weight
+
+        # Slip days beyond those allowed are docked from the final grade
+        penalty = np.zeros(len(scores))
+        if slips_remaining is not None:
+            penalty = self.slip_penalty * np.maximum(0, -np.asarray(slips_remaining, dtype=np.float64))
+
+        # Students missing an optional category are graded out of the rest
+        final = np.where(weights == total_weight, weighted, weighted / np.maximum(weights, 1e-12) * total_weight) - penalty
+        letters = np.array(self.letters, dtype=object)[np.searchsorted(self.cutoffs, final, side='right')]
+        return { "assignments": assignments, "scores": scores_perc, "dropped": dropped, "percents": percents,
+                 "penalty": penalty, "final": final, "letters": letters }
@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+import datetime
+import tracemalloc
+
+# Per-stage profiling for the grading scripts (see --profile in grades.py, slip_days.py and final_grades.py).
+# :: Wrap a stage in `with profiling.stage("name", question=...) as s:` and (optionally) set s.rows to the rows it processed.
+# :: Records wall time, CPU time, rows and peak traced memory (above what was allocated when the stage began) per stage.
+# :: Stages can nest; their names are joined into a path like "load_grades/load_gradesheet/read_csv".
+# :: When profiling isn't enabled, stage() hands back a shared do-nothing object, so instrumented code costs (next to) nothing.
+
+# Where profiles are saved
+PROFILE_PATH = "profile.json"
+# Max number of lines in the printed summary
+SUMMARY_LINES = 30
+
+ENABLED = False
+records = [] # finished stages, in order of completion
+stack = [] # stages in progress, outermost first
+paths = [] # every stage path, in the order they first began
+
+# Does nothing; returned by stage() when profiling is off.
+class NullStage:
+    rows = None
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def __setattr__(self, name, value):
+        pass
+NULL_STAGE = NullStage()
+
+class Stage:
+    def __init__(self, name, info):
+        self.name = name
+        self.info = info
+        self.rows = None
+
+    def __enter__(self):
+        if len(stack) > 0: # the outer stage's peak so far, before resetting it for this one
+            stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        self.start_mem = tracemalloc.get_traced_memory()[0]
+        self.peak = 0
+        if hasattr(tracemalloc, 'reset_peak'): # (Python 3.9+; otherwise peaks are since tracing began)
+            tracemalloc.reset_peak()
+        self.path = "/".join([s.name for s in stack] + [self.name])
+        if self.path not in paths:
+            paths.append(self.path)
+        stack.append(self)
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        stack.pop()
+        if len(stack) > 0:
+            stack[-1].peak = max(stack[-1].peak, self.peak)
+        records.append({ "stage": self.path, "info": self.info, "wall": wall, "cpu": cpu, "rows": self.rows,
+                         "peak_bytes": max(0, self.peak - self.start_mem) })
+        return False
+
+# Starts profiling (and memory tracing).
+def enable():
+    global ENABLED
+    ENABLED = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+# A context manager profiling the code it wraps as a stage called name. Keyword args (e.g., question=...) are saved with it.
+def stage(name, **info):
+    if not ENABLED:
+        return NULL_STAGE
+    return Stage(name, info)
+
+# Totals records by stage path (across e.g. questions), in the order each stage path first began.
+def totals():
+    by_path = { path: { "stage": path, "calls": 0, "wall": 0, "cpu": 0, "rows": None, "peak_bytes": 0 } for path in paths }
+    for r in records:
+        t = by_path[r["stage"]]
+        t["calls"] += 1
+        t["wall"] += r["wall"]
+        t["cpu"] += r["cpu"]
+        t["peak_bytes"] = max(t["peak_bytes"], r["peak_bytes"])
+        if r["rows"] is not None:
+            t["rows"] = (t["rows"] or 0) + r["rows"]
+    return [t for t in by_path.values() if t["calls"] > 0]
+
+# Prints a one-screen summary of the profile.
+def summary():
+    ts = totals()
+    print("\n== Profile ==")
+    print("{:<44s}{:>7s}{:>10s}{:>10s}{:>10s}{:>11s}".format("Stage", "Calls", "Wall (s)", "CPU (s)", "Rows", "Peak (MB)"))
+    for t in ts[:SUMMARY_LINES]:
+        depth = t["stage"].count("/")
+        name = "  " * depth + t["stage"].split("/")[-1]
+        print("{:<44s}{:>7d}{:>10.3f}{:>10.3f}{:>10s}{:>11.1f}".format(name[:44], t["calls"], t["wall"], t["cpu"], \
+              "" if t["rows"] is None else str(t["rows"]), t["peak_bytes"] / 1e6))
+    if len(ts) > SUMMARY_LINES:
+        print("... and {} more stages (see {})".format(len(ts) - SUMMARY_LINES, PROFILE_PATH))
+
+# Saves the profile (every stage, plus totals) as JSON.
+def save(path=PROFILE_PATH):
+    with open(path, 'w') as f:
+        json.dump({ "command": sys.argv, "cwd": os.getcwd(), "saved": str(datetime.datetime.now()),
+                    "stages": records, "totals": totals() }, f, indent=4, default=str)
+    print("Saved profile to", path)
+
+# Saves and prints the profile, if profiling is on.
+def finish(path=PROFILE_PATH):
+    if not ENABLED: return
+    save(path)
+    summary()
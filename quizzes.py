@@ -0,0 +1,80 @@
+import os
+import json
+import ingest
+from lazy import lazy_import
+pd = lazy_import("pandas")
+
+# Quiz completion scores from Canvas quiz exports ("Student Analysis"), one csv per quiz, named [Month#]-[Day#].csv
+# after the day it was due. A student's first attempt scores 1 if it was submitted by the quiz's deadline, and 0.5 if late.
+# :: Deadlines come from a calendar (under "quizCalendar" in config.json; see QUIZ_CALENDAR for the format):
+# :: each quiz is due on its day at "dueTime", in "timezone" (so daylight saving is accounted for), plus "graceMinutes",
+# :: unless "deadlines" gives it a different one (a local date and time, e.g., "2021-03-25 23:59").
+# :: Each file is scored in one pass: submission times are parsed all at once, first attempts are picked per student
+# :: with a groupby, and dropped or exempt students are left out with set lookups.
+
+# The calendar used when config.json has no "quizCalendar" (Spring '21's)
+QUIZ_CALENDAR = {
+    "year": 2021,
+    "timezone": "America/New_York",
+    "dueTime": "12:20",
+    "graceMinutes": 1,
+    "deadlines": { "3-25": "2021-03-25 23:59" }
+}
+
+# Scores of a late quiz, and one on time
+LATE_SCORE = 0.5
+ONTIME_SCORE = 1
+
+# The quiz calendar in a config (or the default)
+def calendar_from_config(config):
+    return config.get("quizCalendar", QUIZ_CALENDAR)
+
+# Reads a JSON file of quiz names (their csv file names) mapped to lists of SIDs exempt from that quiz.
+# :: Returns a dict of quiz name -> set of SIDs (empty if path is None).
+def load_exceptions(path):
+    if not path:
+        return dict()
+    with open(path) as f:
+        return { name: set(sids) for name, sids in json.load(f).items() }
+
+# The deadline (a UTC timestamp) of the quiz with the given name ([Month#]-[Day#])
+def deadline(name, calendar):
+    tz = calendar.get("timezone", QUIZ_CALENDAR["timezone"])
+    if name in calendar.get("deadlines", {}):
+        return pd.Timestamp(calendar["deadlines"][name]).tz_localize(tz).tz_convert("UTC")
+    month, day = name.split('-')
+    due = pd.Timestamp("{}-{:02d}-{:02d} {}".format(calendar["year"], int(month), int(day), calendar.get("dueTime", QUIZ_CALENDAR["dueTime"])))
+    due += pd.Timedelta(minutes=calendar.get("graceMinutes", 0))
+    return due.tz_localize(tz).tz_convert("UTC")
+
+# Scores one quiz export, given its deadline. Returns a Series of SID -> score, in order of first appearance.
+# :: exempt is a set of SIDs to leave out; if sids is given (e.g., the roster), only those students are scored.
+def score_quiz(path, due, exempt=frozenset(), sids=None):
+    df = ingest.read_quiz(path)
+    keep = ~df['sis_id'].isin(exempt)
+    if sids is not None:
+        keep &= df['sis_id'].isin(sids)
+    df = df[keep]
+
+    # Keep only the very *first* attempt (we only care about lateness, not score)
+    first = df.groupby('sis_id', sort=False)['attempt'].idxmin()
+    df = df.loc[first.to_numpy()]
+
+    submitted = pd.to_datetime(df['submitted'], utc=True, errors='coerce')
+    if submitted.isna().any():
+        print("Warning: {} submission time(s) in {} couldn't be read. Counting them as on time.".format(int(submitted.isna().sum()), path))
+    late = (submitted > due).to_numpy()
+    return pd.Series(pd.Series(late).map({ True: LATE_SCORE, False: ONTIME_SCORE }).to_numpy(), index=df['sis_id'].to_numpy())
+
+# Scores every quiz in quiz_dir. Returns a dict of assignment name ('quiz-' + file name) -> Series of SID -> score,
+# in the order the files are listed.
+# :: exceptions is as from load_exceptions; sids, if given, are the students to score (e.g., those still in the class).
+def load_quizzes(quiz_dir, calendar=QUIZ_CALENDAR, exceptions=dict(), sids=None):
+    if sids is not None:
+        sids = set(sids)
+    quizzes = dict()
+    for entry in os.scandir(quiz_dir):
+        if not entry.path.endswith(".csv"): continue
+        name = os.path.splitext(os.path.basename(entry.path))[0]
+        quizzes['quiz-' + name] = score_quiz(entry.path, deadline(name, calendar), exceptions.get(name, frozenset()), sids)
+    return quizzes
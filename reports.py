@@ -0,0 +1,160 @@
+import datetime
+import profiling
+from ledger import ErrorLedger
+from gradetable import GradeTable
+from lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Accumulates what the grades.py command-line reports need from an assignment's grades in one pass over them,
+# then prints and exports every report from the accumulators (see emit).
+# :: The reports: unassigned students (unassigned_to_question.csv), per-question completion rates (and on-time splits),
+# :: all_grades.csv, left_to_grade.csv, grading_errors.csv and missing_questions.csv.
+# :: Grades can be added in parts (e.g., a question at a time). Each part's per-question counts are a bincount over its
+# :: question codes, and the rest of the reports are built from the part's submitted (and unscored) rows,
+# :: so the work grows with the number of grades, not grades x reports x questions.
+# :: A part added under a key replaces the one added before under that key, so a long-lived aggregator (see
+# :: incremental.watch) can swap in just the questions whose grades changed before emitting again.
+class ReportAggregator:
+    def __init__(self, rubric, questions, is_late_submitter, error_persistence=False):
+        self.rubric = rubric
+        self.qkeys = sorted(list(questions.keys()))
+        self.is_late_submitter = is_late_submitter # whether the grades have lateness info (from a scores sheet)
+        self.error_persistence = error_persistence # see ERROR_CHECK_PERSISTENCE in grades.py
+        self.counts = { c: np.zeros(len(self.qkeys), dtype=np.int64) for c in ["submitted", "ungraded", "ontime", "ungraded_ontime"] }
+        self.parts = dict() # key -> (its counts, its unsubmitted grades with a score of 0 (to detect unassigned students), its submitted grades)
+
+    # Adds grades (a GradeTable, as loaded by load_grades with only_submitted=False) to every report.
+    # :: If key is given (e.g., a question name), replaces the grades last added under it.
+    def add(self, grades, key=None):
+        if key is None:
+            key = len(self.parts)
+        submitted, scores = grades.column('was_submitted'), grades.column('total_score')
+        ungraded = (scores == 0) | grades.column('inc_score')
+        codes = pd.Index(self.qkeys).get_indexer(grades.column('question'))
+        known = codes >= 0
+
+        def count(mask):
+            return np.bincount(codes[mask & known], minlength=len(self.qkeys))
+        counts = { "submitted": count(submitted), "ungraded": count(submitted & ungraded) }
+        if self.is_late_submitter:
+            ontime = submitted & (grades.column('late') == 0)
+            counts["ontime"] = count(ontime)
+            counts["ungraded_ontime"] = count(ontime & ungraded)
+
+        if key in self.parts:
+            for c, n in self.parts[key][0].items():
+                self.counts[c] -= n
+        for c, n in counts.items():
+            self.counts[c] += n
+        self.parts[key] = (counts, grades[~submitted & (scores == 0)], grades[submitted]) # (in the replaced part's place)
+
+    # Prints and exports every report. Returns the submitted, completely scored grades (e.g., to plot).
+    def emit(self):
+        parts = list(self.parts.values())
+        unscored, grades = [tables[0] if len(tables) == 1 else GradeTable.concat(tables) for tables in [[p[1] for p in parts], [p[2] for p in parts]]]
+        with profiling.stage("unassigned"):
+            total_unassigned = self.report_unassigned(unscored)
+        with profiling.stage("completion_rates"):
+            if len(self.qkeys) > 1:
+                self.report_completion_rates()
+        return self.export(grades, total_unassigned)
+
+    # Prints and exports students with no question submitted. Returns their rows of left_to_grade.csv.
+    def report_unassigned(self, unscored):
+        total_unassigned = []
+        email_codes, emails = pd.factorize(unscored.column('email'))
+        num_unassigned = np.bincount(email_codes[email_codes >= 0], minlength=len(emails))
+        for code in np.flatnonzero(num_unassigned == len(self.qkeys)):
+            i = np.flatnonzero(email_codes == code)[0]
+            url = unscored.value('url', i).split("#")[0]
+            print("\nUnassigned detected for", unscored.value('email', i), url)
+            total_unassigned.append(["", "*Unassigned*", url])
+        print("Total unassigned: ", len(total_unassigned))
+        df_unassigned = pd.DataFrame(total_unassigned, columns=["Grader", "Question", "URL"])
+        df_unassigned.to_csv("unassigned_to_question.csv", index=False)
+        return total_unassigned
+
+    # Prints the grading progress of each question
+    def report_completion_rates(self):
+        print("\nPer question completion rates (assumes you've included a 'was submitted' rubric item per question and filled this out for all submissions):")
+        for i, q in enumerate(self.qkeys):
+            total_submitted, num_ungraded = self.counts["submitted"][i], self.counts["ungraded"][i]
+            num_graded = total_submitted - num_ungraded
+            if self.is_late_submitter: # if we have late submission information from the Download Grades sheet...
+                total_ontime, num_ungraded_ontime = self.counts["ontime"][i], self.counts["ungraded_ontime"][i]
+                num_graded_ontime = total_ontime - num_ungraded_ontime
+                print(" > {}:\t{} / {} total graded ({:.0f}%),\t{} / {} ontime graded ({:.0f}%)".format(q, num_graded, total_submitted, 100 if total_submitted==0 else 100*num_graded/total_submitted, num_graded_ontime, total_ontime, 100 if total_ontime==0 else 100*num_graded_ontime/total_ontime))
+            else:
+                print(" > {}:\t{} / {} graded ({:.0f}%)".format(q, num_graded, total_submitted, 100 if total_submitted==0 else 100*num_graded/total_submitted))
+
+    # Exports all_grades.csv, left_to_grade.csv, grading_errors.csv and missing_questions.csv from the submitted grades.
+    # :: Returns the completely scored ones.
+    def export(self, grades, total_unassigned):
+        # Group grades by student (in order of appearance)
+        student_codes, sids = pd.factorize(grades.column('sid'))
+        by_student = np.argsort(student_codes, kind='stable')
+
+        # Export all grades, sorted by student and question:
+        export_cols = ["Name", "Email", "Question", "Grader", "Comments", "Adjustment", "Total Score"]
+        item_names = self.rubric['shortnames'].keys()
+        export_cols.extend(item_names)
+        export_cols.extend(["URL", "SID", "Assignment Submission ID", "Question Submission ID"])
+        with profiling.stage("export_all_grades") as s:
+            complete = grades[~grades.column('inc_score')]
+            fields = ["name", "email", "question", "grader", "comments", "adjustment", "total_score"] + complete.items + ["url", "sid", "aid", "qid"]
+            df_grades = pd.DataFrame({ col: complete.export_column(f) for col, f in zip(export_cols, fields) }, columns=export_cols)
+            df_grades = df_grades.sort_values(["Name", "Question"], kind='stable')
+            df_grades.to_csv("all_grades.csv", index=False)
+            s.rows = len(df_grades)
+
+        # Export only what is left to grade (and check for weird graded-but-zero assignments):
+        with profiling.stage("export_left_to_grade") as s:
+            export_cols = ["Grader", "Question", "URL"]
+            left = grades[grades.column('inc_score')]
+            zero = complete[complete.column('total_score') == 0]
+            df_leftgrades = pd.concat([pd.DataFrame({ "Grader": left.column('grader'), "Question": left.column('question'), "URL": left.column('url') }, columns=export_cols),
+                                       pd.DataFrame({ "Grader": zero.column('grader'), "Question": "Warning: Grade is 0 but marked as fully graded.", "URL": zero.column('url') }, columns=export_cols),
+                                       pd.DataFrame(total_unassigned, columns=export_cols)], ignore_index=True)
+            df_leftgrades = df_leftgrades.sort_values("Question", kind='stable')
+            df_leftgrades.to_csv("left_to_grade.csv", index=False)
+            s.rows = len(df_leftgrades)
+
+        # Collect grading errors into a spreadsheet
+        with profiling.stage("export_grading_errors") as s:
+            s.rows = len(grades)
+            errors = grades.column('errors')[by_student]
+            rows = by_student[np.repeat(np.arange(len(by_student)), [len(e) for e in errors])]
+            df_errs = pd.DataFrame({ "First seen": str(datetime.datetime.now()),
+                                     "Issue": [e for errs in errors for e in errs],
+                                     "Grader": grades.column('grader')[rows],
+                                     "Comments": grades.column('comments')[rows],
+                                     "Question": grades.column('question')[rows],
+                                     "URL": grades.column('url')[rows] }, columns=["First seen", "Issue", "Grader", "Comments", "Question", "URL"])
+            df_errs = df_errs.sort_values(["First seen", "Issue", "Grader", "Question"], kind='stable') # sort on time first, then error type, then grader, then question #
+
+            if self.error_persistence:
+                # Keep when each error was first seen (and which were resolved) in the error ledger
+                # :: (The first time, seeding it from the grading_errors.csv we're about to overwrite)
+                df_errs = ErrorLedger(seed_csv="grading_errors.csv").sync(grades.assignment_id, df_errs, grades.column('qid')[rows][df_errs.index.to_numpy()])
+            df_errs.to_csv("grading_errors.csv", index=False)
+
+        # Collect student 'missed questions' into a spreadsheet
+        with profiling.stage("export_missing_questions"):
+            if len(self.qkeys) > 1:
+                if 'expectedQuestionsAnswered' not in self.rubric:
+                    print("Error: Cannot export which students are missing questions. Set expectedQuestionsAnswered in rubric.")
+                else:
+                    # Count each student's answered questions
+                    expected = self.rubric['expectedQuestionsAnswered']
+                    num_answered = np.bincount(student_codes, minlength=len(sids))
+                    _, first = np.unique(student_codes, return_index=True)
+                    missing = np.flatnonzero(num_answered != expected)
+                    df_miss = pd.DataFrame({ "SID": grades.export_column('sid')[first[missing]],
+                                             "Name": grades.column('name')[first[missing]],
+                                             "Email": grades.column('email')[first[missing]],
+                                             "Number Missing": expected - num_answered[missing] },
+                                           columns=["SID", "Name", "Email", "Number Missing"])
+                    df_miss.to_csv("missing_questions.csv", index=False)
+
+        return complete
@@ -7,19 +7,27 @@ import asyncio
 import os
 from pyppeteer import launch
 
-# Ask for which assignment to mark 'not question' for:
 import load
+
+""" Marks the first rubric item ('reading not selected') of every submission whose page is blank (GS' missing page
+    placeholder), for every question of an assignment.
+    Usage: python scrapers/mark_not_question.py [<assn_name>] [--workers=N] [--range=N] [--config=<path>]
+    Questions are worked through in parallel by a pool of N pages (tabs) in one browser (NUM_WORKERS by default).
+    With --range=N, each question's submissions are split into ranges of N (from its submissions list), which the
+    workers visit directly, so a question with hundreds of submissions is spread over every worker too.
+"""
+
 CONFIG_PATH = os.path.join(BASE_PATH, "config.json")
-assn_name, assn_info = load.promptSelectAssignment(load.config(CONFIG_PATH))
-assignmentpage = os.path.join(assn_info["url"], "grade")
+NUM_WORKERS = 4 # how many pages work at once (GS may rate limit you if this is too high)
+RANGE_SIZE = None # if set, split questions into ranges of this many submissions (see --range)
 
 empypage_placeholder = 'https://www.gradescope.com/assets/missing_placeholder-4d611cea193304f8a8455a58fd8082eed1ca4a0ea2082adb982b51a41eaa0c87.png'
 empypage_placeholder2 = 'https://www.gradescope.com/assets/missing_pdf-32be2863a022545146844ce20cd75e9c9698e872d227080a1561ea1d03d4f2ec.png'
 
-async def setup(assignmentpage):
-    browser = await launch({"autoClose":False,'headless': False, 'userDataDir':'./pyppeteer_data'})
+async def setup(browser, url=None):
     page = await browser.newPage()
-    await page.goto(assignmentpage)
+    if url is not None:
+        await page.goto(url)
 
     await page.setViewport({ #  maximize window
       "width": 1400,
@@ -39,6 +47,12 @@ async def get_all_grading_links(elements):
         links.append(link_handle.toString()[9:])
     return links
 
+# Links to the grade page of each submission of a question, from its submissions list
+async def get_submission_links(page, question_link):
+    await page.goto(question_link.rsplit("/grade", 1)[0] + "/submissions")
+    return await page.evaluate('''() => Array.from(document.querySelectorAll('a[href$="/grade"]'), a => a.href)
+                                          .filter(href => href.indexOf('/submissions/') != -1)''')
+
 async def has_placeholder_image(page):
     image = await page.querySelector('img')
     image_src = await image.getProperty('src')
@@ -47,7 +61,7 @@ async def has_placeholder_image(page):
 
 async def advance_page(page):
     btn = await page.querySelector('[title="Shortcut: Right arrow"]') # 'Right arrow' for the "Next" button, 'Z' for "Next Ungraded" (faster)
-    await btn.click()
+    await asyncio.gather(page.waitForNavigation(), btn.click()) # (wait from before the click, so the navigation isn't missed)
 
 async def get_text(page, element):
      return await page.evaluate('(element) => element.textContent', element)
@@ -57,16 +71,24 @@ async def get_link(page, element):
         return element.href;
     }''', element)
 
+# Marks 'reading not selected' (unless it already is). Returns whether it was marked now.
 async def mark_reading_not_selected(page):
     btns = await page.querySelectorAll('.rubricItem--key')
     btn = btns[0]
     if await page.evaluate("(btn) => btn.getAttribute('aria-pressed')", btn) == 'false':
         await btn.click()
+        return True
+    return False
 
+# Marks the current submission, if it's blank. Returns whether it was marked now.
+async def mark_if_blank(page):
+    return await has_placeholder_image(page) and await mark_reading_not_selected(page)
+
+# Goes through a question's submissions from the current one to the last. Returns how many were marked.
 async def go_through_pages(page):
+    marked = 0
     while(1):
-     if await has_placeholder_image(page):
-        await mark_reading_not_selected(page)
+     marked += await mark_if_blank(page)
      current_page = await page.xpath('//*[@id="main-content"]/div/main/section/div/span/span/abbr')
      current_page = current_page[0]
      last_page = await page.xpath('//*[@id="main-content"]/div/main/section/div/strong/a')
@@ -74,21 +96,78 @@ async def go_through_pages(page):
      if await get_text(page, last_page) == await get_text(page, current_page):
          break
      await advance_page(page)
-     await page.waitForNavigation()
+    return marked
+
+# Goes through a question, from its first submission. Returns how many submissions were marked.
+async def do_question(page, link):
+    await page.goto(link)
+    url = page.url # GS redirects the url from /grade to /submissions if all submissions are graded for a specific question
+    if url[-4:] == "ions": # all graded for this question; skip
+       print("Skipping already-graded question", url)
+       return 0
+    return await go_through_pages(page)
+
+# Goes through a range of submissions (a list of links to their grade pages). Returns how many were marked.
+async def do_range(page, links):
+    marked = 0
+    for link in links:
+        await page.goto(link)
+        marked += await mark_if_blank(page)
+    return marked
 
-async def main():
-    page = await setup(assignmentpage)
+# Works through jobs from the queue (each a (description, coroutine function of a page)) on its own page, until it's empty.
+# :: Returns how many submissions it marked.
+async def worker(browser, queue):
+    page = await setup(browser)
+    marked = 0
+    while not queue.empty():
+        what, job = queue.get_nowait()
+        try:
+            n = await job(page)
+            print(" | {}: marked {}".format(what, n))
+            marked += n
+        except Exception as e:
+            print(" | {}: Error: {}".format(what, e))
+    await page.close()
+    return marked
+
+async def main(assn_info, num_workers=NUM_WORKERS, range_size=RANGE_SIZE):
+    browser = await launch({"autoClose":False,'headless': False, 'userDataDir':'./pyppeteer_data'})
+    page = await setup(browser, os.path.join(assn_info["url"], "grade"))
     elements = await get_submissions(page)
     links = await get_all_grading_links(elements)
-    for link in links:
-         await page.goto(link)
-         url = page.url # GS redirects the url from /grade to /submissions if all submissions are graded for a specific question
-         if url[-4:] == "ions": # all graded for this question; skip
-            print("Skipping already-graded question", url)
+
+    queue = asyncio.Queue()
+    for i, link in enumerate(links):
+        if range_size is None:
+            queue.put_nowait(("Question {}".format(i+1), lambda page, link=link: do_question(page, link)))
             continue
-         await go_through_pages(page)
+        submission_links = await get_submission_links(page, link)
+        for start in range(0, len(submission_links), range_size):
+            ranged = submission_links[start:start+range_size]
+            queue.put_nowait(("Question {}, submissions {}-{}".format(i+1, start+1, start+len(ranged)), lambda page, ranged=ranged: do_range(page, ranged)))
+    await page.close()
+
+    print("Marking {} jobs with {} pages...".format(queue.qsize(), num_workers))
+    marked = await asyncio.gather(*[worker(browser, queue) for _ in range(max(1, min(num_workers, queue.qsize())))])
+    print("Marked {} submissions as 'reading not selected'.".format(sum(marked)))
     #check to see if tagButtons are in pageThumbnail selectPagesPage
     #await page.goBack()
 
+# Parses command line args into (assignment info, number of workers, range size)
+def parse_args(args):
+    config_path, assn_name, num_workers, range_size = CONFIG_PATH, None, NUM_WORKERS, RANGE_SIZE
+    for arg in args:
+        if arg.startswith("--workers="): num_workers = int(arg[len("--workers="):])
+        elif arg.startswith("--range="): range_size = int(arg[len("--range="):])
+        elif arg.startswith("--config="): config_path = arg[len("--config="):]
+        else: assn_name = arg
+    config = load.config(config_path)
+
+    # Ask for which assignment to mark 'not question' for:
+    if assn_name not in config["assignments"]:
+        assn_name, _ = load.promptSelectAssignment(config)
+    return config["assignments"][assn_name], num_workers, range_size
+
 if '__main__' == __name__:
-    asyncio.get_event_loop().run_until_complete(main())
+    asyncio.get_event_loop().run_until_complete(main(*parse_args(sys.argv[1:])))
@@ -0,0 +1,163 @@
+import io
+import os
+import sys
+import json
+import time
+import zipfile
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+""" Local stand-in for the GS pages the scrapers use, to try them without GS.
+    Serves each subfolder of a directory (holding an assignment's eval sheets and, optionally, a *scores.csv)
+    as an assignment's review grades page, with the same buttons and downloads as GS.
+    Every assignment also gets a grading dashboard of --questions questions with --submissions submissions each,
+    where every --blank-every'th submission is blank (GS' missing page placeholder). Submissions marked
+    'reading not selected' are listed, by question, at /marked.
+    Usage: python scrapers/stand_in_gradescope.py <dir> [--port=8000] [--delay=2] [--questions=3] [--submissions=40] [--blank-every=5]
+    --delay is how long (in seconds) "Export Evaluations" takes, as GS prepares the zip.
+    Then point the assignments' "url" in a config at http://localhost:<port>/courses/0/assignments/<subfolder>/,
+    and run, e.g.: python scrapers/watch_grading_sheets.py --all --once --config=<that config>
+              or: python scrapers/mark_not_question.py <subfolder> --workers=4 --config=<that config>
+"""
+
+REVIEW_PAGE = """<html><body>
+<div class="actionBar">
+  <a class="actionBar--action" title="Download marked rubrics for each question" href="export_evaluations">Export Evaluations</a>
+  <a id="download-grades-tooltip-link" href="#" onclick="document.getElementById('popover').style.display = 'block'; return false;">Download Grades</a>
+</div>
+<div id="popover" style="display: none">
+  <a class="popover--listItem" href="scores.csv">Download CSV</a>
+</div>
+</body></html>"""
+
+GRADING_DASHBOARD = """<html><body>{}</body></html>"""
+DASHBOARD_QUESTION = """<div class="gradingDashboard--question"><a class="link-noUnderline" href="/courses/0/questions/{qid}/grade">Question {q}</a></div>"""
+SUBMISSIONS_LIST = """<html><body><table>{}</table></body></html>"""
+SUBMISSIONS_ROW = """<tr><td><a href="/courses/0/questions/{qid}/submissions/{n}/grade">Submission {n}</a></td></tr>"""
+GRADE_PAGE = """<html><body>
+<img src="/assets/{image}.png">
+<button class="rubricItem--key" aria-pressed="{pressed}"
+  onclick="navigator.sendBeacon('mark'); this.setAttribute('aria-pressed', this.getAttribute('aria-pressed') == 'true' ? 'false' : 'true');">1</button>
+<div id="main-content"><div><main><section><div>
+  <span><span><abbr>{n}</abbr></span></span> of <strong><a href="#">{total}</a></strong>
+  <a title="Shortcut: Right arrow" href="/courses/0/questions/{qid}/submissions/{next}/grade">Next</a>
+</div></section></main></div></div>
+</body></html>"""
+
+PREFIX = "/courses/0/assignments/"
+QUESTIONS_PREFIX = "/courses/0/questions/"
+
+class StandInHandler(BaseHTTPRequestHandler):
+    root = "."
+    delay = 2
+    questions = 3
+    submissions = 40
+    blank_every = 5
+    marked = dict() # question ID -> set of the submissions marked 'reading not selected'
+    lock = threading.Lock()
+
+    def is_blank(self, n):
+        return n % self.blank_every == 0
+
+    def do_GET(self):
+        if self.path == "/marked":
+            with self.lock:
+                body = json.dumps({ qid: sorted(subs) for qid, subs in sorted(self.marked.items()) })
+            return self.send(body.encode('utf-8'), "application/json")
+        if self.path.startswith(QUESTIONS_PREFIX):
+            return self.question_page(self.path[len(QUESTIONS_PREFIX):].split("/"))
+        if not self.path.startswith(PREFIX):
+            return self.send_error(404)
+        assn, _, page = self.path[len(PREFIX):].partition("/")
+        if page == "grade":
+            return self.send(GRADING_DASHBOARD.format("".join(DASHBOARD_QUESTION.format(qid="{}-{}".format(assn, q), q=q)
+                                                                for q in range(1, self.questions + 1))).encode('utf-8'), "text/html")
+        assn_dir = os.path.join(self.root, assn)
+        if not os.path.isdir(assn_dir):
+            return self.send_error(404)
+        csvs = sorted(f for f in os.listdir(assn_dir) if f.endswith(".csv"))
+        scores = [f for f in csvs if f.endswith("scores.csv")]
+
+        if page == "review_grades":
+            self.send(REVIEW_PAGE.encode('utf-8'), "text/html")
+        elif page == "export_evaluations":
+            time.sleep(self.delay)
+            buf = io.BytesIO()
+            with zipfile.ZipFile(buf, 'w') as z:
+                for f in csvs:
+                    if f not in scores:
+                        z.write(os.path.join(assn_dir, f), f)
+            self.send(buf.getvalue(), "application/zip", "{}_evaluations.zip".format(assn))
+        elif page == "scores.csv":
+            if len(scores) > 0:
+                with open(os.path.join(assn_dir, scores[0]), 'rb') as f:
+                    body = f.read()
+            else:
+                body = b"SID,Email,Total Score,Status,Lateness (H:M:S)\n"
+            self.send(body, "text/csv", "{}_scores.csv".format(assn))
+        else:
+            self.send_error(404)
+
+    # Pages under /courses/0/questions/<qid>/: grade (which redirects to the first submission, or to the submissions
+    # list once every blank submission is marked, as GS does once a question's graded), submissions, and
+    # submissions/<n>/grade
+    def question_page(self, parts):
+        qid = parts[0]
+        with self.lock:
+            marked = set(self.marked.get(qid, set()))
+        if parts[1:] == ["grade"]:
+            done = all(n in marked for n in range(1, self.submissions + 1) if self.is_blank(n))
+            return self.redirect("/courses/0/questions/{}/{}".format(qid, "submissions" if done else "submissions/1/grade"))
+        if parts[1:] == ["submissions"]:
+            rows = "".join(SUBMISSIONS_ROW.format(qid=qid, n=n) for n in range(1, self.submissions + 1))
+            return self.send(SUBMISSIONS_LIST.format(rows).encode('utf-8'), "text/html")
+        if len(parts) == 4 and parts[1] == "submissions" and parts[3] == "grade" and parts[2].isdigit():
+            n = int(parts[2])
+            page = GRADE_PAGE.format(image="missing_placeholder" if self.is_blank(n) else "page", pressed=str(n in marked).lower(),
+                                     n=n, total=self.submissions, qid=qid, next=min(n + 1, self.submissions))
+            return self.send(page.encode('utf-8'), "text/html")
+        self.send_error(404)
+
+    # Marking (or unmarking) 'reading not selected', from POST /courses/0/questions/<qid>/submissions/<n>/mark
+    def do_POST(self):
+        parts = self.path[len(QUESTIONS_PREFIX):].split("/")
+        if not self.path.startswith(QUESTIONS_PREFIX) or len(parts) != 4 or parts[3] != "mark" or not parts[2].isdigit():
+            return self.send_error(404)
+        with self.lock:
+            self.marked.setdefault(parts[0], set()).symmetric_difference_update({ int(parts[2]) })
+        self.send(b"", "text/plain")
+
+    def redirect(self, location):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def send(self, body, content_type, filename=None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if filename is not None:
+            self.send_header("Content-Disposition", 'attachment; filename="{}"'.format(filename))
+        self.end_headers()
+        self.wfile.write(body)
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+if __name__ == "__main__":
+    port = 8000
+    for arg in sys.argv[2:]:
+        if arg.startswith("--port="): port = int(arg[len("--port="):])
+        elif arg.startswith("--delay="): StandInHandler.delay = float(arg[len("--delay="):])
+        elif arg.startswith("--questions="): StandInHandler.questions = int(arg[len("--questions="):])
+        elif arg.startswith("--submissions="): StandInHandler.submissions = int(arg[len("--submissions="):])
+        elif arg.startswith("--blank-every="): StandInHandler.blank_every = int(arg[len("--blank-every="):])
+    if len(sys.argv) < 2 or not os.path.isdir(sys.argv[1]):
+        print("Usage: python scrapers/stand_in_gradescope.py <dir> [--port=8000] [--delay=2] [--questions=3] [--submissions=40] [--blank-every=5]")
+        sys.exit(1)
+    StandInHandler.root = sys.argv[1]
+    print("Serving", ", ".join("http://localhost:{}{}{}/".format(port, PREFIX, d) for d in sorted(os.listdir(sys.argv[1]))
+                               if os.path.isdir(os.path.join(sys.argv[1], d))))
+    ThreadingServer(("localhost", port), StandInHandler).serve_forever()
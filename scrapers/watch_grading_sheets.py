@@ -5,116 +5,156 @@ sys.path.append(BASE_PATH)
 
 import asyncio
 import os
-from pathlib import Path
 import shutil
-import zipfile
 from pyppeteer import launch
 
-# Load config info for assignments
 import load
-CONFIG_PATH = os.path.join(BASE_PATH, "config.json")
-config = load.config(CONFIG_PATH)
-DOWNLOAD_DIR = config["pyppeteerDownloadDir"] # where Chromium will d/l its files
-assn_name, assn_info = None, None
-
-# Special commands:
-# You can add <assn_name> to . After assn_name, you can add "--once" to do only once.
-ONLY_ONCE = False
-def parse_arg(arg):
-    global assn_name, assn_info, ONLY_ONCE
-    if arg[:2] == "--":
-        if arg[2:] == "once": ONLY_ONCE = True
-    elif arg in config["assignments"]:
-        assn_name, assn_info = arg, config["assignments"][arg]
-for arg in sys.argv[1:]:
-    parse_arg(arg)
-
-# Ask for which assignment to scrape:
-if assn_name is None:
-    assn_name, assn_info = load.promptSelectAssignment(config)
-
-""" Watcher to download gradesheets for an assignment automatically to specified folder.
-    Must set WATCH_DIR and DOWNLOAD_DIR.
+import snapshot
+
+""" Watcher to download gradesheets for assignments automatically to their data folders (as in config.json).
+    Every assignment watched gets its own page in one browser, and they're downloaded concurrently.
+    Usage: python scrapers/watch_grading_sheets.py [<assn_name> ...] [--all] [--once] [--config=<path>]
+    With no assignment names, asks for one. --all watches every assignment in the config with a url.
+    --once downloads each assignment once, then exits.
 """
 
-ASSN_PAGE = assn_info["url"]
-WATCH_DIR = os.path.join(BASE_PATH, assn_info["data"]) # be careful --the script removes files automatically at the dir
+CONFIG_PATH = os.path.join(BASE_PATH, "config.json")
 SLEEP_INTERVAL = 60 # time between downloads, in seconds
-REVIEW_PAGE = os.path.join(ASSN_PAGE, "review_grades")
+DOWNLOAD_TIMEOUT = 300 # how long to wait for GS to export (and Chromium to download) a file before giving up on this round, in seconds
+POLL_INTERVAL = 1 # how often to check a download folder, if Chromium doesn't send download events, in seconds
+HEADLESS = False # show the browser (e.g., to log into GS the first time)
+
+EXPORT_EVALS_BUTTON = '.actionBar--action[title="Download marked rubrics for each question"]'
+DOWNLOAD_GRADES_BUTTON = '#download-grades-tooltip-link'
+SCORES_CSV_LINK = '.popover--listItem[href$="scores.csv"]'
+
+# Tracks the downloads of a page into its own folder, so we can wait for each to complete (rather than sleeping)
+# and know which file is which by its name.
+# :: Chromium reports downloads as CDP events (Page.downloadWillBegin / Page.downloadProgress), which wake up waiters.
+# :: A download counts as complete once its file is in the folder under its final name (Chromium writes to a
+# :: .crdownload file until then), so browsers that don't send the events still work, by checking every POLL_INTERVAL.
+class Downloads:
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.changed = asyncio.Event()
+
+    async def attach(self, page):
+        os.makedirs(self.directory, exist_ok=True)
+        self.cdp = await page.target.createCDPSession()
+        await self.cdp.send('Page.enable')
+        await self.cdp.send('Page.setDownloadBehavior', { 'behavior': 'allow', 'downloadPath': self.directory })
+        self.cdp.on('Page.downloadWillBegin', lambda event: self.changed.set())
+        self.cdp.on('Page.downloadProgress', lambda event: self.changed.set() if event.get('state') in ('completed', 'canceled') else None)
+
+    # Removes previous downloads (so that new ones keep the names GS gives them, rather than getting a ' (1)')
+    def clear(self):
+        for f in os.listdir(self.directory):
+            path = os.path.join(self.directory, f)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+    # The path of a completed download whose file name satisfies match, or None
+    def find(self, match):
+        for f in sorted(os.listdir(self.directory)):
+            if not f.endswith('.crdownload') and match(f):
+                return os.path.join(self.directory, f)
+        return None
+
+    # Waits for a download whose file name satisfies match to complete. Returns its path.
+    async def wait_for(self, match, what, timeout=DOWNLOAD_TIMEOUT):
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while True:
+            path = self.find(match)
+            if path is not None:
+                return path
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("{} wasn't downloaded within {} seconds".format(what, timeout))
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), min(remaining, POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                pass
+
+# Downloads an assignment's eval sheets (as a zip) and scores sheet from its review grades page.
+# :: Returns the paths of (zip, scores csv).
+async def download_sheets(page, downloads):
+    downloads.clear()
+
+    # Download eval sheets
+    export_eval_btn = await page.waitForSelector(EXPORT_EVALS_BUTTON)
+    await export_eval_btn.click()
+    evals = await downloads.wait_for(lambda f: f.endswith(".zip"), "Eval sheets zip")
+
+    # Download scores csv
+    download_btn = await page.waitForSelector(DOWNLOAD_GRADES_BUTTON)
+    await download_btn.click()
+    download_csv_btn = await page.waitForSelector(SCORES_CSV_LINK, { 'visible': True })
+    await download_csv_btn.click()
+    scores = await downloads.wait_for(lambda f: f.endswith("scores.csv"), "Scores csv")
+    return evals, scores
+
+# Keeps an assignment's data folder fresh, downloading its sheets every SLEEP_INTERVAL seconds (or once).
+# :: A round that fails (e.g., times out) is reported and retried next round, without stopping other assignments.
+async def watch(browser, download_dir, assn_name, assn_info, only_once):
+    review_page = os.path.join(assn_info["url"], "review_grades")
+    watch_dir = os.path.join(BASE_PATH, assn_info["data"]) # becomes a symlink to the latest snapshot (see snapshot.py)
 
-async def setup(reviewpage):
-    browser = await launch({"autoClose":False,'headless': False, 'userDataDir':'./pyppeteer_data'})
     page = await browser.newPage()
-    await page.goto(REVIEW_PAGE)
-
     await page.setViewport({ #  maximize window
       "width": 1400,
       "height": 800
       })
-    return page
+    downloads = Downloads(os.path.join(download_dir, assn_name))
+    await downloads.attach(page)
 
-async def main():
-    page = await setup(REVIEW_PAGE)
-
-    print('Watching grades for', ASSN_PAGE, "...")
     while(True):
-
-        action_btns = await page.querySelectorAll('.actionBar--action')
-        export_eval_btn = None
-        download_csv_btn = None
-        for btn in action_btns:
-            title = await page.evaluate("(btn) => btn.getAttribute('title')", btn)
-            if title == "Download marked rubrics for each question":
-                export_eval_btn = btn
-                break
-        action_btns = await page.querySelectorAll('.popover--listItem')
-        for btn in action_btns:
-            href = await page.evaluate("(btn) => btn.getAttribute('href')", btn)
-            if href[-10:] == "scores.csv":
-                download_csv_btn = btn
-                break
-
-        # Download eval sheets
-        print(" | downloading csvs...")
-        await export_eval_btn.click()
-
-        # Wait
-        await asyncio.sleep(2)
-
-        # Download scores csv
-        download_btn = await page.querySelectorAll('#download-grades-tooltip-link')
-        await download_btn[0].click()
-        await asyncio.sleep(1)
-        await download_csv_btn.click()
-
-        # Wait
-        await asyncio.sleep(5)
-
-        # Delete contents of watch folder
-        print(" | deleting contents of watch folder...")
-        for root, dirs, files in os.walk(WATCH_DIR):
-            for f in files:
-                os.remove(os.path.join(root, f))
-            for d in dirs:
-                shutil.rmtree(os.path.join(root, d))
-
-        # Move downloaded files to watch folder + unzip
-        print(" | moving downloaded files...")
-        paths = sorted(Path(DOWNLOAD_DIR).iterdir(), key=os.path.getmtime, reverse=True)
-        for path in paths[:2]:
-            if str(path)[-4:] == ".csv":
-                shutil.copy2(path, WATCH_DIR)
-            elif str(path)[-4:] == ".zip":
-                with zipfile.ZipFile(path, 'r') as zip_ref:
-                    zip_ref.extractall(WATCH_DIR)
-        await asyncio.sleep(1)
-
-        if ONLY_ONCE:
+        try:
+            await page.goto(review_page)
+            print(" | {}: downloading csvs...".format(assn_name))
+            evals, scores = await download_sheets(page, downloads)
+            if snapshot.swap_in(watch_dir, evals, scores):
+                print(" | {}: swapped in new {} and {} at {}".format(assn_name, os.path.basename(evals), os.path.basename(scores), watch_dir))
+            else:
+                print(" | {}: unchanged".format(assn_name))
+        except Exception as e:
+            print(" | {}: Error downloading sheets: {}".format(assn_name, e))
+
+        if only_once:
             break
 
-        print("Re-downloading files in {} seconds...".format(SLEEP_INTERVAL))
-        await page.goto(REVIEW_PAGE)
+        print("Re-downloading {} in {} seconds...".format(assn_name, SLEEP_INTERVAL))
         await asyncio.sleep(SLEEP_INTERVAL)
 
+async def main(config, assignments, only_once=False):
+    browser = await launch({"autoClose":False,'headless': HEADLESS, 'userDataDir':'./pyppeteer_data'})
+    print('Watching grades for', ", ".join(assignments.keys()), "...")
+    await asyncio.gather(*[watch(browser, config["pyppeteerDownloadDir"], name, info, only_once) for name, info in assignments.items()])
+
+# Parses command line args into (config, assignments to watch, only once)
+def parse_args(args):
+    config_path, names, watch_all, only_once = CONFIG_PATH, [], False, False
+    for arg in args:
+        if arg == "--once": only_once = True
+        elif arg == "--all": watch_all = True
+        elif arg.startswith("--config="): config_path = arg[len("--config="):]
+        else: names.append(arg)
+    config = load.config(config_path)
+
+    assignments = dict()
+    for name in names:
+        if name in config["assignments"]:
+            assignments[name] = config["assignments"][name]
+        else:
+            print('Skipping "{}": no such assignment in {}.'.format(name, config_path))
+    if watch_all:
+        assignments.update({ name: info for name, info in config["assignments"].items() if "url" in info })
+
+    # Ask for which assignment to scrape:
+    if len(assignments) == 0:
+        assn_name, assn_info = load.promptSelectAssignment(config)
+        assignments[assn_name] = assn_info
+    return config, assignments, only_once
+
 if '__main__' == __name__:
-    asyncio.get_event_loop().run_until_complete(main())
+    asyncio.get_event_loop().run_until_complete(main(*parse_args(sys.argv[1:])))
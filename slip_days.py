@@ -1,6 +1,10 @@
-from grades import load_grades
+from linker import SubmissionLinker
+import profiling
+import store
 import os
-import pandas as pd
+import sys
+from lazy import lazy_import
+pd = lazy_import("pandas")
 from datetime import datetime
 import load
 
@@ -26,7 +30,16 @@ SAVE_TO = config["slipDaysCSVExportPath"]
 # The number of slip days every student starts with
 INITIAL_SLIPS = 7
 
-def calculate_slip_days():
+# Individual assignments that are paired with a group assignment (e.g., mp3_indiv with mp3_group) set
+# "groupAssignment" in config.json to the group assignment's name. Students are charged slip days
+# for a pair only once, as the max of their group and individual submissions' slip days.
+# :: Assignments named like a pair (<name>_indiv and <name>_group) without it are paired anyway, with a warning.
+GROUP_ASSIGNMENT_KEY = "groupAssignment"
+
+# Calculates every student's remaining slip days, and saves them to SAVE_TO.
+# :: By default, each student's lateness is queried from the grade store (see store.py), and the roster is read from disk.
+# :: load_assignments (like grades.load_many) and load_roster are for grades already in memory (daemon.py passes them).
+def calculate_slip_days(load_assignments=None, load_roster=load.roster):
     # Read extra slip days sheet
     excluding_assns = {}
     if PATH_TO_EXTRA_SLIP_DAYS_CSV:
@@ -36,7 +49,7 @@ def calculate_slip_days():
             excluding_assns[row['Email'].strip().lower()] = row['Excluding'].split(',')
 
     # Read roster. This lets us double-check who's missing a submission for each assignment.
-    roster = load.roster(PATH_TO_CANVAS_ROSTER)
+    roster = load_roster(PATH_TO_CANVAS_ROSTER)
 
     # For each assignment, extract grades, and sum num of late days across assignments
     # special_check = {}
@@ -44,72 +57,108 @@ def calculate_slip_days():
     flagged_email_domains = {}
     emails_to_names = {}
     emails_to_sids = {}
-    mp3_slips_used = {}
+    paired_slips_used = {} # assignment name -> { email: slips used }, for group/individual pairs
     missing_submissions = {}
-    for assn_name, info in assignments.items():
 
-        # Exclude any assignments that are not due yet:
+    # Exclude any assignments that are not due yet:
+    due_assignments = {}
+    duedates = {}
+    for assn_name, info in assignments.items():
         duedate = datetime.strptime(info["duedate"], '%b %d %Y %I:%M%p')
         if (datetime.now() - duedate).total_seconds() < 0:
             print("\n==================\nSkipping assignment", assn_name, "which is not yet due!\n==================\n")
             continue
+        due_assignments[assn_name] = info
+        duedates[assn_name] = duedate
+
+    # Find group/individual assignment pairs where both are due
+    pairs = []
+    for indiv, info in due_assignments.items():
+        group = info.get(GROUP_ASSIGNMENT_KEY)
+        if group is None and indiv.endswith("_indiv") and indiv[:-len("_indiv")] + "_group" in assignments:
+            group = indiv[:-len("_indiv")] + "_group"
+            print('Warning: {} and {} look like a group/individual pair, but {} has no "{}" in config.json. '
+                  'Pairing them anyway; set "{}": "{}" to silence this.'.format(indiv, group, indiv, GROUP_ASSIGNMENT_KEY, GROUP_ASSIGNMENT_KEY, group))
+        if group in due_assignments:
+            pairs.append((indiv, group))
+    for indiv, group in pairs:
+        paired_slips_used[indiv] = {}
+        paired_slips_used[group] = {}
+
+    # Get each student's first submission of every due assignment (and, for pairs, every submission, to link them),
+    # then tally them in order
+    with profiling.stage("load_assignments"):
+        linked = [name for pair in pairs for name in pair]
+        if load_assignments is None:
+            submissions = store.student_submissions(due_assignments, linked)
+        else:
+            submissions = { name: (store.first_submissions(grades), grades) \
+                            for name, (grades, _, _) in load_assignments(due_assignments, only_submitted=False).items() }
+    for assn_name, (firsts, _) in submissions.items():
+        with profiling.stage("tally", assignment=assn_name) as s:
+            s.rows = len(firsts)
+            duedate = duedates[assn_name]
+            seen_sids = {}
+            for email, name, sid, late in firsts:
+                # Special check that email is @cornell.edu. Note that emails on Canvas roster will be @cornell,
+                # but on GS may not be. Was not aware this was possible, but had a student w/ an NYU email on GS.
+                if email.split('@')[-1] != "cornell.edu" and email not in flagged_email_domains:
+                    flagged_email_domains[email] = True
+                    print("Student {} has email {} that is not a Cornell address. This may cause errors, as the Canvas roster uses @cornell emails.".format(name, email))
+                    input("Press any key to continue and ignore this warning...")
+
+                if email not in emails_to_names:
+                    emails_to_names[email] = name
+                    emails_to_sids[email] = sid
+                if email not in seen_sids:
+                    if email in excluding_assns and assn_name in excluding_assns[email]:
+                        num_slips_used = 0 # override lateness for exclusions
+                        print("Excluding", assn_name, "from student", email, "slip days")
+                    elif late > 0 and late > 20: # Grace period of 20 minutes.
+                        # Calculate *how* late (in days, 24hr periods=1440 min)
+                        num_slips_used = int(late / 1440)+1
+                        if sid in roster:
+                            roster[sid].flag_late_submission(assn_name, (late, num_slips_used))
+                    else:
+                        num_slips_used = 0
 
-        grades, rubric, questions = load_grades(info["rubric"], \
-                                                info["data"], \
-                                                only_submitted=False)
-        seen_sids = {}
-        for g in grades:
-            email = g['email'].strip()
-
-            # Special check that email is @cornell.edu. Note that emails on Canvas roster will be @cornell,
-            # but on GS may not be. Was not aware this was possible, but had a student w/ an NYU email on GS.
-            if email.split('@')[-1] != "cornell.edu" and email not in flagged_email_domains:
-                flagged_email_domains[email] = True
-                print("Student {} has email {} that is not a Cornell address. This may cause errors, as the Canvas roster uses @cornell emails.".format(g['name'], g['email']))
-                input("Press any key to continue and ignore this warning...")
-
-            if email not in emails_to_names:
-                emails_to_names[email] = g['name']
-                emails_to_sids[email] = g['sid']
-            if email not in seen_sids:
-                if email in excluding_assns and assn_name in excluding_assns[email]:
-                    num_slips_used = 0 # override lateness for exclusions
-                    print("Excluding", assn_name, "from student", email, "slip days")
-                elif g['late'] > 0 and g['late'] > 20: # Grace period of 20 minutes.
-                    # Calculate *how* late (in days, 24hr periods=1440 min)
-                    num_slips_used = int(g['late'] / 1440)+1
-                    if g['sid'] in roster:
-                        roster[g['sid']].flag_late_submission(assn_name, (g['late'], num_slips_used))
-                else:
-                    num_slips_used = 0
-
-                if 'mp3' in assn_name:
-                    if email in mp3_slips_used: # special case for mp3
-                        # when seeing the second mp3, now add the max to slip days count
-                        slip_days[email] += max(mp3_slips_used[email], num_slips_used)
-                        print('Added mp3 slips for', email, max(mp3_slips_used[email], num_slips_used))
+                    if assn_name in paired_slips_used:
+                        # don't add group/individual pairs to slip days count yet (see below)
+                        paired_slips_used[assn_name][email] = num_slips_used
                     else:
-                        # don't add the first mp3 assignment to slip days count yet
-                        mp3_slips_used[email] = num_slips_used
+                        if email in slip_days:
+                            slip_days[email] += num_slips_used
+                        else:
+                            slip_days[email] = num_slips_used
+                    seen_sids[email] = True
+
+            # Detect students that haven't submitted at all yet (whether late or on-time.)
+            for sid, student in roster.items():
+                if student.email in seen_sids: continue
+                # Missing a student submission for this assignment. Calculate how long:
+                lateness = datetime.now() - duedate
+                student.flag_missing_submission(assn_name, lateness)
+                print("Student {} is missing assignment {}.".format(student.name, assn_name))
+                # If student isn't in the slip days tally, add them:
+                if student.email not in slip_days:
+                    slip_days[student.email] = 0 # Note: this marks the slip days used, not remaining
+                    emails_to_names[student.email] = student.name
+                    emails_to_sids[student.email] = sid
+
+    # For each group/individual pair, link every student's submissions and add the max to slip days count
+    with profiling.stage("link_pairs"):
+        for indiv, group in pairs:
+            members = SubmissionLinker(submissions[group][1], submissions[indiv][1]).members()
+            for email, group_row in zip(members['email'], members['group_row']):
+                email = email.strip()
+                slips = paired_slips_used[indiv].get(email, 0)
+                if group_row != -1:
+                    slips = max(slips, paired_slips_used[group].get(email, 0))
+                if email in slip_days:
+                    slip_days[email] += slips
                 else:
-                    if email in slip_days:
-                        slip_days[email] += num_slips_used
-                    else:
-                        slip_days[email] = num_slips_used
-                seen_sids[email] = True
-
-        # Detect students that haven't submitted at all yet (whether late or on-time.)
-        for sid, student in roster.items():
-            if student.email in seen_sids: continue
-            # Missing a student submission for this assignment. Calculate how long:
-            lateness = datetime.now() - duedate
-            student.flag_missing_submission(assn_name, lateness)
-            print("Student {} is missing assignment {}.".format(student.name, assn_name))
-            # If student isn't in the slip days tally, add them:
-            if student.email not in slip_days:
-                slip_days[student.email] = 0 # Note: this marks the slip days used, not remaining
-                emails_to_names[student.email] = student.name
-                emails_to_sids[student.email] = sid
+                    slip_days[email] = slips
+                print('Added {}/{} slips for'.format(group, indiv), email, slips)
 
     # Read extra slip days sheet, and subtract from the total used:
     extra_slips = dict()
@@ -187,10 +236,18 @@ def calculate_slip_days():
         print(assn, ":", ', '.join(emails))
 
     # Save info to a spreadsheet
-    df_slips = pd.DataFrame(rem_slips, columns=["Name", "Email", "Slip Days Remaining", "Late Assignments", "Missing Assignments", "Extra Slips"])
-    df_slips.to_csv(SAVE_TO, index=False)
+    with profiling.stage("export") as s:
+        df_slips = pd.DataFrame(rem_slips, columns=["Name", "Email", "Slip Days Remaining", "Late Assignments", "Missing Assignments", "Extra Slips"])
+        df_slips.to_csv(SAVE_TO, index=False)
+        s.rows = len(df_slips)
     print("Saved remaining slip days to spreadsheet", SAVE_TO)
 
 # Command-line loading.
+# :: Usage: python slip_days.py [--profile]
+# :: With --profile, saves the time and memory each stage took to profile.json, and prints a summary (see profiling.py).
 if __name__ == "__main__":
-    calculate_slip_days()
+    if "--profile" in sys.argv:
+        profiling.enable()
+    with profiling.stage("slip_days"):
+        calculate_slip_days()
+    profiling.finish()
@@ -0,0 +1,117 @@
+import os
+import json
+import shutil
+import hashlib
+import zipfile
+
+# Snapshots of an assignment's downloaded GS exports, swapped in atomically, so scripts reading the assignment's
+# data folder never see it empty or half-extracted (e.g., while scrapers/watch_grading_sheets.py re-downloads it).
+# :: The data folder (e.g., data/dw1) becomes a symlink to an immutable snapshot folder (data/.snapshots/dw1/<hash>),
+# :: named by the hash of its contents. A new download is hashed straight from the zip and csv, so if nothing changed,
+# :: nothing is written; otherwise it's extracted to a new snapshot, and the symlink is replaced in one rename.
+# :: Readers resolve the symlink once (see resolve) and read every file from that snapshot.
+# :: The first swap moves an existing (plain) data folder aside into the snapshots, as original-<pid> (it's never pruned,
+# :: so anything added to it by hand is kept); on systems without symlinks, snapshots are swapped in with two renames
+# :: instead (so there's a brief moment without a data folder).
+
+# Folder (next to each data folder) where its snapshots are kept
+SNAPSHOTS_DIR = ".snapshots"
+# How many snapshots to keep per data folder (the live one, and the ones before, for readers still reading them)
+KEEP_SNAPSHOTS = 3
+# Name (plus -<pid>) that a plain data folder is moved aside to, the first time
+ORIGINAL_PREFIX = "original"
+
+# The folder to read a data folder's files from: the snapshot it points to, if it's a snapshot symlink
+def resolve(data_dir):
+    return os.path.realpath(data_dir) if os.path.islink(data_dir) else data_dir
+
+# Hash of a set of files, given as (relative path, file object) pairs
+def files_hash(files):
+    h = hashlib.sha256()
+    for rel_path, f in sorted(files, key=lambda pair: pair[0]):
+        file_h = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            file_h.update(chunk)
+        f.close()
+        h.update(json.dumps([rel_path.replace(os.sep, "/"), file_h.hexdigest()]).encode('utf-8'))
+    return h.hexdigest()[:32]
+
+# Hash of what a snapshot of the exports would hold (the zip's files, and the csv), read without extracting them
+def exports_hash(zip_path, csv_path):
+    with zipfile.ZipFile(zip_path, 'r') as z:
+        files = [(info.filename, z.open(info)) for info in z.infolist() if not info.is_dir()]
+        files.append((os.path.basename(csv_path), open(csv_path, 'rb')))
+        return files_hash(files)
+
+# Hash of a data folder's files
+def dir_hash(data_dir):
+    files = []
+    for root, dirs, names in os.walk(data_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            files.append((os.path.relpath(path, data_dir), open(path, 'rb')))
+    return files_hash(files)
+
+# The hash of a data folder's current contents (None if it doesn't exist)
+def current_hash(data_dir):
+    if os.path.islink(data_dir):
+        return os.path.basename(os.path.realpath(data_dir))
+    if os.path.isdir(data_dir):
+        return dir_hash(data_dir)
+    return None
+
+# Makes the exports (GS' eval sheets zip, and the scores csv) the contents of data_dir, if they differ from what's there.
+# :: Returns whether anything changed.
+def swap_in(data_dir, zip_path, csv_path):
+    data_dir = os.path.normpath(data_dir)
+    digest = exports_hash(zip_path, csv_path)
+    if digest == current_hash(data_dir):
+        return False
+
+    # Extract to a staging folder, then rename it to the snapshot (unless an earlier one had the same contents)
+    snapshots = os.path.join(os.path.dirname(data_dir), SNAPSHOTS_DIR, os.path.basename(data_dir))
+    snapshot = os.path.join(snapshots, digest)
+    if not os.path.isdir(snapshot):
+        staging = "{}.tmp-{}".format(snapshot, os.getpid())
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        shutil.copy2(csv_path, staging)
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(staging)
+        os.rename(staging, snapshot)
+    os.utime(snapshot) # (marks it as the newest, for pruning)
+
+    point_to(data_dir, snapshot)
+    prune(snapshots, keep=snapshot)
+    return True
+
+# Points data_dir at a snapshot
+def point_to(data_dir, snapshot):
+    # Move a plain data folder aside, into the snapshots, the first time
+    if os.path.isdir(data_dir) and not os.path.islink(data_dir):
+        original = "{}-{}".format(os.path.join(os.path.dirname(snapshot), ORIGINAL_PREFIX), os.getpid())
+        os.rename(data_dir, original)
+        print("Moved the original {} folder to {} (it won't be removed; delete it once you don't need it).".format(data_dir, original))
+
+    link_tmp = "{}.tmp-{}".format(data_dir, os.getpid())
+    try:
+        os.symlink(os.path.relpath(snapshot, os.path.dirname(data_dir) or "."), link_tmp, target_is_directory=True)
+    except (OSError, NotImplementedError, AttributeError):
+        # No symlinks: swap in a copy of the snapshot with two renames
+        old = "{}.old-{}".format(data_dir, os.getpid())
+        shutil.copytree(snapshot, link_tmp)
+        if os.path.exists(data_dir):
+            os.rename(data_dir, old)
+        os.rename(link_tmp, data_dir)
+        shutil.rmtree(old, ignore_errors=True)
+        return
+    os.replace(link_tmp, data_dir) # (atomic)
+
+# Removes all but the KEEP_SNAPSHOTS newest snapshots in a folder (always keeping keep, and original data folders)
+def prune(snapshots, keep):
+    paths = [os.path.join(snapshots, name) for name in os.listdir(snapshots) \
+             if ".tmp-" not in name and not name.startswith(ORIGINAL_PREFIX + "-")]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[KEEP_SNAPSHOTS:]:
+        if os.path.realpath(path) != os.path.realpath(keep):
+            shutil.rmtree(path, ignore_errors=True)
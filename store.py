@@ -0,0 +1,304 @@
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import datetime
+import gradecache
+from gradetable import GradeTable, make_column, DTYPES
+from lazy import lazy_import
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# Term-wide grade store: an SQLite database of every assignment's parsed grades, so scripts that need many
+# assignments (slip_days.py, final_grades.py) run SQL queries over it, rather than re-parsing every GS export each run.
+# :: The store is filled by the loaders, as a side effect (see save): grades.load_many, grades.load_grades (given the
+# :: assignment's name, as grades.py does) and the daemon save any assignment whose rubric or CSVs changed since it was
+# :: stored (see fingerprint). The queries (see assignment_totals, student_submissions) first sync the assignments they
+# :: need, parsing only those that changed, then aggregate in SQL, without rebuilding whole grade tables.
+# :: (Loading whole grade tables from the store (GradeStore.grades) is slower than from the grade sheet cache, so the
+# :: loaders don't read from it.)
+# :: Tables:
+# ::   assignments     one row per assignment: its paths, max score, rubric items and questions
+# ::   students        one row per SID seen in any assignment
+# ::   submissions     one row per question submission (grade), by assignment, student and question
+# ::   item_scores     rubric item scores of each submission (only nonzero ones)
+# ::   lateness        each student's lateness (in minutes) per assignment, from the scores sheet
+# ::   errors          the grading errors found in each submission
+# :: Usage: python store.py sync            (re)load any assignments in config.json that changed
+# ::        python store.py sql "<query>"   run a query, e.g., "SELECT grader, AVG(total_score) FROM submissions GROUP BY grader"
+
+# Where the store is kept, relative to the course directory
+STORE_PATH = ".grading_cache/grades.db"
+# Whether the grade loaders use the store (if False, they parse every assignment's CSVs each time, as before, and
+# nothing is saved to it)
+USE_GRADE_STORE = True
+# Bump this whenever the schema (or what gets stored) changes, so stored assignments are reloaded.
+STORE_VERSION = 1
+# Whitespace stripped from emails when matching students by email
+WHITESPACE = " \t\r\n"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assignments (
+    name TEXT PRIMARY KEY, rubric_path TEXT, data_path TEXT, gs_id TEXT, max_score REAL,
+    items TEXT, questions TEXT, int_columns TEXT, has_lateness INTEGER, fingerprint TEXT, loaded_at TEXT);
+CREATE TABLE IF NOT EXISTS students (
+    sid INTEGER PRIMARY KEY, email TEXT, name TEXT);
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY, assignment TEXT NOT NULL, row INTEGER NOT NULL, question TEXT, question_num INTEGER,
+    sid INTEGER, name TEXT, email TEXT, aid TEXT, qid REAL, grader TEXT, comments TEXT,
+    adjustment REAL, total_score REAL, was_submitted INTEGER, inc_score INTEGER, late REAL);
+CREATE INDEX IF NOT EXISTS submissions_by_assignment ON submissions (assignment, row);
+CREATE INDEX IF NOT EXISTS submissions_by_student ON submissions (sid, assignment);
+CREATE INDEX IF NOT EXISTS submissions_by_assignment_student ON submissions (assignment, sid, was_submitted, total_score);
+CREATE INDEX IF NOT EXISTS submissions_by_question ON submissions (assignment, question);
+CREATE TABLE IF NOT EXISTS item_scores (
+    submission INTEGER NOT NULL, item INTEGER NOT NULL, score REAL, PRIMARY KEY (submission, item)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS lateness (
+    assignment TEXT NOT NULL, sid INTEGER NOT NULL, late REAL, PRIMARY KEY (assignment, sid)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS errors (
+    submission INTEGER NOT NULL, issue TEXT);
+CREATE INDEX IF NOT EXISTS errors_by_submission ON errors (submission);
+"""
+
+# Columns of submissions, in the order they're stored and read back
+COLUMNS = ["question", "question_num", "sid", "name", "email", "aid", "qid", "grader", "comments",
+           "adjustment", "total_score", "was_submitted", "inc_score", "late"]
+
+# Fingerprint of what an assignment's grades are parsed from: its rubric and data paths, the rubric, and the names, sizes and
+# modification times of its CSVs. The assignment is reloaded when this changes.
+def fingerprint(info):
+    import grades
+    questions, scores_sheet = grades.scan_csv_dir(info["data"])
+    paths = list(questions.values()) + ([scores_sheet] if scores_sheet is not None else [])
+    parts = [STORE_VERSION, info["rubric"], info["data"], gradecache.file_hash(info["rubric"])]
+    for path in paths:
+        st = os.stat(path)
+        parts.append([path, st.st_size, st.st_mtime_ns])
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+# A value as stored in SQLite (None for missing values)
+def plain(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+# A column (array) as a list of values to store (None for missing values)
+def sql_values(col):
+    values = col.tolist()
+    if col.dtype == object or col.dtype.kind == 'f':
+        return [None if v is None or v != v else v for v in values]
+    return values
+
+class GradeStore:
+    def __init__(self, path=STORE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL") # (readers don't block a sync, and commits are cheaper)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.conn.close()
+
+    # The assignments (a dict of names to info dicts with "rubric" and "data" paths, as in config.json) that aren't in
+    # the store, or changed since they were stored, as a dict of name -> fingerprint.
+    def stale(self, assignments):
+        stored = dict(self.conn.execute("SELECT name, fingerprint FROM assignments"))
+        prints = { name: fingerprint(info) for name, info in assignments.items() }
+        return { name: fprint for name, fprint in prints.items() if stored.get(name) != fprint }
+
+    # Loads any of the assignments that aren't in the store, or changed since they were stored.
+    # Returns the names of the ones loaded.
+    # :: Changed assignments are parsed in parallel (see grades.load_many).
+    def sync(self, assignments, processes=None):
+        import grades
+        prints = self.stale(assignments)
+        if len(prints) == 0:
+            return []
+        stale = { name: assignments[name] for name in prints }
+        loaded = grades.load_many(stale, only_submitted=False, processes=processes, use_store=False)
+        for name, (table, rubric, questions) in loaded.items():
+            self.put(name, stale[name], table, rubric, questions, prints[name])
+        return list(stale.keys())
+
+    # Replaces an assignment's grades (a GradeTable, loaded with only_submitted=False) in the store.
+    def put(self, name, info, table, rubric, questions, fprint):
+        n = len(table)
+        has_lateness = 'late' in table.columns
+        with self.conn: # (one transaction)
+            self.delete(name)
+            self.conn.execute("INSERT INTO assignments VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                              (name, info["rubric"], info["data"], str(table.assignment_id), rubric.get('maxScore'),
+                               json.dumps(table.items), json.dumps(questions), json.dumps(sorted(table.int_columns)),
+                               int(has_lateness), fprint, str(datetime.datetime.now())))
+            cols = [sql_values(table.column(c)) if c in table.columns else [None] * n for c in COLUMNS]
+            first_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM submissions").fetchone()[0]
+            self.conn.executemany("INSERT INTO submissions VALUES ({})".format(",".join(["?"] * (len(COLUMNS) + 3))),
+                                  zip(range(first_id, first_id + n), [name] * n, range(n), *cols))
+
+            rows, items = np.nonzero(table.scores)
+            self.conn.executemany("INSERT INTO item_scores VALUES (?,?,?)",
+                                  zip((first_id + rows).tolist(), items.tolist(), table.scores[rows, items].tolist()))
+            self.conn.executemany("INSERT INTO errors VALUES (?,?)",
+                                  ((first_id + i, issue) for i, errs in enumerate(table.column('errors')) for issue in errs))
+
+            sids, emails, names = table.column('sid'), table.column('email'), table.column('name')
+            _, first = np.unique(sids, return_index=True)
+            self.conn.executemany("INSERT OR REPLACE INTO students VALUES (?,?,?)",
+                                  ((int(sids[i]), plain(emails[i]), plain(names[i])) for i in first if sids[i] != -1))
+            if has_lateness:
+                self.conn.executemany("INSERT OR REPLACE INTO lateness VALUES (?,?,?)",
+                                      ((name, int(sids[i]), float(table.column('late')[i])) for i in first if sids[i] != -1))
+
+    # The fingerprint an assignment was stored with (None if it isn't stored)
+    def stored_fingerprint(self, name):
+        row = self.conn.execute("SELECT fingerprint FROM assignments WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    # Removes an assignment from the store.
+    def delete(self, name):
+        self.conn.execute("DELETE FROM item_scores WHERE submission IN (SELECT id FROM submissions WHERE assignment = ?)", (name,))
+        self.conn.execute("DELETE FROM errors WHERE submission IN (SELECT id FROM submissions WHERE assignment = ?)", (name,))
+        self.conn.execute("DELETE FROM submissions WHERE assignment = ?", (name,))
+        self.conn.execute("DELETE FROM lateness WHERE assignment = ?", (name,))
+        self.conn.execute("DELETE FROM assignments WHERE name = ?", (name,))
+
+    # An assignment's grades, as (GradeTable, rubric, questions), like grades.load_grades returns them.
+    def grades(self, name, to_pandas_df=False, only_submitted=True):
+        import grades
+        rubric_path, gs_id, items, questions, int_columns, has_lateness = self.conn.execute(
+            "SELECT rubric_path, gs_id, items, questions, int_columns, has_lateness FROM assignments WHERE name = ?", (name,)).fetchone()
+        items, questions, int_columns = json.loads(items), json.loads(questions), set(json.loads(int_columns))
+        where = "assignment = ?" + (" AND was_submitted" if only_submitted else "")
+
+        df = self.query("SELECT id, {} FROM submissions WHERE {} ORDER BY row".format(", ".join(COLUMNS), where), (name,))
+        index = pd.Index(df['id'])
+        columns = typed_columns(df, [c for c in COLUMNS if c != 'late' or has_lateness])
+
+        errors = [[] for _ in range(len(df))]
+        df_errs = self.query("SELECT e.submission, e.issue FROM errors e JOIN submissions s ON s.id = e.submission WHERE s.{} ORDER BY e.rowid".format(where), (name,))
+        for i, issue in zip(index.get_indexer(df_errs['submission']).tolist(), df_errs['issue'].tolist()):
+            errors[i].append(issue)
+        columns['errors'] = make_column(errors)
+
+        scores = np.zeros((len(df), len(items)))
+        df_items = self.query("SELECT i.submission, i.item, i.score FROM item_scores i JOIN submissions s ON s.id = i.submission WHERE s.{}".format(where), (name,))
+        scores[index.get_indexer(df_items['submission']), df_items['item'].to_numpy(dtype=np.int64)] = df_items['score'].to_numpy(dtype=np.float64)
+
+        table = GradeTable(columns, items, scores, gs_id, int_columns)
+        rubric = grades.load_rubric(rubric_path)
+        return (grades.to_pandas(table) if to_pandas_df else table), rubric, questions
+
+    # Each student's first submission of an assignment, for slip days: a list of (email, name, SID, minutes late),
+    # one per (stripped) email, in order. (Minutes late are 0 if the assignment has no scores sheet.)
+    def first_submissions(self, name):
+        return self.conn.execute("SELECT TRIM(email, ?), name, sid, COALESCE(late, 0) FROM submissions WHERE assignment = ? AND row IN "
+                                 "(SELECT MIN(row) FROM submissions WHERE assignment = ? GROUP BY TRIM(email, ?)) ORDER BY row",
+                                 (WHITESPACE, name, name, WHITESPACE)).fetchall()
+
+    # An assignment's submissions, with only the fields needed to link group and individual submissions (see linker.py)
+    def link_table(self, name):
+        fields = ["name", "sid", "aid", "qid", "email"]
+        df = self.query("SELECT {} FROM submissions WHERE assignment = ? ORDER BY row".format(", ".join(fields)), (name,))
+        gs_id = self.conn.execute("SELECT gs_id FROM assignments WHERE name = ?", (name,)).fetchone()[0]
+        return GradeTable(typed_columns(df, fields), [], np.zeros((len(df), 0)), gs_id)
+
+    # Each student's total score on an assignment (summing their question submissions), as a dict of SID -> total.
+    def totals(self, name, only_submitted=True):
+        return dict(self.conn.execute("SELECT sid, SUM(total_score) FROM submissions WHERE assignment = ?{} GROUP BY sid"
+                                      .format(" AND was_submitted" if only_submitted else ""), (name,)))
+
+    # An assignment's max score (from its rubric)
+    def max_score(self, name):
+        return self.conn.execute("SELECT max_score FROM assignments WHERE name = ?", (name,)).fetchone()[0]
+
+    # Runs a query, returning a DataFrame
+    def query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+# Columns of submissions (read into a DataFrame) as arrays, typed as when parsed
+def typed_columns(df, names):
+    columns = dict()
+    for c in names:
+        dtype = DTYPES.get(c, object)
+        if dtype is object:
+            col = df[c].to_numpy(dtype=object)
+            col[pd.isna(col)] = np.nan # (missing values are NaN, as when parsed)
+            columns[c] = col
+        else:
+            columns[c] = df[c].to_numpy().astype(dtype)
+    return columns
+
+# Like GradeStore.first_submissions, for an assignment's grades (a GradeTable) in memory
+def first_submissions(table):
+    emails = pd.Series(table.column('email'), dtype=object).str.strip(WHITESPACE)
+    first = np.flatnonzero(~emails.duplicated().to_numpy())
+    late = np.nan_to_num(table.column('late')[first]) if 'late' in table.columns else np.zeros(len(first))
+    return list(zip(emails.to_numpy()[first].tolist(), table.column('name')[first].tolist(), table.column('sid')[first].tolist(), late.tolist()))
+
+# The assignments that changed since they were stored (see GradeStore.stale)
+def stale(assignments):
+    with GradeStore() as store:
+        return store.stale(assignments)
+
+# Each student's total score on each of the assignments, through the store (or by parsing them, if it's off).
+# :: Returns a dict mapping each name to (max score, dict of SID -> total), in the same order as assignments.
+def assignment_totals(assignments, only_submitted=True, processes=None):
+    import grades
+    if not USE_GRADE_STORE:
+        totals = dict()
+        for name, (table, rubric, _) in grades.load_many(assignments, only_submitted=only_submitted, processes=processes, use_store=False).items():
+            by_sid = dict()
+            for sid, score in zip(table.column('sid').tolist(), table.column('total_score').tolist()):
+                by_sid[sid] = by_sid.get(sid, 0) + score
+            totals[name] = (rubric['maxScore'], by_sid)
+        return totals
+    with GradeStore() as store:
+        store.sync(assignments, processes)
+        return { name: (store.max_score(name), store.totals(name, only_submitted)) for name in assignments }
+
+# Each student's first submission of each of the assignments, for slip days, through the store (or by parsing them, if it's off).
+# :: Returns a dict mapping each name to (first submissions (see GradeStore.first_submissions), its submissions as a GradeTable
+# :: to link (see linker.py) if the name is in linked, else None), in the same order as assignments.
+def student_submissions(assignments, linked=(), processes=None):
+    import grades
+    if not USE_GRADE_STORE:
+        loaded = grades.load_many(assignments, only_submitted=False, processes=processes, use_store=False)
+        return { name: (first_submissions(table), table if name in linked else None) for name, (table, _, _) in loaded.items() }
+    with GradeStore() as store:
+        store.sync(assignments, processes)
+        return { name: (store.first_submissions(name), store.link_table(name) if name in linked else None) for name in assignments }
+
+# Saves an assignment's grades (a GradeTable, loaded with only_submitted=False) that were parsed outside the store,
+# unless the store already has them. Returns whether they were saved.
+# :: fprint is the assignment's fingerprint from *before* its CSVs were read, so that if they changed while being
+# :: read, the store won't take the grades as up to date.
+def save(name, info, table, rubric, questions, fprint):
+    if not USE_GRADE_STORE:
+        return False
+    with GradeStore() as store:
+        if store.stored_fingerprint(name) == fprint:
+            return False
+        store.put(name, info, table, rubric, questions, fprint)
+        return True
+
+if __name__ == "__main__":
+    import load
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "sync"
+    with GradeStore() as store:
+        if cmd == "sync":
+            config = load.config()
+            loaded = store.sync(config["assignments"])
+            print("Loaded {} assignment(s) into {}: {}".format(len(loaded), STORE_PATH, ", ".join(loaded) or "(all up to date)"))
+        elif cmd == "sql" and len(sys.argv) > 2:
+            print(store.query(sys.argv[2]).to_string())
+        else:
+            print("Usage: python store.py sync | python store.py sql \"<query>\"")
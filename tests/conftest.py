@@ -0,0 +1,26 @@
+# Lets the tests import the grading library's modules (which live at the top of the repo)
+import os
+import sys
+import shutil
+import subprocess
+import pytest
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_PATH)
+
+# A small synthetic course (see benchmarks/gen_data.py), generated once per test run
+@pytest.fixture(scope="session")
+def generated_course(tmp_path_factory):
+    path = tmp_path_factory.mktemp("generated") / "course"
+    subprocess.run([sys.executable, os.path.join(BASE_PATH, "benchmarks", "gen_data.py"),
+                    str(path), "--students", "30", "--questions", "3", "--items", "8", "--seed", "4240"],
+                   check=True, stdout=subprocess.DEVNULL)
+    return path
+
+# A fresh copy of the synthetic course, as the working directory (as the scripts are run from the course directory)
+@pytest.fixture
+def course(generated_course, tmp_path, monkeypatch):
+    path = tmp_path / "course"
+    shutil.copytree(str(generated_course), str(path))
+    monkeypatch.chdir(str(path))
+    return path
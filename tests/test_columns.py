@@ -0,0 +1,80 @@
+import random
+from difflib import SequenceMatcher, get_close_matches
+
+import pytest
+
+from columns import CUTOFF, TrigramIndex, ColumnResolver, find_column, trigrams
+
+COLUMNS = ["Assignment Submission ID", "Question Submission ID", "Name", "SID", "Email", "Score", "Grader",
+           "Submitted design: Yes", "Submitted design: No", "Reflection: Thoughtful", "Reflection: Shallow",
+           "Reflection: Missing", "Reading: Engages with the reading's main point", "Reading: Summarizes only",
+           "Adjustment", "Comments"]
+
+def test_trigrams():
+    assert trigrams("Ab") == { "  a", " ab", "ab " }
+
+def test_candidates_rank_by_shared_trigrams():
+    index = TrigramIndex(COLUMNS)
+    assert index.candidates("Reflection: Thoughtfull")[0] == "Reflection: Thoughtful"
+    assert index.candidates("zzzz") == []
+
+def test_closest_no_match():
+    with pytest.raises(IndexError):
+        TrigramIndex(COLUMNS).closest("Something else entirely")
+
+# A rubric item as a grader might have edited it: a few characters added, removed or changed
+def edited(s, rnd):
+    s = list(s)
+    for _ in range(rnd.randint(1, 4)):
+        i = rnd.randrange(len(s))
+        op = rnd.choice("adc")
+        if op == "a": s.insert(i, rnd.choice("abcdefgh :"))
+        elif op == "d" and len(s) > 1: del s[i]
+        else: s[i] = rnd.choice("abcdefgh :")
+    return "".join(s)
+
+# On a real header, the index picks the same column as a full difflib scan (what grades.py did before it had an index)
+def test_closest_matches_full_difflib_scan():
+    rnd = random.Random(4240)
+    index = TrigramIndex(COLUMNS)
+    for _ in range(2000):
+        term = edited(rnd.choice(COLUMNS), rnd)
+        expected = get_close_matches(term, COLUMNS, 1)
+        if len(expected) == 0:
+            with pytest.raises(IndexError):
+                index.closest(term)
+        else:
+            assert index.closest(term) == expected[0], term
+
+# Among many near-identical columns, the index may settle for a shortlisted column, but it's always within the cutoff,
+# and it only gives up when a full scan would too
+def test_closest_is_close_among_near_duplicates():
+    rnd = random.Random(4240)
+    columns = COLUMNS + [edited(c, rnd) for c in COLUMNS for _ in range(3)]
+    index = TrigramIndex(columns)
+    for _ in range(2000):
+        term = edited(rnd.choice(COLUMNS), rnd)
+        if len(get_close_matches(term, columns, 1)) == 0:
+            with pytest.raises(IndexError):
+                index.closest(term)
+        else:
+            assert SequenceMatcher(None, index.closest(term), term).ratio() >= CUTOFF, term
+
+def test_closest_falls_back_to_full_scan():
+    index = TrigramIndex(COLUMNS)
+    index.candidates = lambda term: [] # (as if no column shared a trigram with the term)
+    assert index.closest("Reflection: Thoughtfull") == "Reflection: Thoughtful"
+
+def test_find_column_exact_and_spacing():
+    cols = ["Reflection : Thoughtful", "Score ", "Name"]
+    assert find_column("Reflection: Thoughtful", cols) == "Reflection : Thoughtful"
+    assert find_column("Score", cols) == "Score "
+    assert find_column("Nam", cols) == "Name"
+
+def test_resolver_remembers_aliases(tmp_path):
+    resolver = ColumnResolver(1, aliases_dir=str(tmp_path))
+    assert resolver.resolve("Reflection: Thoughtfull", COLUMNS) == "Reflection: Thoughtful"
+    resolver.save()
+    again = ColumnResolver(1, aliases_dir=str(tmp_path))
+    assert again.aliases == { "Reflection: Thoughtfull": ["Reflection: Thoughtful"] }
+    assert again.resolve("Reflection: Thoughtfull", COLUMNS) == "Reflection: Thoughtful"
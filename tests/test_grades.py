@@ -0,0 +1,37 @@
+import pandas as pd
+
+import grades
+
+# A scores sheet with the given (SID, lateness) rows
+def scores_sheet(rows):
+    return pd.DataFrame({
+        'SID': pd.Series([sid for sid, _ in rows], dtype=object),
+        'Lateness (H:M:S)': pd.Series([late for _, late in rows], dtype=object)
+    })
+
+def test_lateness_index_minutes():
+    late_by_sid, dup_sids = grades.lateness_index(scores_sheet([("1", "00:00:00"), ("2", "01:02:30"), ("3", None)]))
+    assert late_by_sid.to_dict() == { "1": 0, "2": 62.5, "3": 0 }
+    assert dup_sids == []
+
+def test_lateness_index_leaves_out_duplicate_sids():
+    late_by_sid, dup_sids = grades.lateness_index(scores_sheet([("1", "00:10:00"), ("2", "00:00:00"), ("2", "00:05:00"), (None, "00:01:00")]))
+    assert late_by_sid.to_dict() == { "1": 10 }
+    assert dup_sids == ["2"]
+
+def test_lateness_index_empty_sheet():
+    late_by_sid, dup_sids = grades.lateness_index(scores_sheet([]))
+    assert len(late_by_sid) == 0 and dup_sids == []
+
+def test_lateness_index_no_sids():
+    late_by_sid, dup_sids = grades.lateness_index(scores_sheet([(None, None), (None, "00:01:00")]))
+    assert len(late_by_sid) == 0 and dup_sids == []
+
+# (An assignment exported before anyone submitted)
+def test_attach_lateness_empty_sheet(tmp_path, monkeypatch):
+    path = tmp_path / "a1_scores.csv"
+    path.write_text("Name,SID,Email,Total Score,Max Points,Status,Submission ID,Submission Time,Lateness (H:M:S)\n")
+    monkeypatch.setattr(grades, "USE_GRADESHEET_CACHE", False)
+    table = grades.GradeTable.empty(assignment_id=1)
+    grades.attach_lateness(table, grades.load_scores_sheet(str(path)))
+    assert len(table) == 0
@@ -0,0 +1,67 @@
+import os
+import json
+import glob
+
+import grades
+from incremental import IncrementalGrades, IncrementalReports
+
+REPORTS = ["unassigned_to_question.csv", "all_grades.csv", "left_to_grade.csv", "grading_errors.csv", "missing_questions.csv"]
+
+# Runs the reports (with the given aggregator, or a new one). Returns the contents of the files they export.
+def run_reports(assignment, aggregator=None):
+    for path in REPORTS:
+        if os.path.exists(path): os.remove(path)
+    grades.report(assignment.grades, assignment.rubric, assignment.questions, assignment.scores_sheet is not None,
+                             show_plot=False, aggregator=aggregator)
+    exports = dict()
+    for path in REPORTS:
+        if os.path.exists(path):
+            with open(path) as f:
+                exports[path] = f.read()
+    return exports
+
+# Grading errors are stamped with when they were found, so leave that out
+def without_times(exports):
+    return { path: "\n".join(line.split(",", 1)[-1] if path == "grading_errors.csv" else line for line in text.split("\n")) \
+             for path, text in exports.items() }
+
+def test_patched_reports_match_rebuilt_ones(course):
+    with open("config.json") as f:
+        info = json.load(f)["assignments"]["dw1"]
+    assignment = IncrementalGrades(info["rubric"], info["data"])
+    reports = IncrementalReports(assignment)
+    reports.update(assignment.refresh())
+
+    # Grade a submission of one question differently
+    csv = sorted(glob.glob(os.path.join(info["data"], "2_*.csv")))[0]
+    with open(csv) as f:
+        lines = f.read().split("\n")
+    row = next(i for i, line in enumerate(lines[1:], 1) if line.split(",")[5] not in ("", "0.0")) # (a graded one)
+    cells = lines[row].split(",")
+    cells[8] = "Edited comment" # (Comments)
+    cells[5] = "0" # (Score)
+    lines[row] = ",".join(cells)
+    with open(csv, 'w') as f:
+        f.write("\n".join(lines))
+
+    updated = assignment.refresh()
+    assert updated == [os.path.splitext(os.path.basename(csv))[0]]
+    aggregator = reports.update(updated)
+    assert list(aggregator.parts) == list(assignment.questions)
+
+    patched = run_reports(assignment, aggregator)
+    assert without_times(patched) == without_times(run_reports(assignment))
+    assert "Edited comment" in "".join(patched.values())
+
+def test_rebuilds_when_scores_sheet_changes(course):
+    with open("config.json") as f:
+        info = json.load(f)["assignments"]["dw1"]
+    assignment = IncrementalGrades(info["rubric"], info["data"])
+    reports = IncrementalReports(assignment)
+    first = reports.update(assignment.refresh())
+
+    scores = glob.glob(os.path.join(info["data"], "*_scores.csv"))[0]
+    with open(scores, 'a') as f:
+        f.write("\n")
+    os.utime(scores, ns=(0, 0))
+    assert reports.update(assignment.refresh()) is not first
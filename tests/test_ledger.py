@@ -0,0 +1,74 @@
+import pandas as pd
+
+import ledger
+from ledger import ErrorLedger, EXPORT_COLUMNS
+
+# Current errors of an assignment, as reports.py passes them to ErrorLedger.sync: (DataFrame, question submission IDs)
+def errors(rows):
+    df = pd.DataFrame([["now", issue, grader, comments, question, url] for issue, grader, comments, question, url, _ in rows], columns=EXPORT_COLUMNS)
+    return df, [qid for *_, qid in rows]
+
+MISMATCH = ("Calc grade doesn't match GradeScope.", "TA A", "Nice", "1_Question_1", "https://gs/submissions/1#Question_1", 11)
+NO_COMMENT = ("No comment", "TA B", None, "2_Question_2", "https://gs/submissions/2#Question_2", 22)
+
+def first_seen(df):
+    return dict(zip(df["Issue"], df["First seen"]))
+
+def test_sync_keeps_first_seen_across_runs(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    first = ErrorLedger(path).sync(1, *errors([MISMATCH]))
+    assert len(first) == 1
+
+    # A new error appears; the old one keeps its time, even though its comments changed
+    edited = MISMATCH[:2] + ("Nice work",) + MISMATCH[3:]
+    second = ErrorLedger(path).sync(1, *errors([edited, NO_COMMENT]))
+    assert first_seen(second)[MISMATCH[0]] == first_seen(first)[MISMATCH[0]]
+    assert first_seen(second)[NO_COMMENT[0]] > first_seen(first)[MISMATCH[0]]
+    assert list(second[second["Issue"] == MISMATCH[0]]["Comments"]) == ["Nice work"]
+
+def test_sync_resolves_and_reopens(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    first = ErrorLedger(path).sync(1, *errors([MISMATCH, NO_COMMENT]))
+    assert len(ErrorLedger(path).sync(1, *errors([NO_COMMENT]))) == 1
+    resolved = [e for e in ErrorLedger(path).errors.values() if e["resolved"] is not None]
+    assert [e["issue"] for e in resolved] == [MISMATCH[0]]
+
+    # Errors of other assignments aren't resolved by this one's
+    assert len(ErrorLedger(path).open_errors(2)) == 0
+    ErrorLedger(path).sync(2, *errors([]))
+    assert len(ErrorLedger(path).open_errors(1)) == 1
+
+    # A resolved error that comes back is seen anew
+    reopened = ErrorLedger(path).sync(1, *errors([MISMATCH, NO_COMMENT]))
+    assert first_seen(reopened)[MISMATCH[0]] > first_seen(first)[MISMATCH[0]]
+
+def test_sync_only_appends_changes(tmp_path):
+    path = str(tmp_path / "ledger.jsonl")
+    ErrorLedger(path).sync(1, *errors([MISMATCH, NO_COMMENT]))
+    ErrorLedger(path).sync(1, *errors([MISMATCH, NO_COMMENT]))
+    with open(path) as f:
+        assert len(f.readlines()) == 2
+
+def test_compact(tmp_path, monkeypatch):
+    path = str(tmp_path / "ledger.jsonl")
+    monkeypatch.setattr(ledger, "COMPACT_MIN_LINES", 0)
+    for i in range(10):
+        ErrorLedger(path).sync(1, *errors([MISMATCH] if i % 2 == 0 else [NO_COMMENT]))
+    with open(path) as f:
+        assert len(f.readlines()) <= ledger.COMPACT_RATIO * 2 + 2
+    assert [e["issue"] for e in ErrorLedger(path).open_errors(1)] == [NO_COMMENT[0]]
+
+# The first run with a ledger keeps the times in the grading_errors.csv of an earlier run
+def test_seeds_from_exported_csv(tmp_path):
+    path, csv = str(tmp_path / "ledger.jsonl"), str(tmp_path / "grading_errors.csv")
+    df, _ = errors([MISMATCH, NO_COMMENT])
+    df["First seen"] = ["2021-09-01 10:00:00", "2021-09-02 10:00:00"]
+    df.to_csv(csv, index=False)
+
+    synced = ErrorLedger(path, seed_csv=csv).sync(1, *errors([MISMATCH, NO_COMMENT]))
+    assert first_seen(synced) == { MISMATCH[0]: "2021-09-01 10:00:00", NO_COMMENT[0]: "2021-09-02 10:00:00" }
+
+    # Once there's a ledger, the csv isn't read again
+    pd.DataFrame([["2000-01-01", *MISMATCH[:5]]], columns=EXPORT_COLUMNS).to_csv(csv, index=False)
+    again = ErrorLedger(path, seed_csv=csv).sync(1, *errors([MISMATCH, NO_COMMENT]))
+    assert first_seen(again) == first_seen(synced)
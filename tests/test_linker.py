@@ -0,0 +1,56 @@
+import pandas as pd
+
+from gradetable import GradeTable
+from linker import SubmissionLinker
+
+# Rows (one per question, like GS exports) for submissions given as (aid, [(name, sid, email), ...], late minutes)
+def submissions(subs, questions=3):
+    records = []
+    for aid, students, late in subs:
+        for q in range(questions):
+            for name, sid, email in students:
+                records.append({ "name": name, "sid": sid, "aid": aid, "qid": aid * 10 + q, "email": email, "late": late, "grade": {} })
+    return GradeTable.from_records(records)
+
+ANN = ("Ann", 1, "ann@cornell.edu")
+BO = ("Bo", 2, "bo@cornell.edu")
+CY = ("Cy", -1, "cy@cornell.edu")
+DEE = ("Dee", -1, "dee@cornell.edu")
+EVE = ("Eve", 5, "eve@cornell.edu")
+
+def test_members_of_groups_and_students_alone():
+    group = submissions([(100, [ANN, BO], 0), (200, [CY, DEE], 0)])
+    indiv = submissions([(1, [ANN], 0), (2, [CY], 0), (3, [DEE], 0), (5, [EVE], 1500)])
+    linker = SubmissionLinker(group, indiv)
+    members = linker.members()
+    assert linker.dup_students == []
+    assert members['email'].tolist() == [s[2] for s in [ANN, BO, CY, DEE, EVE]]
+    assert members['member'].tolist() == [0, 1, 0, 1, 0]
+    assert members['indiv_qid'].tolist() == [10, None, 20, 30, 50]
+    # (Eve submitted the individual half late, and is in no group)
+    assert pd.isna(members['aid'].iloc[4]) and members['group_row'].iloc[4] == -1
+
+def test_duplicate_submissions():
+    linker = SubmissionLinker(submissions([(100, [ANN], 0)]), submissions([(1, [ANN], 0), (2, [ANN], 0), (3, [CY], 0), (4, [CY], 0)]))
+    assert linker.dup_students == [1, "cy@cornell.edu"]
+    assert linker.members()['indiv_qid'].tolist() == [10, 30]
+
+def test_linked_table():
+    linker = SubmissionLinker(submissions([(100, [ANN, BO], 0)], questions=1), submissions([(1, [BO], 0)], questions=1))
+    table = linker.linked_table(lambda qid: "g{}".format(qid), lambda qid: "i{}".format(qid))
+    assert table.iloc[0].tolist() == [100, 1000, "g1000", "Ann", "No submission", "Bo", "i10"]
+
+# A student who submitted the individual half of a pair late, and is in no group, is charged for it
+def test_slip_days_charge_students_alone(course):
+    import load
+    import slip_days
+    roster = load.roster(slip_days.PATH_TO_CANVAS_ROSTER)
+    sid = sorted(roster)[0]
+    alone = (roster[sid].name, sid, roster[sid].email)
+    loaded = { "mp3_group": submissions([(100, [ANN, BO], 0)]), "mp3_indiv": submissions([(1, [ANN], 0), (5, [alone], 1500)]) }
+    def load_assignments(assignments, only_submitted):
+        return { name: (loaded.get(name, GradeTable.empty()), None, None) for name in assignments }
+    slip_days.calculate_slip_days(load_assignments=load_assignments)
+
+    df = pd.read_csv(slip_days.SAVE_TO).set_index("Email")
+    assert df.loc[alone[2], "Slip Days Remaining"] == slip_days.INITIAL_SLIPS - 2
@@ -0,0 +1,102 @@
+import time
+import smtplib
+import threading
+import socketserver
+
+from mailer import TokenBucket, Mailer, is_transient
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=50, burst=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.take()
+    assert time.monotonic() - start < 0.05 # the burst is free
+    for _ in range(10):
+        bucket.take()
+    assert time.monotonic() - start >= 10 / 50 * 0.9 # then 50 per second
+
+def test_token_bucket_shared_between_threads():
+    bucket = TokenBucket(rate=100, burst=1)
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.take() for _ in range(10)]) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert time.monotonic() - start >= 39 / 100 * 0.9
+
+def test_is_transient():
+    assert is_transient(smtplib.SMTPServerDisconnected())
+    assert is_transient(smtplib.SMTPResponseException(451, b"try later"))
+    assert not is_transient(smtplib.SMTPResponseException(550, b"no"))
+    assert not is_transient(smtplib.SMTPAuthenticationError(535, b"bad login"))
+    assert is_transient(smtplib.SMTPRecipientsRefused({ "a@b.c": (450, b"busy") }))
+    assert not is_transient(smtplib.SMTPRecipientsRefused({ "a@b.c": (550, b"no such user") }))
+    assert not is_transient(ValueError())
+
+# A stand-in SMTP server. Refuses recipients starting with "bad", and for recipients starting with "flaky", answers
+# the first delivery attempt with a 451 and drops the connection on the second.
+class FakeSMTP(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        def reply(s):
+            self.wfile.write((s + "\r\n").encode())
+        reply("220 fake")
+        rcpt = None
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            cmd = line[:4].upper()
+            if cmd == "RCPT":
+                rcpt = line.split("<")[1].split(">")[0]
+                reply("550 no such user" if rcpt.startswith("bad") else "250 ok")
+            elif cmd == "DATA":
+                reply("354 go")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with server.lock:
+                    server.attempts[rcpt] = server.attempts.get(rcpt, 0) + 1
+                    attempt = server.attempts[rcpt]
+                if rcpt.startswith("flaky") and attempt == 1:
+                    reply("451 try later")
+                    continue
+                if rcpt.startswith("flaky") and attempt == 2:
+                    return # (dropped)
+                with server.lock:
+                    server.delivered.append(rcpt)
+                reply("250 queued")
+            elif cmd == "QUIT":
+                reply("221 bye")
+                return
+            else:
+                reply("250 ok")
+
+def fake_server():
+    server = socketserver.ThreadingTCPServer(("localhost", 0), FakeSMTP)
+    server.daemon_threads = True
+    server.lock, server.attempts, server.delivered = threading.Lock(), dict(), []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_send_all_retries_transient_failures():
+    server = fake_server()
+    try:
+        mail = Mailer("localhost", server.server_address[1], use_ssl=False, connections=3, rate=1000, burst=10, backoff=0.01)
+        receivers = ["s{}@x.edu".format(i) for i in range(12)] + ["flaky@x.edu", "bad@x.edu"]
+        sending, sent_calls = [], []
+        sent, failed = mail.send_all("ta@x.edu", [(r, "Subject: hi\n\nhello") for r in receivers],
+                                     on_sending=lambda r, m: sending.append(r), on_sent=lambda r, m: sent_calls.append(r))
+        assert sorted(sent) == sorted(receivers[:-1]) == sorted(server.delivered) == sorted(sent_calls)
+        assert [r for r, _ in failed] == ["bad@x.edu"]
+        assert sorted(sending) == sorted(receivers) # (once each, however many retries)
+        assert server.attempts["flaky@x.edu"] == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_send_all_stops_on_failed_login(monkeypatch):
+    def refuse(self):
+        raise smtplib.SMTPAuthenticationError(535, b"bad login")
+    monkeypatch.setattr(Mailer, "connect", refuse)
+    mail = Mailer("localhost", 1, use_ssl=False, connections=2, rate=1000, burst=10, backoff=0.01)
+    sent, failed = mail.send_all("ta@x.edu", [("s{}@x.edu".format(i), "hi") for i in range(10)])
+    assert sent == [] and len(failed) == 10
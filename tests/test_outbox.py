@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from outbox import Outbox, message_key
+
+# Stands in for a mailer.Mailer: "sends" messages in order, optionally dying (as if the process were killed) just after
+# starting to send the die_at-th one
+class Sender:
+    def __init__(self, die_at=None):
+        self.die_at = die_at
+        self.started, self.delivered = [], []
+
+    def send_all(self, sender, messages, on_sending=None, on_sent=None):
+        sent = []
+        for i, (receiver, message) in enumerate(messages):
+            on_sending(receiver, message)
+            self.started.append(receiver)
+            if i == self.die_at:
+                raise KeyboardInterrupt
+            self.delivered.append(receiver)
+            sent.append(receiver)
+            on_sent(receiver, message)
+        return sent, []
+
+MESSAGES = [("s{}@x.edu".format(i), "Subject: Slip days\n\nYou have {} left.".format(i)) for i in range(6)]
+
+def test_add_is_idempotent(tmp_path):
+    with Outbox(str(tmp_path / "outbox")) as box:
+        keys = box.add_all(MESSAGES)
+        assert box.add_all(MESSAGES) == keys
+        assert sorted(key for key, _, _ in box.pending()) == sorted(keys)
+        assert keys[0] == message_key(*MESSAGES[0], box.batch)
+
+def test_drain_sends_each_message_once(tmp_path):
+    path = str(tmp_path / "outbox")
+    with Outbox(path) as box:
+        box.add_all(MESSAGES)
+        sender = Sender()
+        sent, failed = box.drain(sender, "ta@x.edu")
+        assert sorted(sent) == sorted(r for r, _ in MESSAGES) and failed == []
+        assert len(os.listdir(os.path.join(path, "cur"))) == len(MESSAGES)
+
+    # Spooling the same messages again doesn't resend them
+    with Outbox(path) as box:
+        box.add_all(MESSAGES)
+        assert box.pending() == []
+
+# The same messages, spooled again in a later batch (e.g., next week's unchanged slip day emails), are sent again
+def test_new_batch_sends_again(tmp_path):
+    path = str(tmp_path / "outbox")
+    with Outbox(path) as box:
+        box.add_all(MESSAGES)
+        box.drain(Sender(), "ta@x.edu")
+        first = box.batch
+
+    with Outbox(path) as box:
+        assert box.batch == first and box.pending() == []
+        assert box.new_batch() != first
+        box.add_all(MESSAGES)
+        sender = Sender()
+        box.drain(sender, "ta@x.edu")
+        assert sorted(sender.delivered) == sorted(r for r, _ in MESSAGES)
+
+    # ...and only once in that batch
+    with Outbox(path) as box:
+        box.add_all(MESSAGES)
+        assert box.pending() == []
+
+def test_resume_after_crash(tmp_path):
+    path = str(tmp_path / "outbox")
+    first = Sender(die_at=3)
+    with Outbox(path) as box:
+        box.add_all(MESSAGES)
+        with pytest.raises(KeyboardInterrupt):
+            box.drain(first, "ta@x.edu")
+    dying = next(r for r, _ in MESSAGES if r not in first.delivered and r in first.started)
+
+    # The message being sent when the run died is held back; the rest go out
+    with Outbox(path) as box:
+        assert box.uncertain() == [message_key(*next(m for m in MESSAGES if m[0] == dying), box.batch)]
+        second = Sender()
+        box.drain(second, "ta@x.edu")
+        assert sorted(first.delivered + second.delivered) == sorted(r for r, _ in MESSAGES if r != dying)
+
+    # ...until it's retried
+    with Outbox(path) as box:
+        assert box.retry_uncertain() == 1
+        third = Sender()
+        box.drain(third, "ta@x.edu")
+        assert third.delivered == [dying]
+        assert box.uncertain() == [] and box.pending() == []
+
+def test_clear(tmp_path):
+    path = str(tmp_path / "outbox")
+    with Outbox(path) as box:
+        box.add_all(MESSAGES)
+        box.drain(Sender(), "ta@x.edu")
+        box.clear()
+        assert box.states == dict() and box.pending() == []
+        box.add_all(MESSAGES[:1])
+        assert len(box.pending()) == 1
@@ -0,0 +1,39 @@
+import json
+
+import pandas as pd
+
+import quizzes
+from quizzes import QUIZ_CALENDAR, deadline, score_quiz, load_quizzes, load_exceptions
+
+def write_quiz(path, rows):
+    pd.DataFrame([{ "name": "Student", "id": 0, "sis_id": sid, "section": "INFO 4240", "submitted": submitted, "attempt": attempt, "score": 1 } \
+                  for sid, attempt, submitted in rows]).to_csv(str(path), index=False)
+
+def test_deadline_follows_daylight_saving():
+    # 12:20 (plus a minute of grace) in New York is 17:21 UTC in winter, and 16:21 UTC once daylight saving starts (March 14, 2021)
+    assert deadline("3-9", QUIZ_CALENDAR) == pd.Timestamp("2021-03-09 17:21", tz="UTC")
+    assert deadline("3-16", QUIZ_CALENDAR) == pd.Timestamp("2021-03-16 16:21", tz="UTC")
+    # (Overridden in the calendar)
+    assert deadline("3-25", QUIZ_CALENDAR) == pd.Timestamp("2021-03-26 03:59", tz="UTC")
+
+def test_score_quiz_uses_first_attempt(tmp_path):
+    path = tmp_path / "2-9.csv"
+    write_quiz(path, [(1, 2, "2021-02-09 18:00:00 UTC"), # a late retake of an on-time quiz
+                      (1, 1, "2021-02-09 17:00:00 UTC"),
+                      (2, 1, "2021-02-09 17:30:00 UTC"), # late
+                      (3, 1, "2021-02-09 17:21:00 UTC"), # just in time
+                      (4, 1, "2021-02-09 17:00:00 UTC")])
+    scores = score_quiz(str(path), deadline("2-9", QUIZ_CALENDAR), exempt={ 4 })
+    assert scores.to_dict() == { 1: quizzes.ONTIME_SCORE, 2: quizzes.LATE_SCORE, 3: quizzes.ONTIME_SCORE }
+
+def test_load_quizzes(tmp_path):
+    write_quiz(tmp_path / "2-9.csv", [(1, 1, "2021-02-09 17:00:00 UTC"), (2, 1, "2021-02-09 18:00:00 UTC")])
+    write_quiz(tmp_path / "3-16.csv", [(1, 1, "2021-03-16 16:30:00 UTC"), (2, 1, "2021-03-16 16:00:00 UTC"), (3, 1, "2021-03-16 16:00:00 UTC")])
+    (tmp_path / "notes.txt").write_text("not a quiz")
+    exceptions_path = tmp_path / "exceptions.json"
+    exceptions_path.write_text(json.dumps({ "3-16": [2] }))
+
+    scores = load_quizzes(str(tmp_path), QUIZ_CALENDAR, load_exceptions(str(exceptions_path)), sids=[1, 2])
+    assert sorted(scores) == ["quiz-2-9", "quiz-3-16"]
+    assert scores["quiz-2-9"].to_dict() == { 1: 1, 2: 0.5 }
+    assert scores["quiz-3-16"].to_dict() == { 1: 0.5 }
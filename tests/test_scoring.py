@@ -0,0 +1,41 @@
+import json
+
+import pandas as pd
+
+import grades
+
+# Every question CSV of every assignment in the synthetic course, with its rubric
+def gradesheets():
+    with open("config.json") as f:
+        assignments = json.load(f)["assignments"]
+    for name, info in assignments.items():
+        rubric = grades.load_rubric(info["rubric"])
+        questions, _ = grades.scan_csv_dir(info["data"])
+        for question, csv in questions.items():
+            yield name, rubric, question, csv
+
+def parse(rubric, question, csv, vectorized, monkeypatch):
+    monkeypatch.setattr(grades, "VECTORIZED_SCORING", vectorized)
+    return grades.parse_gradesheet(rubric, question, csv, int(question.split("_")[0]))
+
+# score_gradesheet must give exactly what scoring each row with calc_grade (the original scoring) gives
+def test_score_gradesheet_matches_calc_grade(course, monkeypatch):
+    sheets = list(gradesheets())
+    assert len(sheets) > 10
+    for name, rubric, question, csv in sheets:
+        vectorized = grades.to_pandas(parse(rubric, question, csv, True, monkeypatch))
+        by_row = grades.to_pandas(parse(rubric, question, csv, False, monkeypatch))
+        assert list(vectorized.columns) == list(by_row.columns), (name, question)
+        for col in vectorized.columns:
+            if col == 'errors':
+                assert vectorized[col].tolist() == by_row[col].tolist(), (name, question)
+            else:
+                pd.testing.assert_series_equal(vectorized[col], by_row[col], obj="{} {} {}".format(name, question, col))
+
+def test_records_keep_calc_grade_types(course, monkeypatch):
+    name, rubric, question, csv = next(gradesheets())
+    vectorized = parse(rubric, question, csv, True, monkeypatch)
+    by_row = parse(rubric, question, csv, False, monkeypatch)
+    for a, b in zip(vectorized, by_row):
+        assert dict(a) == dict(b)
+        assert [type(a[k]) for k in a] == [type(b[k]) for k in b]
@@ -0,0 +1,38 @@
+import os
+import zipfile
+
+import snapshot
+
+# Writes a GS-like export (an eval sheets zip, and a scores csv) whose contents depend on version
+def export(tmp_path, version):
+    zip_path, csv_path = tmp_path / "evals-{}.zip".format(version), tmp_path / "a1_scores.csv"
+    with zipfile.ZipFile(str(zip_path), 'w') as z:
+        z.writestr("1_Question_1.csv", "Name,Score\nA,{}\n".format(version))
+    csv_path.write_text("Name,SID\nA,{}\n".format(version))
+    return str(zip_path), str(csv_path)
+
+def test_swap_in(tmp_path):
+    data_dir = str(tmp_path / "data" / "a1")
+    assert snapshot.swap_in(data_dir, *export(tmp_path, 1))
+    assert os.path.islink(data_dir)
+    assert sorted(os.listdir(data_dir)) == ["1_Question_1.csv", "a1_scores.csv"]
+    assert snapshot.current_hash(data_dir) == snapshot.dir_hash(snapshot.resolve(data_dir))
+
+    # The same exports again change nothing
+    assert not snapshot.swap_in(data_dir, *export(tmp_path, 1))
+    assert snapshot.swap_in(data_dir, *export(tmp_path, 2))
+    with open(os.path.join(data_dir, "1_Question_1.csv")) as f:
+        assert f.read() == "Name,Score\nA,2\n"
+
+def test_prune_keeps_original_folder(tmp_path):
+    data_dir = tmp_path / "data" / "a1"
+    data_dir.mkdir(parents=True)
+    (data_dir / "notes.txt").write_text("added by hand")
+
+    for version in range(snapshot.KEEP_SNAPSHOTS + 3):
+        snapshot.swap_in(str(data_dir), *export(tmp_path, version))
+    snapshots = os.listdir(str(tmp_path / "data" / snapshot.SNAPSHOTS_DIR / "a1"))
+    originals = [name for name in snapshots if name.startswith(snapshot.ORIGINAL_PREFIX + "-")]
+    assert len(snapshots) == snapshot.KEEP_SNAPSHOTS + 1 and len(originals) == 1
+    with open(str(tmp_path / "data" / snapshot.SNAPSHOTS_DIR / "a1" / originals[0] / "notes.txt")) as f:
+        assert f.read() == "added by hand"
@@ -0,0 +1,74 @@
+import json
+
+import pandas as pd
+
+import grades
+import store
+
+def assignments():
+    with open("config.json") as f:
+        return json.load(f)["assignments"]
+
+def assert_same_grades(a, b):
+    da, db = a.to_pandas(), b.to_pandas()
+    assert list(da.columns) == list(db.columns)
+    for col in da.columns:
+        if col == 'errors':
+            assert da[col].tolist() == db[col].tolist()
+        else:
+            pd.testing.assert_series_equal(da[col], db[col], obj=col)
+
+# grades.load_many parses (through the grade sheet cache), and fills the store as it goes
+def test_load_many_fills_store(course):
+    assns = assignments()
+    parsed = grades.load_many(assns, only_submitted=False, processes=1, use_store=False)
+    assert len(store.stale(assns)) == len(assns)
+    loaded = grades.load_many(assns, processes=1)
+    assert store.stale(assns) == dict()
+    with store.GradeStore() as s:
+        for name in assns:
+            table = parsed[name][0]
+            assert_same_grades(table[table.column('was_submitted')], loaded[name][0])
+            assert_same_grades(table, s.grades(name, only_submitted=False)[0])
+            assert parsed[name][1:] == s.grades(name)[1:]
+
+# The store's slip day queries give what's computed from the parsed grades
+def test_student_submissions(course):
+    assns = assignments()
+    parsed = grades.load_many(assns, only_submitted=False, processes=1, use_store=False)
+    queried = store.student_submissions(assns, linked=["mp3_group"], processes=1)
+    for name, (table, _, _) in parsed.items():
+        firsts, link_table = queried[name]
+        assert firsts == store.first_submissions(table)
+        assert len(set(email for email, _, _, _ in firsts)) == len(firsts)
+        if name == "mp3_group":
+            for field in ["name", "sid", "aid", "qid", "email"]:
+                pd.testing.assert_series_equal(pd.Series(link_table.column(field)), pd.Series(table.column(field)), obj=field)
+        else:
+            assert link_table is None
+
+def test_totals(course):
+    assns = assignments()
+    totals = store.assignment_totals(assns, processes=1)
+    for name, (table, rubric, _) in grades.load_many(assns, processes=1, use_store=False).items():
+        by_sid = dict()
+        for sid, score in zip(table.column('sid').tolist(), table.column('total_score').tolist()):
+            by_sid[sid] = by_sid.get(sid, 0) + score
+        assert totals[name] == (rubric['maxScore'], by_sid)
+
+def test_load_grades_fills_store(course):
+    info = assignments()["dw1"]
+    table, _, _ = grades.load_grades(info["rubric"], info["data"], store_as="dw1")
+    with store.GradeStore() as s:
+        assert s.sync({ "dw1": info }) == [] # (already up to date)
+        assert_same_grades(table, s.grades("dw1")[0])
+
+def test_changed_csv_is_reloaded(course):
+    info = assignments()["dw1"]
+    with store.GradeStore() as s:
+        assert s.sync({ "dw1": info }) == ["dw1"]
+        assert s.sync({ "dw1": info }) == []
+        questions, _ = grades.scan_csv_dir(info["data"])
+        with open(next(iter(questions.values())), 'a') as f:
+            f.write("\n")
+        assert s.sync({ "dw1": info }) == ["dw1"]